@@ -0,0 +1,129 @@
+import dataclasses
+import functools
+from typing import Callable
+
+import numpy as np
+import pydicom
+
+import dino.augs
+import dino.dicom
+import dino.ops
+import dino.pyramid
+import dino.structs
+from testing import faking
+from tests.test_dicom import create_empty_pydicom_dataset, set_pydicom_pixel_data
+
+# The volume sizes (DxHxW) of each preset, the large preset needs a few GiB of memory
+PRESETS = {
+    "small": [(64, 64, 64)],
+    "medium": [(64, 64, 64), (128, 256, 256)],
+    "large": [(64, 64, 64), (256, 512, 512), (1000, 512, 512)],
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class Case:
+    """A benchmark, of which only the function returned by `setup` is measured."""
+
+    name: str
+    setup: Callable[[], Callable[[], object]]
+
+
+def create_series(size: tuple[int, int, int], seed: int = 0) -> list[pydicom.Dataset]:
+    """Creates the slices of a synthetic CT series in memory, with int16 pixel data."""
+    rng = np.random.default_rng(seed)
+    slices = []
+    for z in range(size[0]):
+        slice = create_empty_pydicom_dataset()
+        slice.ImagePositionPatient = [0, 0, z]
+        slice.PixelRepresentation = 1
+        slice.RescaleIntercept = -1024
+        set_pydicom_pixel_data(slice, rng.integers(0, 2048, size[1:], dtype=np.int16))
+        slices.append(slice)
+    return slices
+
+
+def create_image(size: tuple[int, int, int], dtype: type = np.float32) -> dino.structs.Image:
+    """Creates a synthetic image with smooth random voxels."""
+    rng = np.random.default_rng(0)
+    image = faking.create_fake_image(size)
+    voxels: np.ndarray = rng.normal(0, 100, size).cumsum(axis=0).astype(dtype)
+    return dataclasses.replace(image, voxels=voxels)
+
+
+def _create_image_case(size: tuple[int, int, int], **kwargs) -> Callable[[], object]:
+    slices = create_series(size)
+    return lambda: dino.dicom.create_image(slices, **kwargs)
+
+
+def _resize_case(size: tuple[int, int, int], order: int, **kwargs) -> Callable[[], object]:
+    image = create_image(size)
+    size_resized = np.array(size) // 2
+    return lambda: dino.ops.resize_image(image, size_resized, order=order, **kwargs)
+
+
+def _resize_pyramid_case(size: tuple[int, int, int]) -> Callable[[], object]:
+    pyramid = dino.pyramid.ImagePyramid.build(create_image(size))
+    size_resized = np.array(size) // 3
+    return lambda: pyramid.resize_image(size_resized)
+
+
+def _resize_label_case(size: tuple[int, int, int], order: int) -> Callable[[], object]:
+    image = create_image(size)
+    image = dataclasses.replace(image, voxels=(image.voxels > 0).astype(np.uint8))
+    size_resized = np.array(size) // 2
+    return lambda: dino.ops.resize_label_image(image, size_resized, order=order)
+
+
+def _pad_case(size: tuple[int, int, int], dtype: type) -> Callable[[], object]:
+    image = create_image(size, dtype)
+    return lambda: dino.ops.pad_image(image, ((8, 8, 8), (8, 8, 8)))
+
+
+def _random_crop_or_pad_case(size: tuple[int, int, int]) -> Callable[[], object]:
+    image = create_image(size)
+    rng = np.random.default_rng(0)
+    patch_size = np.array(size) // 2 + 16
+    return lambda: dino.augs.random_crop_or_pad_image(image, patch_size, rng=rng)
+
+
+def cases(preset: str) -> list[Case]:
+    """Returns the benchmarks of a preset, for every volume size of the preset."""
+    if preset not in PRESETS:
+        raise ValueError(f"preset should be one of {list(PRESETS)}, but got {preset}")
+
+    result = []
+    for size in PRESETS[preset]:
+        name = "x".join(map(str, size))
+        result += [
+            Case(f"create_image/{name}/float64", functools.partial(_create_image_case, size)),
+            Case(
+                f"create_image/{name}/int16_stored",
+                functools.partial(_create_image_case, size, apply_rescale=False),
+            ),
+            Case(
+                f"create_image/{name}/float32_threaded",
+                functools.partial(_create_image_case, size, dtype=np.float32, num_workers=4),
+            ),
+        ]
+        result += [
+            Case(f"resize/{name}/order{order}", functools.partial(_resize_case, size, order))
+            for order in (0, 1, 3)
+        ]
+        result += [
+            Case(
+                f"resize/{name}/order1_tiled",
+                functools.partial(_resize_case, size, 1, tile_size=32),
+            ),
+            Case(
+                f"resize/{name}/order1_numpy",
+                functools.partial(_resize_case, size, 1, backend="numpy"),
+            ),
+            Case(f"resize/{name}/order1_pyramid", functools.partial(_resize_pyramid_case, size)),
+            Case(f"resize_label/{name}/order0", functools.partial(_resize_label_case, size, 0)),
+            Case(f"resize_label/{name}/order1", functools.partial(_resize_label_case, size, 1)),
+            Case(f"pad/{name}/float32", functools.partial(_pad_case, size, np.float32)),
+            Case(f"pad/{name}/int16", functools.partial(_pad_case, size, np.int16)),
+            Case(f"random_crop_or_pad/{name}", functools.partial(_random_crop_or_pad_case, size)),
+        ]
+    return result
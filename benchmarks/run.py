@@ -0,0 +1,173 @@
+"""Runs the benchmarks and compares them with a baseline.
+
+Usage:
+    python -m benchmarks.run --preset small                # compare with the saved baseline
+    python -m benchmarks.run --preset small --save         # save the results as the baseline
+    python -m benchmarks.run --preset large --filter resize --threshold 0.5
+
+Only the peak memory baselines are committed, in baselines/<preset>.json. Wall times depend on
+the machine, so `--save` writes them to baselines/<preset>.seconds.json, which is ignored by git.
+Run with `--save` once on a machine before comparing its wall times. Peak memory is measured with
+tracemalloc, which also traces the allocations of numpy.
+
+The small and medium presets have a committed memory baseline. The large preset needs a few GiB
+of memory and has no committed baseline, run it with `--save` before a change to compare with.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmarks import cases
+
+BASELINE_DIRECTORY = os.path.join(os.path.dirname(__file__), "baselines")
+
+# Short benchmarks are repeated until they ran this long in total, as their min wall time is
+# noisy over a few repeats.
+_MIN_TOTAL_SECONDS = 0.5
+_MAX_REPEATS = 1000
+
+
+def measure(case: cases.Case, repeats: int) -> dict[str, float]:
+    """Returns the min wall time of a benchmark over the repeats, and its peak memory.
+
+    A benchmark is repeated at least `repeats` times, and short benchmarks more often.
+    """
+    fn = case.setup()
+
+    seconds: list[float] = []
+    while len(seconds) < repeats or (
+        sum(seconds) < _MIN_TOTAL_SECONDS and len(seconds) < _MAX_REPEATS
+    ):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+
+    # Measured in a separate run, as tracing slows down the allocations. Only the allocations
+    # of the run are traced, not those of the setup.
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": min(seconds), "peak_bytes": peak_bytes}
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+    memory_threshold: float,
+    min_seconds: float,
+) -> list[str]:
+    """Returns a message per benchmark that regressed past the thresholds.
+
+    Wall times only regress when they are slower by both the relative threshold and at least
+    `min_seconds`, as differences of short benchmarks are mostly noise. Benchmarks without a
+    wall time baseline are only compared on memory.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        seconds = baseline[name].get("seconds")
+        if (
+            seconds is not None
+            and result["seconds"] > seconds * (1 + threshold)
+            and result["seconds"] - seconds > min_seconds
+        ):
+            regressions.append(f"{name}: {result['seconds']:.4f}s, baseline {seconds:.4f}s")
+        peak_bytes = baseline[name].get("peak_bytes")
+        if peak_bytes is not None and result["peak_bytes"] > peak_bytes * (1 + memory_threshold):
+            regressions.append(
+                f"{name}: {result['peak_bytes'] / 2**20:.1f} MiB, "
+                f"baseline {peak_bytes / 2**20:.1f} MiB"
+            )
+    return regressions
+
+
+def _seconds_path(baseline_path: str) -> str:
+    return os.path.splitext(baseline_path)[0] + ".seconds.json"
+
+
+def _load(path: str) -> dict[str, dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _save(path: str, baseline: dict[str, dict[str, float]]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", default="small", choices=list(cases.PRESETS))
+    parser.add_argument("--filter", default="", help="only run benchmarks containing this")
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="min repeats, short cases repeat more"
+    )
+    parser.add_argument("--baseline", help="defaults to baselines/<preset>.json")
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative wall time")
+    parser.add_argument(
+        "--min-seconds", type=float, default=0.001, help="ignore slower wall times below this"
+    )
+    parser.add_argument("--memory-threshold", type=float, default=0.1, help="relative memory")
+    args = parser.parse_args(argv)
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIRECTORY, f"{args.preset}.json")
+    seconds_path = _seconds_path(baseline_path)
+
+    results = {}
+    for case in cases.cases(args.preset):
+        if args.filter not in case.name:
+            continue
+        results[case.name] = measure(case, args.repeats)
+        print(
+            f"{case.name:50} {results[case.name]['seconds']:10.4f}s "
+            f"{results[case.name]['peak_bytes'] / 2**20:10.1f} MiB",
+            flush=True,
+        )
+
+    memory_baseline = _load(baseline_path)
+    seconds_baseline = _load(seconds_path)
+
+    if args.save:
+        # Keep the baseline of benchmarks that were filtered out
+        for name, result in results.items():
+            memory_baseline[name] = {"peak_bytes": result["peak_bytes"]}
+            seconds_baseline[name] = {"seconds": result["seconds"]}
+        _save(baseline_path, memory_baseline)
+        _save(seconds_path, seconds_baseline)
+        return 0
+
+    if not memory_baseline:
+        print(f"No baseline at {baseline_path}, run with --save to create it.")
+        return 0
+    if not seconds_baseline:
+        print(f"No wall time baseline at {seconds_path}, only comparing memory.")
+
+    baseline = {
+        name: {**memory_baseline.get(name, {}), **seconds_baseline.get(name, {})}
+        for name in memory_baseline.keys() | seconds_baseline.keys()
+    }
+    regressions = compare(
+        results, baseline, args.threshold, args.memory_threshold, args.min_seconds
+    )
+    for regression in regressions:
+        print(f"Regression {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,110 @@
-from .augs import random_crop_or_pad_image
-from .dicom import create_image
-from .ops import (
-    canonicalize_mirrored_image,
-    crop_image,
-    pad_image,
-    rescale_image,
-    resize_image,
-)
-from .structs import Image
+"""Lightweight Dicom Numpy Operations.
+
+The submodules are imported on first access of their names, so `import dino` stays fast and
+heavy dependencies like scipy and pydicom are only imported when needed.
+"""
+
+import importlib
+from typing import TYPE_CHECKING
+
+_SUBMODULE_BY_NAME = {
+    "random_crop_or_pad_image": "augs",
+    "random_crop_or_pad_image_batch": "augs",
+    "random_spatial_transform_image": "augs",
+    "pipeline": "deferred",
+    "create_image": "dicom",
+    "create_image_from_multiframe": "dicom",
+    "SeriesIndex": "index",
+    "Loader": "loader",
+    "PatchGrid": "patches",
+    "PatchStitcher": "patches",
+    "ImagePyramid": "pyramid",
+    "canonicalize_image_orientation": "ops",
+    "canonicalize_mirrored_image": "ops",
+    "crop_image": "ops",
+    "crop_world_boxes": "ops",
+    "pad_image": "ops",
+    "register_resize_backend": "ops",
+    "resample_to_grid": "ops",
+    "rescale_image": "ops",
+    "rescale_label_image": "ops",
+    "resize_image": "ops",
+    "resize_label_image": "ops",
+    "sample_world_points": "ops",
+    "set_resize_backend": "ops",
+    "AsyncSeriesBuilder": "streaming",
+    "SeriesBuilder": "streaming",
+    "ImageCache": "storage",
+    "load_image": "storage",
+    "save_image": "storage",
+    "Image": "structs",
+    "trace": "tracing",
+}
+
+_SUBMODULES = {
+    "augs",
+    "deferred",
+    "dicom",
+    "index",
+    "loader",
+    "ops",
+    "patches",
+    "pyramid",
+    "storage",
+    "streaming",
+    "structs",
+    "tracing",
+    "utils",
+}
+
+__all__ = sorted(_SUBMODULE_BY_NAME)
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name not in _SUBMODULE_BY_NAME:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{_SUBMODULE_BY_NAME[name]}", __name__)
+    value = getattr(module, name)
+    # Cache the value, so __getattr__ is only called on first access
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_SUBMODULE_BY_NAME, *_SUBMODULES])
+
+
+if TYPE_CHECKING:
+    from .augs import (
+        random_crop_or_pad_image,
+        random_crop_or_pad_image_batch,
+        random_spatial_transform_image,
+    )
+    from .deferred import pipeline
+    from .dicom import create_image, create_image_from_multiframe
+    from .index import SeriesIndex
+    from .loader import Loader
+    from .ops import (
+        canonicalize_image_orientation,
+        canonicalize_mirrored_image,
+        crop_image,
+        crop_world_boxes,
+        pad_image,
+        register_resize_backend,
+        resample_to_grid,
+        rescale_image,
+        rescale_label_image,
+        resize_image,
+        resize_label_image,
+        sample_world_points,
+        set_resize_backend,
+    )
+    from .patches import PatchGrid, PatchStitcher
+    from .pyramid import ImagePyramid
+    from .storage import ImageCache, load_image, save_image
+    from .streaming import AsyncSeriesBuilder, SeriesBuilder
+    from .structs import Image
+    from .tracing import trace
@@ -1,12 +1,15 @@
 import dataclasses
+import functools
 
 import numpy as np
 import numpy.typing as npt
 
 import dino.ops
 import dino.structs
+import dino.tracing
 
 
+@dino.tracing.traced
 def random_crop_or_pad_image(
     image: dino.structs.Image,
     size: npt.ArrayLike,
@@ -29,11 +32,10 @@ def random_crop_or_pad_image(
     if np.any(size <= 0):
         raise ValueError("size should be positive")
 
-    pad_value = pad_value or image.voxels.min()
     rng = rng or np.random.default_rng()
 
     crop_size = np.minimum(size, image.size)
-    pad_size = np.maximum(size, image.size)
+    pad_size = size
 
     crop_margin = np.maximum(0, image.size - crop_size)
     pad_margin = np.maximum(0, pad_size - crop_size)
@@ -41,19 +43,208 @@ def random_crop_or_pad_image(
     crop_offsets = rng.integers(0, crop_margin, endpoint=True)
     pad_offsets = rng.integers(0, pad_margin, endpoint=True)
 
-    voxels = image.voxels[
-        crop_offsets[0] : crop_offsets[0] + crop_size[0],
-        crop_offsets[1] : crop_offsets[1] + crop_size[1],
-        crop_offsets[2] : crop_offsets[2] + crop_size[2],
+    # Only reads the cropped slices, of memory-mapped and unloaded voxels alike
+    crop_end = crop_offsets + crop_size
+    voxels = image.load_voxels(crop_offsets[0], crop_end[0])[
+        :, crop_offsets[1] : crop_end[1], crop_offsets[2] : crop_end[2]
     ]
 
-    padding_ends = pad_size - (pad_offsets + crop_size)
-    paddings = [(pad_offsets[axis], padding_ends[axis]) for axis in range(3)]
-    voxels = np.pad(voxels, paddings, constant_values=pad_value)
+    if np.any(pad_size > crop_size):
+        # The default pad value scans all voxels, so it is only determined when padding
+        pad_value = image.min if pad_value is None else image.to_stored_value(pad_value)
+        padding_ends = pad_size - (pad_offsets + crop_size)
+        paddings = [(pad_offsets[axis], padding_ends[axis]) for axis in range(3)]
+        voxels = np.pad(voxels, paddings, constant_values=pad_value)
 
-    translation = crop_offsets - pad_offsets
-    position = (image.affine @ np.array([*translation, 1]))[:3]
-    affine = image.affine.copy()
-    affine[:3, 3] = position
+    affine = dino.ops._translate_affine(image.affine, crop_offsets - pad_offsets)
 
     return dataclasses.replace(image, voxels=voxels, affine=affine)
+
+
+@dino.tracing.traced
+def random_crop_or_pad_image_batch(
+    image: dino.structs.Image,
+    size: npt.ArrayLike,
+    num_patches: int,
+    *,
+    pad_value: int | float | None = None,
+    rng: np.random.Generator | None = None,
+    out: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Randomly crops or pads an image to the given size, multiple times at once.
+
+    Draws the same offsets as `num_patches` consecutive calls to `random_crop_or_pad_image` with
+    the same rng, and writes the patches into a single buffer without intermediate arrays.
+
+    Args:
+        image: The image to crop or pad.
+        size: The desired size of each patch.
+        num_patches: The number of patches.
+        pad_value (optional): The value to use for padding. Defaults to min value in voxels.
+        rng (optional): The random number generator to use. Defaults to default numpy rng.
+        out (optional): A (N, D, H, W) buffer to write the patches to, e.g. reused between calls.
+
+    Returns:
+        The (N, D, H, W) voxels and the (N, 4, 4) affines of the patches. The voxels are in the
+        stored units of the image, see `Image.rescale_slope`.
+    """
+    size = np.asarray(size)
+    if np.any(size <= 0):
+        raise ValueError("size should be positive")
+    if num_patches <= 0:
+        raise ValueError("num_patches should be positive")
+
+    if out is None:
+        out = np.empty((num_patches, *size), dtype=image.voxels.dtype)
+    if out.shape != (num_patches, *size):
+        raise ValueError(f"out should have shape {(num_patches, *size)}, but got {out.shape}")
+
+    rng = rng or np.random.default_rng()
+
+    crop_size = np.minimum(size, image.size)
+    pad_size = size
+
+    crop_margin = np.maximum(0, image.size - crop_size)
+    pad_margin = np.maximum(0, pad_size - crop_size)
+
+    # Drawing all offsets at once gives the same offsets as drawing them patch by patch
+    margins = np.tile(np.concatenate([crop_margin, pad_margin]), (num_patches, 1))
+    offsets = rng.integers(0, margins, endpoint=True)
+    crop_offsets, pad_offsets = offsets[:, :3], offsets[:, 3:]
+
+    is_padded = np.any(pad_size > crop_size)
+    if is_padded:
+        pad_value = image.min if pad_value is None else image.to_stored_value(pad_value)
+
+    affines = np.empty((num_patches, 4, 4))
+    for patch, crop_offset, pad_offset, affine in zip(out, crop_offsets, pad_offsets, affines):
+        crop_end = crop_offset + crop_size
+        pad_end = pad_offset + crop_size
+
+        if is_padded:
+            patch.fill(pad_value)
+        patch[
+            pad_offset[0] : pad_end[0],
+            pad_offset[1] : pad_end[1],
+            pad_offset[2] : pad_end[2],
+        ] = image.voxels[
+            crop_offset[0] : crop_end[0],
+            crop_offset[1] : crop_end[1],
+            crop_offset[2] : crop_end[2],
+        ]
+        affine[...] = dino.ops._translate_affine(image.affine, crop_offset - pad_offset)
+
+    return out, affines
+
+
+@functools.lru_cache(maxsize=8)
+def _base_grid(size: tuple[int, int, int]) -> np.ndarray:
+    """Returns the (3, D, H, W) voxel coordinates of a grid, shared between calls."""
+    grid = np.indices(size, dtype=np.float64)
+    grid.setflags(write=False)
+    return grid
+
+
+def _rotation_matrix(angles: np.ndarray) -> np.ndarray:
+    matrix = np.eye(3)
+    for axis, angle in enumerate(angles):
+        plane = [other for other in range(3) if other != axis]
+        rotation = np.eye(3)
+        rotation[np.ix_(plane, plane)] = [
+            [np.cos(angle), -np.sin(angle)],
+            [np.sin(angle), np.cos(angle)],
+        ]
+        matrix = rotation @ matrix
+    return matrix
+
+
+@dino.tracing.traced
+def random_spatial_transform_image(
+    image: dino.structs.Image,
+    size: npt.ArrayLike,
+    *,
+    max_rotation: float = 0.0,
+    max_scaling: float = 0.0,
+    elastic_magnitude: float = 0.0,
+    elastic_grid_size: int = 4,
+    order: int = 1,
+    pad_value: int | float | None = None,
+    rng: np.random.Generator | None = None,
+) -> dino.structs.Image:
+    """Randomly rotates, scales and elastically deforms a random patch of an image.
+
+    The random affine, the elastic displacement and the crop are combined into one grid of
+    coordinates, so only the voxels of the patch are interpolated, in a single pass.
+
+    Args:
+        image: The image to take the patch from.
+        size: The size of the patch.
+        max_rotation (optional): The max rotation in radians around each world axis.
+        max_scaling (optional): The max relative scaling, e.g. 0.1 scales between 0.9 and 1.1.
+        elastic_magnitude (optional): The std of the elastic displacement in patch voxels.
+        elastic_grid_size (optional): The number of control points of the displacement per axis.
+        order (optional): The order of the interpolation, default 1 is linear.
+        pad_value (optional): The value of voxels outside the image. Defaults to min value in voxels.
+        rng (optional): The random number generator to use. Defaults to default numpy rng.
+
+    Returns:
+        The patch, with the affine of the random affine transform. The elastic displacement is
+        not part of the affine.
+    """
+    import scipy.ndimage
+
+    size = np.asarray(size)
+    if size.shape != (3,) or np.any(size <= 0):
+        raise ValueError("size should be a positive 3D vector")
+    if elastic_grid_size < 2:
+        raise ValueError("elastic_grid_size should be at least 2")
+
+    rng = rng or np.random.default_rng()
+    pad_value = dino.ops._physical_pad_value(image, pad_value)
+
+    # A random center of the patch, such that the patch lies within the image when it fits
+    half_size = (size - 1) / 2
+    half_image_size = (image.size - 1) / 2
+    center = rng.uniform(
+        np.minimum(half_size, half_image_size),
+        np.maximum(image.size - 1 - half_size, half_image_size),
+    )
+
+    # The affine of the patch, rotated and scaled around its center in world coordinates
+    affine = dino.ops._translate_affine(image.affine, center - half_size)
+    world_center = affine @ np.array([*half_size, 1])
+    rotation = _rotation_matrix(rng.uniform(-max_rotation, max_rotation, 3))
+    scaling = np.diag(rng.uniform(1 - max_scaling, 1 + max_scaling, 3))
+    transform = np.eye(4)
+    transform[:3, :3] = rotation @ scaling
+    transform[:3, 3] = world_center[:3] - transform[:3, :3] @ world_center[:3]
+    affine = transform @ affine
+
+    coordinates = _base_grid(tuple(size.tolist()))
+    if elastic_magnitude > 0:
+        displacement = rng.normal(0, elastic_magnitude, (3, *[elastic_grid_size] * 3))
+        displacement = np.stack(
+            [
+                scipy.ndimage.zoom(
+                    component, size / elastic_grid_size, order=3, mode="nearest", grid_mode=True
+                )
+                for component in displacement
+            ]
+        )
+        coordinates = coordinates + displacement
+
+    # Maps patch voxel coordinates onto image voxel coordinates
+    matrix = image.inverse_affine @ affine
+    coordinates = np.tensordot(matrix[:3, :3], coordinates, axes=1)
+    coordinates += matrix[:3, 3].reshape(3, 1, 1, 1)
+
+    voxels = dino.ops._map_coordinates(image, coordinates, order, pad_value)
+
+    # Loading zero slices only determines the dtype, also for images with unloaded voxels
+    if image.load_voxels(0, 0).dtype == np.bool_:
+        # a boolean array was casted to 0.0 or 1.0, cast it back to bool here
+        voxels = voxels > 0.5
+
+    return dataclasses.replace(
+        image, affine=affine, voxels=voxels, rescale_slope=1.0, rescale_intercept=0.0
+    )
@@ -0,0 +1,251 @@
+import dataclasses
+
+import numpy as np
+import numpy.typing as npt
+
+import dino.ops
+import dino.structs
+
+
+@dataclasses.dataclass(frozen=True)
+class Window:
+    """Consecutive crops, pads and mirrors fused into one slice of the input plus one fill.
+
+    Output voxel k along axis i is input voxel `start[i] + step[i] * k`, or `pad_value` when
+    that lies outside the input.
+
+    Attributes:
+        affine: the affine of the output.
+        size: the size of the output.
+        valid_bounds: the 2x3 bounds of the input voxels that are not cropped away.
+        start: the input voxel of the first output voxel, may lie outside the input.
+        step: 1 or -1 per axis, -1 for mirrored axes.
+        pad_value: the value of output voxels outside the input, None for the min of the input
+            voxels within `pad_value_bounds`.
+        pad_value_bounds: the 2x3 bounds of the input voxels of which the min is the pad value.
+    """
+
+    affine: np.ndarray
+    size: np.ndarray
+    valid_bounds: np.ndarray
+    start: np.ndarray
+    step: np.ndarray
+    pad_value: int | float | None = None
+    pad_value_bounds: np.ndarray | None = None
+
+    @classmethod
+    def identity(cls, affine: np.ndarray, size: np.ndarray) -> "Window":
+        valid_bounds = np.array([np.zeros(3, dtype=int), size])
+        return cls(affine, size, valid_bounds, np.zeros(3, dtype=int), np.ones(3, dtype=int))
+
+    @property
+    def input_bounds(self) -> np.ndarray:  # 2x3
+        """The bounds of the input voxels that end up in the output."""
+        first = self.start
+        last = self.start + self.step * (self.size - 1)
+        lower = np.clip(np.minimum(first, last), *self.valid_bounds)
+        upper = np.clip(np.maximum(first, last) + 1, *self.valid_bounds)
+        return np.array([lower, np.maximum(lower, upper)])
+
+    @property
+    def is_padded(self) -> bool:
+        lower, upper = self.input_bounds
+        return bool(np.any(upper - lower < self.size))
+
+
+@dataclasses.dataclass(frozen=True)
+class Resize:
+    """A resize of the voxels, which cannot be fused with other operations.
+
+    Attributes:
+        affine: the affine of the output.
+        size: the size of the output.
+        order: the order of the interpolation.
+    """
+
+    affine: np.ndarray
+    size: np.ndarray
+    order: int
+
+
+Stage = Window | Resize
+
+
+def _apply_window(image: dino.structs.Image, window: Window) -> dino.structs.Image:
+    lower, upper = window.input_bounds
+    # Only loads the needed slices of images with unloaded voxels
+    voxels = image.load_voxels(lower[0], upper[0])[:, lower[1] : upper[1], lower[2] : upper[2]]
+    mirrored_axes = tuple(np.where(window.step < 0)[0])
+    if mirrored_axes:
+        voxels = np.flip(voxels, axis=mirrored_axes)
+
+    if not window.is_padded:
+        return dataclasses.replace(image, affine=window.affine, voxels=voxels)
+
+    pad_value = window.pad_value
+    if pad_value is not None:
+        pad_value = image.to_stored_value(pad_value)
+    if window.pad_value_bounds is not None:
+        min_lower, min_upper = window.pad_value_bounds
+        pad_value = image.load_voxels(min_lower[0], min_upper[0])[
+            :, min_lower[1] : min_upper[1], min_lower[2] : min_upper[2]
+        ].min()
+
+    # The output voxels of the first and last input voxels within the window
+    output_first = np.where(window.step > 0, lower - window.start, window.start - (upper - 1))
+    output_last = output_first + (upper - lower)
+
+    voxels_padded = np.full(window.size, pad_value, dtype=voxels.dtype)
+    voxels_padded[
+        output_first[0] : output_last[0],
+        output_first[1] : output_last[1],
+        output_first[2] : output_last[2],
+    ] = voxels
+
+    return dataclasses.replace(image, affine=window.affine, voxels=voxels_padded)
+
+
+class Pipeline:
+    """A deferred sequence of operations on an image, see `pipeline`."""
+
+    def __init__(self, image: dino.structs.Image, stages: tuple[Stage, ...] = ()):
+        self.image = image
+        self.stages = stages
+
+    @property
+    def affine(self) -> np.ndarray:
+        return self.stages[-1].affine if self.stages else self.image.affine
+
+    @property
+    def size(self) -> np.ndarray:
+        return self.stages[-1].size if self.stages else self.image.size
+
+    def _window(self) -> tuple[tuple[Stage, ...], Window]:
+        """Returns the preceding stages and the window to fuse the next operation into."""
+        if self.stages and isinstance(self.stages[-1], Window):
+            return self.stages[:-1], self.stages[-1]
+        return self.stages, Window.identity(self.affine, self.size)
+
+    def plan(self) -> list[Stage]:
+        """Returns the fused stages that `materialize` executes."""
+        return list(self.stages)
+
+    def crop(
+        self, *, bounds: npt.ArrayLike | None = None, bbx: npt.ArrayLike | None = None
+    ) -> "Pipeline":
+        """Defers `dino.ops.crop_image`."""
+        if bounds is not None:
+            bounds = np.asarray(bounds)
+        elif bbx is not None:
+            bounds = dino.ops._bbx_to_bounds(np.asarray(bbx), self.size)
+        else:
+            raise ValueError("Exactly one of bounds or bbx should be specified.")
+        dino.ops._verify_crop_bounds(bounds, self.size)
+
+        stages, window = self._window()
+        start, end = bounds
+        window = dataclasses.replace(
+            window,
+            affine=dino.ops._translate_affine(window.affine, start),
+            size=end - start,
+            start=window.start + window.step * start,
+        )
+        # Input voxels outside the crop must not reappear when the window is padded later on.
+        window = dataclasses.replace(window, valid_bounds=window.input_bounds)
+        return Pipeline(self.image, (*stages, window))
+
+    def pad(self, pad_width: npt.ArrayLike, *, pad_value: int | float | None = None) -> "Pipeline":
+        """Defers `dino.ops.pad_image`."""
+        pad_width = np.asarray(pad_width)
+        dino.ops._verify_pad_width(pad_width)
+
+        stages, window = self._window()
+        if window.is_padded and (pad_value is None or pad_value != window.pad_value):
+            # The window can only have one fill value, continue in a new window.
+            stages, window = (*stages, window), Window.identity(window.affine, window.size)
+
+        before, after = pad_width
+        if not window.is_padded:
+            window = dataclasses.replace(
+                window,
+                pad_value=pad_value,
+                pad_value_bounds=None if pad_value is not None else window.input_bounds,
+            )
+        window = dataclasses.replace(
+            window,
+            affine=dino.ops._translate_affine(window.affine, -before),
+            size=window.size + before + after,
+            start=window.start - window.step * before,
+        )
+        return Pipeline(self.image, (*stages, window))
+
+    def canonicalize_mirrored(self) -> "Pipeline":
+        """Defers `dino.ops.canonicalize_mirrored_image`."""
+        flipped_axes = dino.ops._mirrored_axes(self.affine)
+        if len(flipped_axes) == 0:
+            return self
+
+        stages, window = self._window()
+        mirror = np.ones(3, dtype=int)
+        mirror[flipped_axes] = -1
+        window = dataclasses.replace(
+            window,
+            affine=dino.ops._mirror_affine(window.affine, window.size, flipped_axes),
+            start=np.where(
+                mirror < 0, window.start + window.step * (window.size - 1), window.start
+            ),
+            step=window.step * mirror,
+        )
+        return Pipeline(self.image, (*stages, window))
+
+    def resize(self, size: npt.ArrayLike, *, order: int = 1) -> "Pipeline":
+        """Defers `dino.ops.resize_image`."""
+        size = np.asarray(size)
+        dino.ops._verify_size(size)
+
+        affine = dino.ops._resize_affine(self.affine, self.size, size)
+        return Pipeline(self.image, (*self.stages, Resize(affine, size, order)))
+
+    def rescale(self, spacing: npt.ArrayLike, *, order: int = 1) -> "Pipeline":
+        """Defers `dino.ops.rescale_image`."""
+        spacing = np.asarray(spacing)
+        dino.ops._verify_spacing(spacing)
+
+        return self.resize(dino.ops._rescale_size(self.affine, self.size, spacing), order=order)
+
+    def materialize(self) -> dino.structs.Image:
+        """Executes the stages and returns the resulting image.
+
+        The result is identical to applying the eager functions one by one.
+        """
+        image = self.image
+        for stage in self.stages:
+            if isinstance(stage, Window):
+                image = _apply_window(image, stage)
+            else:
+                image = dino.ops._resize(image, stage.size, stage.order)
+        return image
+
+
+def pipeline(image: dino.structs.Image) -> Pipeline:
+    """Starts a deferred pipeline of operations on an image.
+
+    Consecutive crops, pads and mirrors are composed on the affine only, and fused into a single
+    slice of the voxels plus at most one fill. Voxels are only touched by `materialize`.
+
+    Example:
+        image = (
+            dn.pipeline(image)
+            .canonicalize_mirrored()
+            .crop(bbx=((16, 16, 16), (64, 64, 64)))
+            .pad(((8, 8, 8), (8, 8, 8)), pad_value=0)
+            .materialize()
+        )
+
+    Args:
+        image: the image to start from
+
+    Returns:
+        a pipeline without any operations
+    """
+    return Pipeline(image)
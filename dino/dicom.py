@@ -1,9 +1,12 @@
-import itertools
+import concurrent.futures
+from typing import Sequence
 
 import numpy as np
+import numpy.typing as npt
 import pydicom
 
 import dino.structs
+import dino.tracing
 
 ATOL = 1e-6  # instead of the default 1e-8
 
@@ -24,20 +27,24 @@ def _verify_identical_attribute_per_slice(slices: list[pydicom.Dataset], attribu
         raise ValueError(f"Not all slices have identical {attribute} values.")
 
 
-def create_image(slices: list[pydicom.Dataset]) -> dino.structs.Image:
-    if len(slices) < 2:
-        raise ValueError("Not enough slices to create scan.")
+def _create_affine(
+    positions: np.ndarray, orientations: np.ndarray, pixel_spacing: Sequence[float]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Creates the affine of a series and verifies the geometry of its slices.
 
-    _verify_identical_attribute_per_slice(slices, "PixelSpacing")
-    _verify_identical_attribute_per_slice(slices, "ImageOrientationPatient")
+    All checks are done on the whole series at once, errors refer to the slice index in the input.
 
-    _verify_contains_attribute_per_slice(slices, "ImagePositionPatient")
-    _verify_contains_attribute_per_slice(slices, "RescaleSlope")
-    _verify_contains_attribute_per_slice(slices, "RescaleIntercept")
+    Args:
+        positions: the Nx3 ImagePositionPatient of every slice
+        orientations: the Nx6 ImageOrientationPatient of every slice
+        pixel_spacing: the PixelSpacing shared by all slices
 
+    Returns:
+        the affine and the order that sorts the slices along the z-axis
+    """
     # Rotation
-    orientation_x = np.array(slices[0].ImageOrientationPatient[:3])
-    orientation_y = np.array(slices[0].ImageOrientationPatient[3:])
+    orientation_x = orientations[0, :3]
+    orientation_y = orientations[0, 3:]
     orientation_z = np.cross(orientation_x, orientation_y)
     orientation_z /= np.linalg.norm(orientation_z)
     orientation = np.array([orientation_x, orientation_y, orientation_z])
@@ -45,47 +52,362 @@ def create_image(slices: list[pydicom.Dataset]) -> dino.structs.Image:
     if not np.isclose(np.linalg.det(orientation), 1, atol=ATOL):
         raise ValueError("Orientation matrix is not orthogonal.")
 
-    slices = sorted(slices, key=lambda s: np.dot(np.array(s.ImagePositionPatient), orientation_z))
-    header = slices[0]
-
-    # Translation
-    position = np.array(header.ImagePositionPatient)
+    order = np.argsort(positions @ orientation_z, kind="stable")
+    positions = positions[order]
+    orientations = orientations[order]
 
     # Scale
-    spacing_x, spacing_y = header.PixelSpacing
-    spacing_z = np.linalg.norm(position - np.array(slices[1].ImagePositionPatient))
+    spacing_x, spacing_y = pixel_spacing
+    inter_slice_vectors = positions[:-1] - positions[1:]
+    slice_spacings = np.linalg.norm(inter_slice_vectors, axis=1)
+    spacing_z = slice_spacings[0]
     spacing = np.diag([spacing_x, spacing_y, spacing_z])
 
-    for slice_prev, slice_next in itertools.pairwise(slices):
-        slice_prev_position = np.array(slice_prev.ImagePositionPatient)
-        slice_next_position = np.array(slice_next.ImagePositionPatient)
-        inter_slice_vector = slice_prev_position - slice_next_position
-
-        # Check if the spacing is approximately equal for each slice
-        slice_spacing = np.linalg.norm(inter_slice_vector)
-        if not np.isclose(slice_spacing, spacing_z, atol=ATOL):
-            raise ValueError("Spacing between slices is not equal.")
-
-        # Check that the slices are aligned with orientation_z
-        slice_spacing_proj = np.abs(inter_slice_vector @ orientation_z)
-        if not np.isclose(slice_spacing_proj, slice_spacing, atol=ATOL):
-            raise ValueError("Slices are not aligned along z-axis.")
-
-        # Redundant check, because all IOP are the same.
-        # Check orthogonality of slice orientations with orientation_z
-        slice_orientation_x = np.array(slice_prev.ImageOrientationPatient[:3])
-        slice_orientation_y = np.array(slice_next.ImageOrientationPatient[3:])
-        if not np.isclose(slice_orientation_x @ orientation_z, 0, atol=ATOL):
-            raise ValueError("Slice x-orientation is not orthogonal to z-axis.")
-        if not np.isclose(slice_orientation_y @ orientation_z, 0, atol=ATOL):
-            raise ValueError("Slice y-orientation is not orthogonal to z-axis.")
-
-    # Voxels
-    voxels = np.stack([s.pixel_array * s.RescaleSlope + s.RescaleIntercept for s in slices])
+    # Check if the spacing is approximately equal for each slice
+    invalid = ~np.isclose(slice_spacings, spacing_z, atol=ATOL)
+    if np.any(invalid):
+        index = np.argmax(invalid)
+        raise ValueError(
+            f"Spacing between slices is not equal at slices {order[index]} and {order[index + 1]}."
+        )
+
+    # Check that the slices are aligned with orientation_z
+    slice_spacings_proj = np.abs(inter_slice_vectors @ orientation_z)
+    invalid = ~np.isclose(slice_spacings_proj, slice_spacings, atol=ATOL)
+    if np.any(invalid):
+        index = np.argmax(invalid)
+        raise ValueError(
+            f"Slices are not aligned along z-axis at slices {order[index]} and {order[index + 1]}."
+        )
+
+    # Redundant check when all IOP are the same.
+    # Check orthogonality of slice orientations with orientation_z
+    invalid = ~np.isclose(orientations[:, :3] @ orientation_z, 0, atol=ATOL)
+    if np.any(invalid):
+        raise ValueError(
+            f"Slice x-orientation is not orthogonal to z-axis at slice {order[np.argmax(invalid)]}."
+        )
+    invalid = ~np.isclose(orientations[:, 3:] @ orientation_z, 0, atol=ATOL)
+    if np.any(invalid):
+        raise ValueError(
+            f"Slice y-orientation is not orthogonal to z-axis at slice {order[np.argmax(invalid)]}."
+        )
 
     # Affine
     rotation_scale = orientation @ spacing
     homogeneous_row = np.array([0, 0, 0, 1]).reshape(1, 4)
-    affine = np.r_[np.c_[rotation_scale, position], homogeneous_row]
+    affine = np.r_[np.c_[rotation_scale, positions[0]], homogeneous_row]
+
+    return affine, order
+
+
+# The (7FE0,0010) tag of the PixelData element, in little endian
+_PIXEL_DATA_TAG = b"\xe0\x7f\x10\x00"
+# The transfer syntaxes of which the pixel data is a plain little endian array
+_UNCOMPRESSED_TRANSFER_SYNTAXES = [
+    pydicom.uid.ImplicitVRLittleEndian,
+    pydicom.uid.ExplicitVRLittleEndian,
+]
+
+
+def _read_pixel_data_at_offset(slice: pydicom.Dataset) -> np.ndarray | None:
+    """Reads uncompressed pixel data at the offset of `dino.index.SeriesIndex`, if possible.
+
+    Returns None when the slice has no offset or transfer syntax, or when its pixel data is
+    compressed, big endian, multi-frame or otherwise not a plain little endian array of
+    Rows x Columns pixels.
+    """
+    attributes = ["Rows", "Columns", "BitsAllocated", "BitsStored", "PixelRepresentation"]
+    offset = getattr(slice, "pixel_data_offset", None)
+    if offset is None or any(attribute not in slice for attribute in attributes):
+        return None
+    file_meta = getattr(slice, "file_meta", None)
+    transfer_syntax_uid = None if file_meta is None else file_meta.get("TransferSyntaxUID")
+    if transfer_syntax_uid not in _UNCOMPRESSED_TRANSFER_SYNTAXES:
+        return None
+    if slice.get("SamplesPerPixel", 1) != 1 or slice.BitsAllocated % 8 != 0:
+        return None
+
+    dtype = _pixel_dtype(slice).newbyteorder("<")
+    count = slice.Rows * slice.Columns
+    with open(slice.filename, "rb") as file:
+        file.seek(offset)
+        header = file.read(12)
+        if header[:4] != _PIXEL_DATA_TAG:
+            return None
+        # Explicit VR has a 2 byte VR and 2 reserved bytes before the length, implicit VR not.
+        explicit_vr = transfer_syntax_uid == pydicom.uid.ExplicitVRLittleEndian
+        if explicit_vr and header[4:6] not in (b"OB", b"OW"):
+            return None
+        length = int.from_bytes(header[8:12] if explicit_vr else header[4:8], "little")
+        # Encapsulated pixel data has an undefined length, which never matches.
+        if length != count * dtype.itemsize:
+            return None
+        file.seek(offset + (12 if explicit_vr else 8))
+        pixel_array = np.fromfile(file, dtype=dtype, count=count).reshape(slice.Rows, slice.Columns)
+
+    # Only the stored bits are pixel data, like pydicom the high bits are masked or sign extended.
+    unused_bits = slice.BitsAllocated - slice.BitsStored
+    if unused_bits > 0:
+        if slice.PixelRepresentation == 1:
+            pixel_array = (pixel_array << unused_bits) >> unused_bits
+        else:
+            pixel_array = pixel_array & ((1 << slice.BitsStored) - 1)
+    return pixel_array
+
+
+def _read_pixel_array(slice: pydicom.Dataset) -> np.ndarray:
+    if "PixelData" in slice:
+        return slice.pixel_array
+
+    pixel_array = _read_pixel_data_at_offset(slice)
+    if pixel_array is not None:
+        return pixel_array
+    # Slices read with `stop_before_pixels` are read again, now including their pixel data.
+    return pydicom.dcmread(slice.filename).pixel_array
+
+
+def _pixel_dtype(slice: pydicom.Dataset) -> np.dtype:
+    """Returns the dtype of the decoded pixel data of a slice, without decoding it if possible."""
+    if "BitsAllocated" in slice and "PixelRepresentation" in slice:
+        kind = "i" if slice.PixelRepresentation == 1 else "u"
+        return np.dtype(f"{kind}{max(1, slice.BitsAllocated // 8)}")
+    return _read_pixel_array(slice).dtype
+
+
+def _decode_slice(slice: pydicom.Dataset, out: np.ndarray, rescale: bool = True) -> None:
+    pixel_array = _read_pixel_array(slice)
+    if not rescale:
+        np.copyto(out, pixel_array, casting="unsafe")
+        return
+
+    slope, intercept = float(slice.RescaleSlope), float(slice.RescaleIntercept)
+    if not np.issubdtype(out.dtype, np.inexact):
+        # Casting to an integer output in between would truncate the product before the
+        # intercept is added, so only the rescaled slice is cast.
+        np.copyto(out, pixel_array * slope + intercept, casting="unsafe")
+        return
+
+    # Rescale straight into the output buffer, so no full size temporary is created per slice.
+    np.multiply(pixel_array, slope, out=out, casting="unsafe")
+    np.add(out, intercept, out=out, casting="unsafe")
+
+
+def _decode_slices(
+    slices: list[pydicom.Dataset],
+    shape: tuple[int, int],
+    dtype: npt.DTypeLike,
+    num_workers: int,
+    rescale: bool = True,
+) -> np.ndarray:
+    voxels = np.empty((len(slices), *shape), dtype=dtype)
+
+    if num_workers == 1:
+        for slice, out in zip(slices, voxels):
+            _decode_slice(slice, out, rescale)
+        return voxels
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # Consume the results, so that exceptions raised in the workers are propagated.
+        list(executor.map(_decode_slice, slices, voxels, [rescale] * len(slices)))
+
+    return voxels
+
+
+class _SliceLoader:
+    """Decodes the voxels of sorted slices on demand."""
+
+    def __init__(
+        self,
+        slices: list[pydicom.Dataset],
+        dtype: npt.DTypeLike,
+        num_workers: int,
+        rescale: bool = True,
+    ):
+        self.slices = slices
+        self.dtype = dtype
+        self.num_workers = num_workers
+        self.rescale = rescale
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return (len(self.slices), self.slices[0].Rows, self.slices[0].Columns)
+
+    def load(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        with dino.tracing.span("create_image.decode"):
+            return _decode_slices(
+                self.slices[start:stop], self.shape[1:], self.dtype, self.num_workers, self.rescale
+            )
+
+
+@dino.tracing.traced
+def create_image(
+    slices: list[pydicom.Dataset],
+    *,
+    load_voxels: bool = True,
+    dtype: npt.DTypeLike | None = None,
+    num_workers: int = 1,
+    apply_rescale: bool = True,
+) -> dino.structs.Image:
+    """Creates an image from the slices of a single series.
+
+    The pixel data of every slice is rescaled with its RescaleSlope and RescaleIntercept and
+    written directly into one preallocated array of the requested dtype.
+
+    With `apply_rescale=False` the pixel data is stored as is, by default in its native dtype,
+    e.g. int16 instead of float64 for a quarter of the memory. The RescaleSlope and
+    RescaleIntercept, which must then be identical for all slices, are kept in the image and only
+    applied by interpolating operations or `Image.physical_voxels`.
+
+    The geometry of the image is computed from the headers alone, so with `load_voxels=False`
+    the slices may also have been read with `stop_before_pixels`. Their pixel data is then read
+    from `filename` once the voxels are accessed.
+
+    Args:
+        slices: the slices of the series, in any order
+        load_voxels: whether to decode the voxels now, or defer it to the first access
+        dtype: the dtype of the voxels, values are cast unsafely when it is an integer dtype.
+            Defaults to float64, or to the dtype of the pixel data with `apply_rescale=False`.
+        num_workers: the number of threads used to decode the slices, default 1 decodes sequentially
+        apply_rescale: whether to rescale the pixel data now, or keep the rescale in the image
+
+    Returns:
+        a newly created image
+    """
+    if num_workers < 1:
+        raise ValueError("num_workers should be positive")
+    if len(slices) < 2:
+        raise ValueError("Not enough slices to create scan.")
+
+    with dino.tracing.span("create_image.validate"):
+        _verify_identical_attribute_per_slice(slices, "PixelSpacing")
+        _verify_identical_attribute_per_slice(slices, "ImageOrientationPatient")
+
+        _verify_contains_attribute_per_slice(slices, "ImagePositionPatient")
+        _verify_contains_attribute_per_slice(slices, "RescaleSlope")
+        _verify_contains_attribute_per_slice(slices, "RescaleIntercept")
+        _verify_identical_attribute_per_slice(slices, "Rows")
+        _verify_identical_attribute_per_slice(slices, "Columns")
+        if not apply_rescale:
+            _verify_identical_attribute_per_slice(slices, "RescaleSlope")
+            _verify_identical_attribute_per_slice(slices, "RescaleIntercept")
+
+        positions = np.array([slice.ImagePositionPatient for slice in slices], dtype=float)
+        orientations = np.array([slice.ImageOrientationPatient for slice in slices], dtype=float)
+        affine, order = _create_affine(positions, orientations, slices[0].PixelSpacing)
+        slices = [slices[index] for index in order]
+
+    if apply_rescale:
+        rescale_slope, rescale_intercept = 1.0, 0.0
+        dtype = np.float64 if dtype is None else dtype
+    else:
+        rescale_slope = float(slices[0].RescaleSlope)
+        rescale_intercept = float(slices[0].RescaleIntercept)
+        dtype = _pixel_dtype(slices[0]) if dtype is None else dtype
+
+    loader = _SliceLoader(slices, dtype, num_workers, rescale=apply_rescale)
+    if not load_voxels:
+        return dino.structs.Image.from_loader(
+            affine, loader, rescale_slope=rescale_slope, rescale_intercept=rescale_intercept
+        )
+
+    return dino.structs.Image(affine, loader.load(), rescale_slope, rescale_intercept)
+
+
+def _functional_group_values(dataset: pydicom.Dataset, sequence: str, attribute: str) -> list:
+    """Returns the value of an attribute of a functional group macro for every frame.
+
+    The macro is either in the per-frame functional groups, or shared by all frames.
+    """
+    num_frames = int(dataset.NumberOfFrames)
+    per_frame = dataset.get("PerFrameFunctionalGroupsSequence", [])
+    if len(per_frame) == num_frames and all(sequence in group for group in per_frame):
+        return [getattr(group[sequence][0], attribute) for group in per_frame]
+
+    shared = dataset.get("SharedFunctionalGroupsSequence", [])
+    if shared and sequence in shared[0] and attribute in shared[0][sequence][0]:
+        return [getattr(shared[0][sequence][0], attribute)] * num_frames
+
+    raise ValueError(f"Not all frames have {attribute}.")
+
+
+def _verify_identical_values_per_frame(values: np.ndarray, attribute: str) -> None:
+    if not np.allclose(values, values[0], atol=ATOL):
+        raise ValueError(f"Not all frames have identical {attribute} values.")
+
+
+@dino.tracing.traced
+def create_image_from_multiframe(
+    dataset: pydicom.Dataset,
+    *,
+    dtype: npt.DTypeLike | None = None,
+    apply_rescale: bool = True,
+) -> dino.structs.Image:
+    """Creates an image from an enhanced multi-frame dataset, e.g. Enhanced CT or MR.
+
+    The geometry of all frames is read from the functional groups at once and validated like
+    the slices of `create_image`. The frames are decoded as one array, which is used without
+    copying per frame. It is only copied once when the frames are not in the order of their
+    position, or to rescale or cast it.
+
+    Args:
+        dataset: the multi-frame dataset, with at least two frames
+        dtype: the dtype of the voxels, see `create_image`
+        apply_rescale: whether to rescale the pixel data now, see `create_image`
+
+    Returns:
+        a newly created image
+    """
+    if int(dataset.get("NumberOfFrames", 1)) < 2:
+        raise ValueError("Not enough frames to create scan.")
+
+    with dino.tracing.span("create_image.validate"):
+        positions = np.array(
+            _functional_group_values(dataset, "PlanePositionSequence", "ImagePositionPatient"),
+            dtype=float,
+        )
+        orientations = np.array(
+            _functional_group_values(
+                dataset, "PlaneOrientationSequence", "ImageOrientationPatient"
+            ),
+            dtype=float,
+        )
+        pixel_spacings = np.array(
+            _functional_group_values(dataset, "PixelMeasuresSequence", "PixelSpacing"),
+            dtype=float,
+        )
+        _verify_identical_values_per_frame(orientations, "ImageOrientationPatient")
+        _verify_identical_values_per_frame(pixel_spacings, "PixelSpacing")
+
+        slopes = np.array(
+            _functional_group_values(dataset, "PixelValueTransformationSequence", "RescaleSlope"),
+            dtype=float,
+        )
+        intercepts = np.array(
+            _functional_group_values(
+                dataset, "PixelValueTransformationSequence", "RescaleIntercept"
+            ),
+            dtype=float,
+        )
+        if not apply_rescale:
+            _verify_identical_values_per_frame(slopes, "RescaleSlope")
+            _verify_identical_values_per_frame(intercepts, "RescaleIntercept")
+
+        affine, order = _create_affine(positions, orientations, pixel_spacings[0].tolist())
+
+    with dino.tracing.span("create_image.decode"):
+        # A view of all frames, decoded at once
+        pixel_array = dataset.pixel_array
+        if np.any(order != np.arange(len(order))):
+            pixel_array = pixel_array[order]
+
+        if not apply_rescale:
+            voxels = pixel_array.astype(pixel_array.dtype if dtype is None else dtype, copy=False)
+            return dino.structs.Image(affine, voxels, float(slopes[0]), float(intercepts[0]))
+
+        voxels = np.empty(pixel_array.shape, dtype=np.float64 if dtype is None else dtype)
+        # Rescale straight into the voxels, with the slope and intercept of every frame
+        np.multiply(pixel_array, slopes[order, None, None], out=voxels, casting="unsafe")
+        np.add(voxels, intercepts[order, None, None], out=voxels, casting="unsafe")
 
     return dino.structs.Image(affine, voxels)
@@ -0,0 +1,237 @@
+import concurrent.futures
+import json
+import os
+import sqlite3
+import warnings
+
+import pydicom
+
+_HEADER_TAGS = [
+    "SeriesInstanceUID",
+    "ImagePositionPatient",
+    "ImageOrientationPatient",
+    "PixelSpacing",
+    "RescaleSlope",
+    "RescaleIntercept",
+    "Rows",
+    "Columns",
+    "BitsAllocated",
+    "BitsStored",
+    "PixelRepresentation",
+    "SamplesPerPixel",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    series_uid TEXT,
+    header TEXT,
+    pixel_data_offset INTEGER,
+    transfer_syntax_uid TEXT
+);
+CREATE INDEX IF NOT EXISTS files_series_uid ON files (series_uid);
+"""
+
+
+# The transfer syntax of datasets without file meta information, by their encoding
+_TRANSFER_SYNTAX_BY_ENCODING: dict[tuple[bool | None, bool | None], str] = {
+    (True, True): pydicom.uid.ImplicitVRLittleEndian,
+    (False, True): pydicom.uid.ExplicitVRLittleEndian,
+    (False, False): pydicom.uid.ExplicitVRBigEndian,
+}
+
+
+def _read_header(path: str) -> tuple[str | None, str | None, int | None, str | None] | str:
+    """Reads the header of a file, returns None values for files that are not DICOM.
+
+    Returns:
+        the series, header, pixel data offset and transfer syntax of the file, or an error
+        message if the file could not be read
+    """
+    try:
+        with open(path, "rb") as file:
+            dataset = pydicom.dcmread(file, stop_before_pixels=True, specific_tags=_HEADER_TAGS)
+            # Reading stopped at the start of the PixelData element, if there is any.
+            pixel_data_offset = file.tell()
+        if "SeriesInstanceUID" not in dataset:
+            return None, None, None, None
+
+        header = {
+            tag: _to_json_value(dataset[tag].value)
+            for tag in _HEADER_TAGS[1:]
+            if tag in dataset and dataset[tag].value is not None
+        }
+    except (pydicom.errors.InvalidDicomError, OSError):
+        return None, None, None, None
+    except Exception as error:
+        # A damaged file should not stop the scan of all other files
+        return f"{type(error).__name__}: {error}"
+
+    transfer_syntax_uid = dataset.file_meta.get(
+        "TransferSyntaxUID", _TRANSFER_SYNTAX_BY_ENCODING.get(dataset.original_encoding)
+    )
+    return (
+        str(dataset.SeriesInstanceUID),
+        json.dumps(header),
+        pixel_data_offset,
+        None if transfer_syntax_uid is None else str(transfer_syntax_uid),
+    )
+
+
+def _to_json_value(value):
+    if isinstance(value, pydicom.multival.MultiValue):
+        return [float(item) for item in value]
+    if isinstance(value, int):
+        return value
+    return float(value)
+
+
+class SeriesIndex:
+    """A persistent SQLite index of the DICOM headers in directory trees.
+
+    The index stores, per file, the series it belongs to and the geometry tags needed by
+    `dino.dicom.create_image`. Rescanning only reads the headers of new or changed files.
+
+    Example:
+        with SeriesIndex("index.sqlite") as index:
+            index.scan("/data/dicom")
+            for series_uid in index.series_uids():
+                image = dino.create_image(index.slices(series_uid), load_voxels=False)
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_SCHEMA)
+        # Indexes created before the transfer syntax was stored, their files fall back to
+        # parsing the header when reading the pixel data.
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(files)")]
+        if "transfer_syntax_uid" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE files ADD COLUMN transfer_syntax_uid TEXT")
+
+    def __enter__(self) -> "SeriesIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def scan(self, root: str | os.PathLike, *, num_workers: int | None = None) -> int:
+        """Indexes all files under a directory, skipping files that did not change.
+
+        Files that disappear during the scan or cannot be parsed are skipped, with a warning
+        for the files that cannot be parsed. They are read again by the next scan.
+
+        Args:
+            root: the directory to scan recursively
+            num_workers: the number of worker processes reading headers, defaults to the CPU count
+
+        Returns:
+            the number of files of which the header was read
+        """
+        root = os.path.abspath(root)
+        indexed = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.connection.execute(
+                "SELECT path, mtime_ns, size FROM files WHERE path >= ? AND path < ?",
+                (root + os.sep, root + chr(ord(os.sep) + 1)),
+            )
+        }
+
+        changed = []
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Removed since it was listed, or a broken symbolic link
+                    continue
+                if indexed.pop(path, None) != (stat.st_mtime_ns, stat.st_size):
+                    changed.append((path, stat.st_mtime_ns, stat.st_size))
+
+        rows = []
+        errors = []
+        if changed:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+                headers = executor.map(_read_header, [path for path, _, _ in changed], chunksize=64)
+                for file, header in zip(changed, headers):
+                    if isinstance(header, str):
+                        errors.append(f"{file[0]}: {header}")
+                    else:
+                        rows.append((*file, *header))
+        if errors:
+            warnings.warn(
+                f"Skipped {len(errors)} unreadable files:\n" + "\n".join(errors), stacklevel=2
+            )
+
+        with self.connection:
+            # Whatever is left in indexed was removed from disk.
+            self.connection.executemany(
+                "DELETE FROM files WHERE path = ?", [(path,) for path in indexed]
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, series_uid, header, "
+                "pixel_data_offset, transfer_syntax_uid) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+        return len(rows)
+
+    def series_uids(self) -> list[str]:
+        """Returns the SeriesInstanceUID of every indexed series."""
+        return [
+            series_uid
+            for (series_uid,) in self.connection.execute(
+                "SELECT DISTINCT series_uid FROM files WHERE series_uid IS NOT NULL"
+            )
+        ]
+
+    def paths(self, series_uid: str) -> list[str]:
+        """Returns the paths of the files of a series."""
+        return [
+            path
+            for (path,) in self.connection.execute(
+                "SELECT path FROM files WHERE series_uid = ?", (series_uid,)
+            )
+        ]
+
+    def slices(self, series_uid: str) -> list[pydicom.Dataset]:
+        """Returns header-only slices of a series, built from the index without reading files.
+
+        The slices can be passed to `dino.dicom.create_image`, which reads their pixel data from
+        their `filename` once the voxels are needed. Uncompressed pixel data is read directly at
+        the indexed `pixel_data_offset`, without parsing the header again. The transfer syntax of
+        the file is set in their `file_meta`.
+
+        Args:
+            series_uid: the SeriesInstanceUID of the series
+
+        Returns:
+            a slice per file in the series, with the indexed tags and `filename` set
+        """
+        slices = []
+        for path, header, pixel_data_offset, transfer_syntax_uid in self.connection.execute(
+            "SELECT path, header, pixel_data_offset, transfer_syntax_uid FROM files "
+            "WHERE series_uid = ?",
+            (series_uid,),
+        ):
+            slice = pydicom.Dataset()
+            slice.SeriesInstanceUID = series_uid
+            for tag, value in json.loads(header).items():
+                setattr(slice, tag, value)
+            slice.filename = path
+            slice.pixel_data_offset = pixel_data_offset
+            if transfer_syntax_uid is not None:
+                slice.file_meta = pydicom.dataset.FileMetaDataset()
+                slice.file_meta.TransferSyntaxUID = transfer_syntax_uid
+            slices.append(slice)
+
+        if not slices:
+            raise KeyError(f"Series {series_uid} is not indexed.")
+
+        return slices
@@ -0,0 +1,215 @@
+import multiprocessing
+import queue
+import traceback
+from multiprocessing import shared_memory
+from typing import Any, Callable, Iterator, Sequence
+
+import numpy as np
+
+import dino.structs
+
+# The interval at which the consumer checks that the worker of the next item is still alive
+_POLL_SECONDS = 0.1
+
+
+def _worker(
+    items: Sequence[Any],
+    indices: range,
+    fn: Callable[[Any, np.random.Generator], dino.structs.Image],
+    seed_sequence: np.random.SeedSequence,
+    shm_name: str,
+    slot_bytes: int,
+    free_slots: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+) -> None:
+    # Attaching registers the shared memory with the resource tracker, which workers share with
+    # the consumer for every start method. The consumer unlinks it, so it is not unregistered
+    # here, which would remove the registration of the consumer.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    rng = np.random.default_rng(seed_sequence)
+
+    index = None
+    try:
+        for item, index in zip(items, indices):
+            image = fn(item, rng)
+            if image.voxels.nbytes > slot_bytes:
+                raise ValueError(
+                    f"Image of {image.voxels.nbytes} bytes does not fit in slots of {slot_bytes} bytes."
+                )
+
+            slot = free_slots.get()
+            slot_voxels = np.ndarray(
+                image.voxels.shape, image.voxels.dtype, buffer=shm.buf, offset=slot * slot_bytes
+            )
+            slot_voxels[...] = image.voxels
+            del slot_voxels
+            results.put(
+                (
+                    "image",
+                    index,
+                    slot,
+                    image.voxels.shape,
+                    image.voxels.dtype.str,
+                    image.affine,
+                    image.rescale_slope,
+                    image.rescale_intercept,
+                )
+            )
+    except Exception:
+        results.put(("error", index, traceback.format_exc()))
+    finally:
+        shm.close()
+
+
+def _next_message(
+    results: multiprocessing.Queue, process: multiprocessing.process.BaseProcess
+) -> tuple | None:
+    """Waits for the next message, returns None once the process died without sending one."""
+    while True:
+        try:
+            return results.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            # A worker flushes its messages before it exits, so they have arrived by now.
+            try:
+                return results.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                return None
+
+
+class Loader:
+    """Runs a function producing images in worker processes, and prefetches its results.
+
+    Item i is processed by worker i % num_workers, with a random generator per worker seeded
+    from `seed`, so the images only depend on the seed and not on the timing of the workers.
+    Voxels are returned through a ring buffer of shared memory slots, without copying them in
+    the consumer. Each image is only valid until the next image is requested, copy the voxels
+    to keep them longer.
+
+    Example:
+        def load(path, rng):
+            image = dn.rescale_image(dn.create_image(read_slices(path)), (1, 1, 1))
+            return dn.random_crop_or_pad_image(image, (64, 64, 64), rng=rng)
+
+        with Loader(paths, load, slot_bytes=64**3 * 4, seed=0) as loader:
+            for image in loader:
+                train(image)
+
+    Args:
+        items: the items to process, e.g. paths of series
+        fn: a picklable function creating an image from an item and a random generator
+        slot_bytes: the max number of bytes of the voxels of an image
+        num_workers: the number of worker processes
+        prefetch: the number of images each worker may prepare ahead
+        seed (optional): the seed of the random generators of the workers
+    """
+
+    def __init__(
+        self,
+        items: Sequence[Any],
+        fn: Callable[[Any, np.random.Generator], dino.structs.Image],
+        *,
+        slot_bytes: int,
+        num_workers: int = 2,
+        prefetch: int = 2,
+        seed: int | None = None,
+    ):
+        if slot_bytes <= 0:
+            raise ValueError("slot_bytes should be positive")
+        if num_workers < 1:
+            raise ValueError("num_workers should be positive")
+        if prefetch < 1:
+            raise ValueError("prefetch should be positive")
+
+        self.items = items
+        self.fn = fn
+        self.slot_bytes = slot_bytes
+        self.num_workers = num_workers
+        self.prefetch = prefetch
+        self._seed_sequence = np.random.SeedSequence(seed)
+
+        # Every worker owns prefetch slots, so a worker that runs ahead can never take the slot
+        # of the item that the consumer waits for.
+        num_slots = num_workers * prefetch
+        self._shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_bytes)
+
+    def __enter__(self) -> "Loader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def close(self) -> None:
+        try:
+            self._shm.close()
+        except BufferError:
+            # Images of the consumer still refer to the shared memory, it is freed with them.
+            pass
+        self._shm.unlink()
+
+    def __iter__(self) -> Iterator[dino.structs.Image]:
+        context = multiprocessing.get_context()
+        # A new seed per epoch, so epochs differ but remain reproducible
+        (epoch_seed_sequence,) = self._seed_sequence.spawn(1)
+
+        results = context.Queue()
+        free_slots = []
+        processes = []
+        for worker, seed_sequence in enumerate(epoch_seed_sequence.spawn(self.num_workers)):
+            free_slots.append(context.Queue())
+            for slot in range(worker * self.prefetch, (worker + 1) * self.prefetch):
+                free_slots[worker].put(slot)
+
+            indices = range(worker, len(self.items), self.num_workers)
+            process = context.Process(
+                target=_worker,
+                args=(
+                    [self.items[index] for index in indices],
+                    indices,
+                    self.fn,
+                    seed_sequence,
+                    self._shm.name,
+                    self.slot_bytes,
+                    free_slots[worker],
+                    results,
+                ),
+                daemon=True,
+            )
+            process.start()
+            processes.append(process)
+
+        pending: dict[int, tuple] = {}
+        try:
+            for index in range(len(self.items)):
+                while index not in pending:
+                    message = _next_message(results, processes[index % self.num_workers])
+                    if message is None:
+                        worker = index % self.num_workers
+                        raise RuntimeError(
+                            f"Worker {worker} exited with code {processes[worker].exitcode} "
+                            f"before producing item {index}."
+                        )
+                    if message[0] == "error":
+                        raise RuntimeError(f"Worker failed on item {message[1]}:\n{message[2]}")
+                    pending[message[1]] = message
+
+                _, _, slot, shape, dtype, affine, rescale_slope, rescale_intercept = pending.pop(
+                    index
+                )
+                voxels = np.ndarray(
+                    shape, np.dtype(dtype), buffer=self._shm.buf, offset=slot * self.slot_bytes
+                )
+                yield dino.structs.Image(affine, voxels, rescale_slope, rescale_intercept)
+
+                # The consumer is done with the image, the worker may reuse its slot.
+                del voxels
+                free_slots[index % self.num_workers].put(slot)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
@@ -1,57 +1,362 @@
+import concurrent.futures
 import dataclasses
+from typing import Callable, Iterator
 
 import numpy as np
 import numpy.typing as npt
-import scipy.ndimage
 
 import dino.structs
+import dino.tracing
 
+# scipy is only imported by the functions that interpolate, as it slows down `import dino` for
+# code that only crops and pads.
 
-def _resize(image: dino.structs.Image, size: np.ndarray, order: int) -> dino.structs.Image:
-    if image.voxels is None:
-        raise ValueError(
-            "Image does not have voxels. Try again after loading with `create_image(..., load_voxels=True)`."
+# Tolerance on the orientation of images that are considered aligned with the world axes
+AXIS_ALIGNED_ATOL = 1e-6
+
+# Extra input slices around a slab for the spline prefilter of order > 1. Its influence decays
+# exponentially with the distance, so beyond this halo it is below float32 precision.
+_SPLINE_HALO = 16
+
+# The number of output slices per slab of the tiled resize backend, when no tile size is given
+_DEFAULT_TILE_SIZE = 32
+
+
+def _grid_factors(size_from: np.ndarray, size_to: np.ndarray) -> np.ndarray:
+    # The grid of zoom(..., grid_mode=False) maps the first and last voxels onto each other
+    return np.divide(
+        size_from - 1, size_to - 1, out=np.ones(3), where=size_to > 1, dtype=np.float64
+    )
+
+
+def _slab_input_range(
+    image: dino.structs.Image,
+    slab: tuple[int, int],
+    factors_grid: np.ndarray,
+    aa_sigma: np.ndarray,
+    order: int,
+) -> tuple[int, int]:
+    start, end = slab
+
+    # The input slices needed for the output slices of the slab, with a halo for the gaussian
+    # filter and the interpolation
+    halo = int(4 * aa_sigma[0] + 0.5) + order + 1 + (_SPLINE_HALO if order > 1 else 0)
+    input_start = max(0, int(np.floor(start * factors_grid[0])) - halo)
+    input_end = min(image.size[0], int(np.ceil((end - 1) * factors_grid[0])) + halo + 1)
+    return input_start, input_end
+
+
+def _slab_coordinates(
+    slab: tuple[int, int], input_start: int, size: np.ndarray, factors_grid: np.ndarray
+) -> tuple[np.ndarray, ...]:
+    start, end = slab
+
+    # The coordinates are computed exactly like zoom does, and shifting them by an integer is
+    # exact, so the output is identical to zooming the whole volume at once.
+    return np.meshgrid(
+        np.arange(start, end) * factors_grid[0] - input_start,
+        np.arange(size[1]) * factors_grid[1],
+        np.arange(size[2]) * factors_grid[2],
+        indexing="ij",
+    )
+
+
+def _physical_float32(image: dino.structs.Image, voxels: np.ndarray) -> np.ndarray:
+    """Casts (a region of) the stored voxels of an image to float32 physical values."""
+    if not image.is_rescaled:
+        return voxels.astype(np.float32, copy=False)
+    # Rescale while casting, so no intermediate array of the stored dtype is created.
+    voxels = np.multiply(voxels, np.float32(image.rescale_slope), dtype=np.float32)
+    voxels += np.float32(image.rescale_intercept)
+    return voxels
+
+
+def _physical_pad_value(
+    image: dino.structs.Image,
+    pad_value: int | float | None,
+    coordinates_min: np.ndarray | None = None,
+    coordinates_max: np.ndarray | None = None,
+) -> int | float:
+    # The default pad value reads all voxels, so it is not determined when the voxel coordinates
+    # that are interpolated are all inside the image, and no voxel is padded
+    if pad_value is not None:
+        return pad_value
+    if (
+        coordinates_min is not None
+        and coordinates_max is not None
+        and np.all(coordinates_min >= 0)
+        and np.all(coordinates_max <= image.size - 1)
+    ):
+        return 0
+    return image.to_physical_value(image.min)
+
+
+def _resize_slab(
+    image: dino.structs.Image,
+    voxels_resized: np.ndarray,
+    slab: tuple[int, int],
+    factors_grid: np.ndarray,
+    aa_sigma: np.ndarray,
+    order: int,
+) -> None:
+    input_start, input_end = _slab_input_range(image, slab, factors_grid, aa_sigma, order)
+
+    import scipy.ndimage
+
+    voxels = _physical_float32(image, image.load_voxels(input_start, input_end))
+    with dino.tracing.span("resize.blur"):
+        voxels_blurred = scipy.ndimage.gaussian_filter(voxels, aa_sigma, mode="nearest")
+
+    with dino.tracing.span("resize.zoom"):
+        scipy.ndimage.map_coordinates(
+            voxels_blurred,
+            _slab_coordinates(slab, input_start, np.array(voxels_resized.shape), factors_grid),
+            output=voxels_resized[slab[0] : slab[1]],
+            order=order,
+            mode="nearest",
         )
-    if len(image.voxels.shape) != 3:
-        raise ValueError("Image does not have 3D voxels.")
+
+
+def _resize_tiled(
+    image: dino.structs.Image,
+    size: np.ndarray,
+    order: int,
+    tile_size: int,
+    num_workers: int,
+    aa_sigma: np.ndarray,
+) -> np.ndarray:
+    factors_grid = _grid_factors(image.size, size)
+
+    voxels_resized = np.empty(size, dtype=np.float32)
+    slabs = [(start, min(start + tile_size, size[0])) for start in range(0, size[0], tile_size)]
+
+    def resize_slab(slab: tuple[int, int]) -> None:
+        _resize_slab(image, voxels_resized, slab, factors_grid, aa_sigma, order)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # Consume the results, so that exceptions raised in the workers are propagated.
+        list(executor.map(resize_slab, slabs))
+
+    return voxels_resized
+
+
+def _resize_scipy(
+    image: dino.structs.Image,
+    size: np.ndarray,
+    order: int,
+    tile_size: int | None,
+    num_workers: int,
+) -> np.ndarray:
+    import scipy.ndimage
 
     factors_zoom = size / image.size
-    voxels = image.voxels.astype(np.float32)
+    voxels = _physical_float32(image, image.voxels)
 
     # Apply anti aliasing when downscaling, sigma formula taken from skimage:
     # https://github.com/scikit-image/scikit-image/blob/39a94a08ef10b1ae4d6e0e04668c45cde94c55b4/skimage/transform/_warps.py#L163
     aa_sigma = np.maximum(0, ((1 / factors_zoom) - 1) / 2)
     # Mode refers to how to pad the volume, mode="nearest" does _not_ mean nearest neighbour interpolation, see:
     # https://docs.scipy.org/doc/scipy/tutorial/ndimage.html?highlight=spline%20interpolation#interpolation-boundary-handling
-    voxels_blurred = scipy.ndimage.gaussian_filter(voxels, aa_sigma, mode="nearest")
-    voxels_resized = scipy.ndimage.zoom(
-        voxels_blurred,
-        zoom=factors_zoom,
-        order=order,
-        mode="nearest",
-        grid_mode=False,
-    )
+    with dino.tracing.span("resize.blur"):
+        voxels_blurred = scipy.ndimage.gaussian_filter(voxels, aa_sigma, mode="nearest")
+    with dino.tracing.span("resize.zoom"):
+        return scipy.ndimage.zoom(
+            voxels_blurred,
+            zoom=factors_zoom,
+            order=order,
+            mode="nearest",
+            grid_mode=False,
+        )
+
 
-    if isinstance(image.voxels.flat[0], np.bool_):
+def _gaussian_filter_numpy(voxels: np.ndarray, sigma: np.ndarray) -> np.ndarray:
+    """Blurs axis by axis, as `scipy.ndimage.gaussian_filter` with mode="nearest"."""
+    for axis, axis_sigma in enumerate(sigma):
+        if axis_sigma == 0:
+            continue
+        # The same kernel as scipy, truncated at 4 sigma
+        radius = int(4 * axis_sigma + 0.5)
+        weights = np.exp(-0.5 * (np.arange(-radius, radius + 1) / axis_sigma) ** 2)
+        weights /= weights.sum()
+
+        pad_width = [(0, 0)] * 3
+        pad_width[axis] = (radius, radius)
+        voxels_padded = np.pad(voxels, pad_width, mode="edge")
+
+        voxels = np.zeros_like(voxels)
+        index = [slice(None)] * 3
+        for offset, weight in enumerate(weights):
+            index[axis] = slice(offset, offset + voxels.shape[axis])
+            voxels += np.float32(weight) * voxels_padded[tuple(index)]
+    return voxels
+
+
+def _zoom_linear_numpy(voxels: np.ndarray, size: np.ndarray) -> np.ndarray:
+    """Interpolates linearly axis by axis, as `scipy.ndimage.zoom` with order=1."""
+    for axis in range(3):
+        size_in, size_out = voxels.shape[axis], size[axis]
+        if size_in == size_out:
+            continue
+        # The corners of the input and output are aligned, like zoom with grid_mode=False
+        coordinates = np.arange(size_out) * ((size_in - 1) / max(1, size_out - 1))
+        lower = np.minimum(np.floor(coordinates).astype(int), size_in - 1)
+        upper = np.minimum(lower + 1, size_in - 1)
+        weights_shape = [1, 1, 1]
+        weights_shape[axis] = -1
+        weights = (coordinates - lower).astype(np.float32).reshape(weights_shape)
+
+        voxels_lower = np.take(voxels, lower, axis=axis)
+        voxels_upper = np.take(voxels, upper, axis=axis)
+        voxels = voxels_lower + (voxels_upper - voxels_lower) * weights
+    return voxels
+
+
+def _resize_numpy(
+    image: dino.structs.Image,
+    size: np.ndarray,
+    order: int,
+    tile_size: int | None,
+    num_workers: int,
+) -> np.ndarray:
+    if order != 1:
+        raise ValueError(f"the numpy backend only supports order 1, but got {order}")
+
+    voxels = _physical_float32(image, image.voxels)
+    aa_sigma = np.maximum(0, ((image.size / size) - 1) / 2)
+    with dino.tracing.span("resize.blur"):
+        voxels_blurred = _gaussian_filter_numpy(voxels, aa_sigma)
+    with dino.tracing.span("resize.zoom"):
+        return _zoom_linear_numpy(voxels_blurred, size)
+
+
+def _resize_tiled_backend(
+    image: dino.structs.Image,
+    size: np.ndarray,
+    order: int,
+    tile_size: int | None,
+    num_workers: int,
+) -> np.ndarray:
+    tile_size = _DEFAULT_TILE_SIZE if tile_size is None else tile_size
+    aa_sigma = np.maximum(0, ((image.size / size) - 1) / 2)
+    return _resize_tiled(image, size, order, tile_size, num_workers, aa_sigma)
+
+
+# A resize backend resizes the physical voxels of an image to float32 voxels of a size, given
+# the interpolation order, tile size and number of workers of the call.
+ResizeBackend = Callable[[dino.structs.Image, np.ndarray, int, int | None, int], np.ndarray]
+
+_RESIZE_BACKENDS: dict[str, ResizeBackend] = {
+    "scipy": _resize_scipy,
+    "numpy": _resize_numpy,
+    "tiled": _resize_tiled_backend,
+}
+_resize_backend = "scipy"
+
+
+def register_resize_backend(name: str, backend: ResizeBackend) -> None:
+    """Registers a backend that `resize_image` and `rescale_image` can use by name.
+
+    Args:
+        name: the name of the backend
+        backend: a function of the image, the output size, the interpolation order, the tile
+            size and the number of workers, returning the resized float32 physical voxels
+    """
+    _RESIZE_BACKENDS[name] = backend
+
+
+def set_resize_backend(name: str) -> str:
+    """Sets the default backend of `resize_image` and `rescale_image`.
+
+    Args:
+        name: the name of a registered backend, "scipy", "numpy" or "tiled" by default
+
+    Returns:
+        the previous default backend, e.g. to restore it
+    """
+    global _resize_backend
+    _verify_resize_backend(name)
+    previous, _resize_backend = _resize_backend, name
+    return previous
+
+
+def _verify_resize_backend(name: str) -> None:
+    if name not in _RESIZE_BACKENDS:
+        raise ValueError(f"backend should be one of {list(_RESIZE_BACKENDS)}, but got {name}")
+
+
+def _resize(
+    image: dino.structs.Image,
+    size: np.ndarray,
+    order: int,
+    tile_size: int | None = None,
+    num_workers: int = 1,
+    backend: str | None = None,
+) -> dino.structs.Image:
+    if tile_size is not None and tile_size < 1:
+        raise ValueError("tile_size should be positive")
+    if num_workers < 1:
+        raise ValueError("num_workers should be positive")
+    if len(image.size) != 3:
+        raise ValueError("Image does not have 3D voxels.")
+
+    if backend is None:
+        backend = "tiled" if tile_size is not None else _resize_backend
+    _verify_resize_backend(backend)
+    voxels_resized = _RESIZE_BACKENDS[backend](image, size, order, tile_size, num_workers)
+
+    # Loading zero slices only determines the dtype, also for images with unloaded voxels
+    if image.load_voxels(0, 0).dtype == np.bool_:
         # a boolean array was casted to 0.0 or 1.0, cast it back to bool here
         voxels_resized = voxels_resized > 0.5
 
-    factor_spacing = (size - 1) / (image.size - 1)
-    spacing = image.spacing / factor_spacing
-
-    affine = image.affine.copy()
-    affine[:3, :3] = image.orientation @ np.diag(spacing)
     image = dataclasses.replace(
         image,
-        affine=affine,
+        affine=_resize_affine(image.affine, image.size, size),
         voxels=voxels_resized,
+        rescale_slope=1.0,
+        rescale_intercept=0.0,
     )
 
     return image
 
 
+def _resize_affine(affine: np.ndarray, size_from: np.ndarray, size_to: np.ndarray) -> np.ndarray:
+    spacing_from = np.linalg.norm(affine[:3, :3], axis=0)
+    orientation = affine[:3, :3] @ np.diag(1 / spacing_from)
+
+    factor_spacing = (size_to - 1) / (size_from - 1)
+    spacing = spacing_from / factor_spacing
+
+    affine = affine.copy()
+    affine[:3, :3] = orientation @ np.diag(spacing)
+    return affine
+
+
+def _verify_size(size: np.ndarray) -> None:
+    if size.shape != (3,):
+        raise ValueError("size should be a 3D vector")
+    if not np.issubdtype(size.dtype, np.integer):
+        raise ValueError("size should be an int vector")
+    if not np.all(size > 0):
+        raise ValueError("size should only have positive values")
+
+
+def _verify_spacing(spacing: np.ndarray) -> None:
+    if spacing.shape != (3,):
+        raise ValueError("spacing should be a 3D vector")
+    if not np.all(spacing > 0):
+        raise ValueError("spacing should only have positive values")
+
+
+@dino.tracing.traced
 def resize_image(
-    image: dino.structs.Image, size: npt.ArrayLike, *, order: int = 1
+    image: dino.structs.Image,
+    size: npt.ArrayLike,
+    *,
+    order: int = 1,
+    tile_size: int | None = None,
+    num_workers: int = 1,
+    backend: str | None = None,
 ) -> dino.structs.Image:
     """Creates an images resized to a specific size.
 
@@ -59,24 +364,30 @@ def resize_image(
         image: the image to be resized
         size: the output size of the image
         order: what order to use for the interpolation, default 1 is linear
+        tile_size (optional): resize in slabs of this many output slices, which bounds the
+            memory of temporaries. The output is identical to resizing the whole volume at once.
+        num_workers: the number of threads resizing slabs, only used with tile_size
+        backend (optional): the name of the resize backend, see `set_resize_backend`. Defaults
+            to "tiled" when tile_size is given, and to the default backend otherwise.
 
     Returns:
         a newly created image with the specified size
     """
     size = np.asarray(size)
+    _verify_size(size)
 
-    if size.shape != (3,):
-        raise ValueError("size should be a 3D vector")
-    if not np.issubdtype(size.dtype, np.integer):
-        raise ValueError("size should be an int vector")
-    if not np.all(size > 0):
-        raise ValueError("size should only have positive values")
-
-    return _resize(image, size, order)
+    return _resize(image, size, order, tile_size, num_workers, backend)
 
 
+@dino.tracing.traced
 def rescale_image(
-    image: dino.structs.Image, spacing: npt.ArrayLike, *, order: int = 1
+    image: dino.structs.Image,
+    spacing: npt.ArrayLike,
+    *,
+    order: int = 1,
+    tile_size: int | None = None,
+    num_workers: int = 1,
+    backend: str | None = None,
 ) -> dino.structs.Image:
     """Creates an images rescaled close to a specific spacing.
 
@@ -88,27 +399,369 @@ def rescale_image(
         image: the image to be resized
         spacing: the output spacing of the image
         order: what order to use for the interpolation, default 1 is linear
+        tile_size (optional): resize in slabs of this many output slices, which bounds the
+            memory of temporaries. The output is identical to resizing the whole volume at once.
+        num_workers: the number of threads resizing slabs, only used with tile_size
+        backend (optional): the name of the resize backend, see `set_resize_backend`. Defaults
+            to "tiled" when tile_size is given, and to the default backend otherwise.
 
     Returns:
         a newly created image with the specified spacing
     """
     spacing = np.asarray(spacing)
+    _verify_spacing(spacing)
 
-    if spacing.shape != (3,):
-        raise ValueError("spacing should be a 3D vector")
-    if not np.all(spacing > 0):
-        raise ValueError("spacing should only have positive values")
+    size = _rescale_size(image.affine, image.size, spacing)
+
+    return _resize(image, size, order, tile_size, num_workers, backend)
+
+
+@dino.tracing.traced
+def resample_to_grid(
+    image: dino.structs.Image,
+    target_affine: npt.ArrayLike,
+    target_size: npt.ArrayLike,
+    *,
+    order: int = 1,
+    pad_value: int | float | None = None,
+) -> dino.structs.Image:
+    """Creates an image by resampling onto a target grid in a single interpolation pass.
 
+    Only the output voxels are interpolated, and only the region of the image that the target
+    grid covers is read and anti-aliased. Resizing, rescaling, cropping and padding are all
+    special cases of choosing the target grid. The resampled voxels are physical values.
+
+    Args:
+        image: the image to be resampled
+        target_affine: the 4x4 affine of the target grid
+        target_size: the size of the target grid
+        order: what order to use for the interpolation, default 1 is linear
+        pad_value (optional): the value of voxels outside the image. Defaults to min value in voxels.
+
+    Returns:
+        a newly created image with the target affine and size
+    """
+    import scipy.ndimage
+
+    target_affine = np.asarray(target_affine, dtype=float)
+    target_size = np.asarray(target_size)
+
+    if target_affine.shape != (4, 4):
+        raise ValueError("target_affine should be a 4x4 matrix")
+    if target_size.shape != (3,):
+        raise ValueError("target_size should be a 3D vector")
+    if not np.issubdtype(target_size.dtype, np.integer):
+        raise ValueError("target_size should be an int vector")
+    if not np.all(target_size > 0):
+        raise ValueError("target_size should only have positive values")
+
+    # Maps target voxel coordinates onto image voxel coordinates
+    matrix = image.inverse_affine @ target_affine
+
+    # Apply anti aliasing when downscaling, with the sigma formula of _resize. Along each image
+    # axis, take the target axis with the largest step per target voxel. As the corners are
+    # aligned, m target voxels with that step span the same as resizing (m - 1) * step + 1 image
+    # voxels to m, so the size ratio of _resize is ((m - 1) * step + 1) / m.
+    steps = np.abs(matrix[:3, :3])
+    step = steps.max(axis=1)
+    size_steps = target_size[steps.argmax(axis=1)]
+    factors = np.divide(
+        (size_steps - 1) * step + 1, size_steps, out=step.copy(), where=size_steps > 1
+    )
+    aa_sigma = np.maximum(0, (factors - 1) / 2)
+    aa_halo = np.ceil(4 * aa_sigma + 0.5).astype(int)
+
+    corners = np.array(list(np.ndindex(2, 2, 2))) * (target_size - 1)
+    corners_image = (matrix @ np.c_[corners, np.ones(8)].T)[:3]
+    # The region needed for the interpolation, widened by the support of the anti aliasing
+    start, end = _coordinates_region(
+        corners_image.min(axis=1) - aa_halo, corners_image.max(axis=1) + aa_halo, image.size, order
+    )
+
+    pad_value = _physical_pad_value(
+        image, pad_value, corners_image.min(axis=1), corners_image.max(axis=1)
+    )
+
+    if np.any(start >= end):
+        # The target grid does not overlap with the image
+        voxels_resampled = np.full(target_size, pad_value, dtype=np.float32)
+    else:
+        voxels = image.load_voxels(start[0], end[0])[:, start[1] : end[1], start[2] : end[2]]
+        voxels = _physical_float32(image, voxels)
+        voxels = scipy.ndimage.gaussian_filter(voxels, aa_sigma, mode="nearest")
+
+        translation = np.eye(4)
+        translation[:3, 3] = -start
+        voxels_resampled = scipy.ndimage.affine_transform(
+            voxels,
+            translation @ matrix,
+            output_shape=tuple(target_size),
+            order=order,
+            mode="constant",
+            cval=pad_value,
+        )
+
+    # Loading zero slices only determines the dtype, also for images with unloaded voxels
+    if image.load_voxels(0, 0).dtype == np.bool_:
+        # a boolean array was casted to 0.0 or 1.0, cast it back to bool here
+        voxels_resampled = voxels_resampled > 0.5
+
+    return dataclasses.replace(
+        image,
+        affine=target_affine,
+        voxels=voxels_resampled,
+        rescale_slope=1.0,
+        rescale_intercept=0.0,
+    )
+
+
+def _resize_labels_nearest(image: dino.structs.Image, size: np.ndarray) -> np.ndarray:
+    # The nearest input voxel of every output voxel per axis, indexing keeps the native dtype
+    indices = [
+        np.minimum(np.floor(np.arange(size_to) * factor + 0.5).astype(int), size_from - 1)
+        for size_from, size_to, factor in zip(image.size, size, _grid_factors(image.size, size))
+    ]
+    voxels = image.load_voxels(indices[0][0], indices[0][-1] + 1)
+    return voxels[np.ix_(indices[0] - indices[0][0], indices[1], indices[2])]
+
+
+def _resize_labels_smooth(
+    image: dino.structs.Image, size: np.ndarray, order: int, tile_size: int
+) -> np.ndarray:
+    import scipy.ndimage
+
+    factors_grid = _grid_factors(image.size, size)
+    aa_sigma = np.maximum(0, ((image.size / size) - 1) / 2)
+    labels = np.unique(image.voxels)
+
+    voxels_resized = np.empty(size, dtype=image.voxels.dtype)
+    for start in range(0, size[0], tile_size):
+        slab = (start, min(start + tile_size, size[0]))
+        input_start, input_end = _slab_input_range(image, slab, factors_grid, aa_sigma, order)
+        voxels = image.load_voxels(input_start, input_end)
+        # All labels share the coordinates of the slab
+        coordinates = _slab_coordinates(slab, input_start, size, factors_grid)
+
+        # Every output voxel gets the label with the highest interpolated one-hot score
+        scores_best = np.full(coordinates[0].shape, -np.inf, dtype=np.float32)
+        for label in labels:
+            one_hot = (voxels == label).astype(np.float32)
+            one_hot = scipy.ndimage.gaussian_filter(one_hot, aa_sigma, mode="nearest")
+            scores = scipy.ndimage.map_coordinates(
+                one_hot, coordinates, order=order, mode="nearest", output=np.float32
+            )
+            is_better = scores > scores_best
+            scores_best[is_better] = scores[is_better]
+            voxels_resized[slab[0] : slab[1]][is_better] = label
+
+    return voxels_resized
+
+
+def _resize_labels(
+    image: dino.structs.Image, size: np.ndarray, order: int, tile_size: int
+) -> dino.structs.Image:
+    if tile_size < 1:
+        raise ValueError("tile_size should be positive")
+    dtype = image.load_voxels(0, 0).dtype
+    if not (dtype == np.bool_ or np.issubdtype(dtype, np.integer)):
+        raise ValueError(f"Label images should have bool or integer voxels, but got {dtype}")
+
+    if order == 0:
+        voxels_resized = _resize_labels_nearest(image, size)
+    else:
+        voxels_resized = _resize_labels_smooth(image, size, order, tile_size)
+
+    return dataclasses.replace(
+        image, affine=_resize_affine(image.affine, image.size, size), voxels=voxels_resized
+    )
+
+
+@dino.tracing.traced
+def resize_label_image(
+    image: dino.structs.Image, size: npt.ArrayLike, *, order: int = 0, tile_size: int = 16
+) -> dino.structs.Image:
+    """Creates a label image, e.g. a segmentation, resized to a specific size.
+
+    With order 0 every output voxel takes the label of the nearest input voxel, without
+    converting the voxels to float. With a higher order, the one-hot encoding of every label is
+    anti-aliased and interpolated on the same grid, slab by slab, and every output voxel takes
+    the label with the highest score. The affine is identical to that of `resize_image`.
+
+    Args:
+        image: the label image to be resized, with bool or integer voxels
+        size: the output size of the image
+        order: what order to use for the interpolation, default 0 is nearest neighbour
+        tile_size: the number of output slices interpolated at once when order > 0
+
+    Returns:
+        a newly created label image with the specified size
+    """
+    size = np.asarray(size)
+    _verify_size(size)
+
+    return _resize_labels(image, size, order, tile_size)
+
+
+@dino.tracing.traced
+def rescale_label_image(
+    image: dino.structs.Image, spacing: npt.ArrayLike, *, order: int = 0, tile_size: int = 16
+) -> dino.structs.Image:
+    """Creates a label image, e.g. a segmentation, rescaled close to a specific spacing.
+
+    See `rescale_image` for how the spacing is chosen and `resize_label_image` for how the
+    labels are resized.
+
+    Args:
+        image: the label image to be rescaled, with bool or integer voxels
+        spacing: the output spacing of the image
+        order: what order to use for the interpolation, default 0 is nearest neighbour
+        tile_size: the number of output slices interpolated at once when order > 0
+
+    Returns:
+        a newly created label image with the specified spacing
+    """
+    spacing = np.asarray(spacing)
+    _verify_spacing(spacing)
+
+    size = _rescale_size(image.affine, image.size, spacing)
+
+    return _resize_labels(image, size, order, tile_size)
+
+
+def _coordinates_region(
+    coordinates_min: np.ndarray, coordinates_max: np.ndarray, size: np.ndarray, order: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the start and end of the voxels needed to interpolate within the coordinates."""
+    # The spline prefilter of order > 1 depends on all voxels, but its influence decays with the
+    # distance, so the halo makes the region as exact as the whole image within float32.
+    halo = order + 1 if order <= 1 else _SPLINE_HALO
+    start = np.maximum(0, np.floor(coordinates_min).astype(int) - halo)
+    end = np.minimum(size, np.ceil(coordinates_max).astype(int) + halo + 1)
+    return start, end
+
+
+def _map_coordinates(
+    image: dino.structs.Image, coordinates: np.ndarray, order: int, pad_value: int | float
+) -> np.ndarray:
+    """Interpolates the physical values at (3, ...) voxel coordinates, reading only their region."""
+    import scipy.ndimage
+
+    coordinates_flat = coordinates.reshape(3, -1)
+    start, end = _coordinates_region(
+        coordinates_flat.min(axis=1), coordinates_flat.max(axis=1), image.size, order
+    )
+
+    if np.any(start >= end):
+        # The coordinates do not overlap with the image
+        return np.full(coordinates.shape[1:], pad_value, dtype=np.float32)
+
+    voxels = image.load_voxels(start[0], end[0])[:, start[1] : end[1], start[2] : end[2]]
+    return scipy.ndimage.map_coordinates(
+        _physical_float32(image, voxels),
+        coordinates - start.reshape(3, *[1] * (coordinates.ndim - 1)),
+        order=order,
+        mode="constant",
+        cval=pad_value,
+        output=np.float32,
+    )
+
+
+def _world_to_voxel(image: dino.structs.Image, points: np.ndarray) -> np.ndarray:
+    """Maps (..., 3) world points to (3, ...) voxel coordinates with the cached inverse affine."""
+    inverse_affine = image.inverse_affine
+    coordinates = np.tensordot(inverse_affine[:3, :3], points, axes=([1], [-1]))
+    coordinates += inverse_affine[:3, 3].reshape(3, *[1] * (points.ndim - 1))
+    return coordinates
+
+
+@dino.tracing.traced
+def sample_world_points(
+    image: dino.structs.Image,
+    points: npt.ArrayLike,
+    *,
+    order: int = 1,
+    pad_value: int | float | None = None,
+    chunk_size: int = 2**18,
+) -> np.ndarray:
+    """Interpolates the voxels of an image at world points.
+
+    The points are mapped to voxel coordinates in chunks, so the memory of temporaries does not
+    grow with the number of points. The voxels covering the points are converted to physical
+    values, and for order > 1 spline-filtered, only once for all chunks.
+
+    Args:
+        image: the image to sample
+        points: the (N, 3) world points
+        order: what order to use for the interpolation, default 1 is linear
+        pad_value (optional): the value of points outside the image. Defaults to min value in voxels.
+        chunk_size: the number of points interpolated at once
+
+    Returns:
+        the (N,) float32 physical values at the points
+    """
+    import scipy.ndimage
+
+    points = np.asarray(points, dtype=float)
+    if points.ndim != 2 or points.shape[1] != 3:
+        raise ValueError("points should have shape (N, 3)")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size should be positive")
+
+    if len(points) == 0:
+        return np.empty(0, dtype=np.float32)
+
+    # The region of voxels covering all points, found chunk by chunk
+    chunks = [slice(start, start + chunk_size) for start in range(0, len(points), chunk_size)]
+    coordinates_min = np.full(3, np.inf)
+    coordinates_max = np.full(3, -np.inf)
+    for chunk in chunks:
+        coordinates = _world_to_voxel(image, points[chunk])
+        coordinates_min = np.minimum(coordinates_min, coordinates.min(axis=1))
+        coordinates_max = np.maximum(coordinates_max, coordinates.max(axis=1))
+
+    pad_value = _physical_pad_value(image, pad_value, coordinates_min, coordinates_max)
+    values = np.full(len(points), pad_value, dtype=np.float32)
+    start, end = _coordinates_region(coordinates_min, coordinates_max, image.size, order)
+    if np.any(start >= end):
+        # The points do not overlap with the image
+        return values
+
+    voxels = image.load_voxels(start[0], end[0])[:, start[1] : end[1], start[2] : end[2]]
+    voxels = _physical_float32(image, voxels)
+    if order > 1:
+        # The prefilter of map_coordinates, applied once instead of per chunk
+        voxels = scipy.ndimage.spline_filter(voxels, order, output=np.float64, mode="constant")
+
+    for chunk in chunks:
+        coordinates = _world_to_voxel(image, points[chunk]) - start.reshape(3, 1)
+        scipy.ndimage.map_coordinates(
+            voxels,
+            coordinates,
+            output=values[chunk],
+            order=order,
+            mode="constant",
+            cval=pad_value,
+            prefilter=False,
+        )
+    return values
+
+
+def _rescale_size(affine: np.ndarray, size: np.ndarray, spacing: np.ndarray) -> np.ndarray:
     # approximate a size close to the desired spacing
-    apx_distance = (image.size - 1) * image.spacing
+    apx_distance = (size - 1) * np.linalg.norm(affine[:3, :3], axis=0)
     apx_size = (apx_distance / spacing) + 1
 
-    size = np.round(apx_size).astype(int)
+    return np.round(apx_size).astype(int)
 
-    return _resize(image, size, order)
 
+def _translate_affine(affine: np.ndarray, offset: np.ndarray) -> np.ndarray:
+    position = (affine @ np.array([*offset, 1]))[:3]
+    affine = affine.copy()
+    affine[:3, 3] = position
+    return affine
 
-def _crop_by_bounds(image: dino.structs.Image, bounds: np.ndarray) -> dino.structs.Image:
+
+def _verify_crop_bounds(bounds: np.ndarray, size: np.ndarray) -> None:
     if bounds.shape != (2, 3):
         raise ValueError("crop_bounds should be a 2x3 matrix")
     if not np.issubdtype(bounds.dtype, np.integer):
@@ -118,37 +771,93 @@ def _crop_by_bounds(image: dino.structs.Image, bounds: np.ndarray) -> dino.struc
 
     if not np.all(start >= 0):
         raise ValueError("crop_bounds should only have positive values")
-    if not np.all(end <= image.size):
+    if not np.all(end <= size):
         raise ValueError("crop_bounds should be smaller than the image size")
     if not np.all(start < end):
         raise ValueError("crop_bounds should have start < end")
 
-    voxels = image.voxels[start[0] : end[0], start[1] : end[1], start[2] : end[2]]
-    position = (image.affine @ np.array([*start, 1]))[:3]
-    affine = image.affine.copy()
-    affine[:3, 3] = position
-
-    return dataclasses.replace(image, voxels=voxels, affine=affine)
-
 
-def _crop_by_bbx(image: dino.structs.Image, bbx: np.ndarray) -> dino.structs.Image:
+def _bbx_to_bounds(bbx: np.ndarray, size: np.ndarray) -> np.ndarray:
     if bbx.shape != (2, 3):
         raise ValueError("bbx should be a 2x3 matrix")
     if not np.issubdtype(bbx.dtype, np.integer):
         raise ValueError(f"bbx should be an integer vector")
 
-    start, size = bbx
+    start, bbx_size = bbx
 
     if not np.all(start >= 0):
         raise ValueError("bbx should only have positive values")
-    if not np.all(start + size <= image.size):
+    if not np.all(start + bbx_size <= size):
         raise ValueError("bbx should be smaller than the image size")
-    if not np.all(size > 0):
+    if not np.all(bbx_size > 0):
         raise ValueError("bbx should have positive size")
 
-    return _crop_by_bounds(image, np.array([start, start + size]))
+    return np.array([start, start + bbx_size])
+
+
+def _crop_by_bounds(image: dino.structs.Image, bounds: np.ndarray) -> dino.structs.Image:
+    _verify_crop_bounds(bounds, image.size)
+
+    start, end = bounds
+
+    # Only loads the cropped slices of images with unloaded voxels
+    voxels = image.load_voxels(start[0], end[0])[:, start[1] : end[1], start[2] : end[2]]
+    affine = _translate_affine(image.affine, start)
+
+    return dataclasses.replace(image, voxels=voxels, affine=affine)
+
+
+def _crop_by_bbx(image: dino.structs.Image, bbx: np.ndarray) -> dino.structs.Image:
+    return _crop_by_bounds(image, _bbx_to_bounds(bbx, image.size))
+
+
+@dino.tracing.traced
+def crop_world_boxes(
+    image: dino.structs.Image, boxes: npt.ArrayLike, *, chunk_size: int = 1024
+) -> Iterator[dino.structs.Image]:
+    """Crops an image to many boxes in world coordinates.
 
+    The corners of the boxes are mapped to voxel bounds in bulk, a chunk of boxes at a time.
+    Like `crop_image`, the crops of loaded images are views of the voxels of the image.
 
+    Args:
+        image: the image to be cropped
+        boxes: the (N, 2, 3) opposite world corners of every box, the crop covers all voxels
+            intersecting the box, clipped to the image
+        chunk_size: the number of boxes mapped to voxel bounds at once
+
+    Returns:
+        an iterator over the crops, in the order of the boxes
+    """
+    boxes = np.asarray(boxes, dtype=float)
+    if boxes.ndim != 3 or boxes.shape[1:] != (2, 3):
+        raise ValueError("boxes should have shape (N, 2, 3)")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size should be positive")
+
+    return _crop_world_boxes(image, boxes, chunk_size)
+
+
+def _crop_world_boxes(
+    image: dino.structs.Image, boxes: np.ndarray, chunk_size: int
+) -> Iterator[dino.structs.Image]:
+    # The indices into the two corners of a box, of each of its 8 corners
+    corner_indices = np.array(list(np.ndindex(2, 2, 2)))
+    for chunk_start in range(0, len(boxes), chunk_size):
+        chunk = boxes[chunk_start : chunk_start + chunk_size]
+        corners = chunk[:, corner_indices, [0, 1, 2]]  # N x 8 x 3
+        coordinates = _world_to_voxel(image, corners)  # 3 x N x 8
+        # The voxels of which the extent of +-0.5 around their center intersects the box
+        lower = np.maximum(0, np.ceil(coordinates.min(axis=2) - 0.5).astype(int)).T
+        upper = np.minimum(image.size, np.floor(coordinates.max(axis=2) + 0.5).astype(int) + 1).T
+
+        for index, bounds in enumerate(zip(lower, upper), start=chunk_start):
+            if np.any(bounds[0] >= bounds[1]):
+                raise ValueError(f"Box {index} does not overlap with the image.")
+            yield _crop_by_bounds(image, np.array(bounds))
+
+
+@dino.tracing.traced
 def crop_image(
     image: dino.structs.Image,
     *,
@@ -163,11 +872,7 @@ def crop_image(
     raise ValueError("Exactly one of bounds or bbx should be specified.")
 
 
-def pad_image(
-    image: dino.structs.Image, pad_width: npt.ArrayLike, *, pad_value: int | float | None = None
-) -> dino.structs.Image:
-    pad_width = np.asarray(pad_width)
-
+def _verify_pad_width(pad_width: np.ndarray) -> None:
     if pad_width.shape != (2, 3):
         raise ValueError("pad_width should be a 2x3 matrix")
     if not np.issubdtype(pad_width.dtype, np.integer):
@@ -180,15 +885,41 @@ def pad_image(
     if not np.all(after >= 0):
         raise ValueError("pad_width should only have positive values")
 
-    pad_value = image.voxels.min() if pad_value is None else pad_value
-    voxels = np.pad(image.voxels, (before, after), mode="constant", constant_values=pad_value)
-    position = (image.affine @ np.array([*-before, 1]))[:3]
-    affine = image.affine.copy()
-    affine[:3, 3] = position
+
+@dino.tracing.traced
+def pad_image(
+    image: dino.structs.Image, pad_width: npt.ArrayLike, *, pad_value: int | float | None = None
+) -> dino.structs.Image:
+    pad_width = np.asarray(pad_width)
+    _verify_pad_width(pad_width)
+
+    pad_value = image.min if pad_value is None else image.to_stored_value(pad_value)
+    voxels = np.pad(image.voxels, pad_width.T, mode="constant", constant_values=pad_value)
+    affine = _translate_affine(image.affine, -pad_width[0])
 
     return dataclasses.replace(image, voxels=voxels, affine=affine)
 
 
+def _mirrored_axes(affine: np.ndarray) -> np.ndarray:
+    orientation = affine[:3, :3] @ np.diag(1 / np.linalg.norm(affine[:3, :3], axis=0))
+
+    is_axis_aligned = np.all(orientation == np.diag(np.diag(orientation)))
+    if not is_axis_aligned:
+        raise NotImplementedError("Non axis aligned images are not supported.")
+
+    return np.where(np.diag(orientation) < 0)[0]
+
+
+def _mirror_affine(affine: np.ndarray, size: np.ndarray, flipped_axes: np.ndarray) -> np.ndarray:
+    # The last voxel along a flipped axis becomes the first voxel
+    offset = np.zeros(3, dtype=int)
+    offset[flipped_axes] = size[flipped_axes] - 1
+    affine = _translate_affine(affine, offset)
+    affine[:3, flipped_axes] *= -1
+    return affine
+
+
+@dino.tracing.traced
 def canonicalize_mirrored_image(image: dino.structs.Image) -> dino.structs.Image:
     """Canonicalizes an image by mirroring it if necessary.
 
@@ -198,25 +929,76 @@ def canonicalize_mirrored_image(image: dino.structs.Image) -> dino.structs.Image
     Returns:
         a newly created image that is canonicalized
     """
-    is_axis_aligned = np.all(image.orientation == np.diag(np.diag(image.orientation)))
-    if not is_axis_aligned:
-        raise NotImplementedError("Non axis aligned images are not supported.")
-
-    flipped_axes = np.where(np.diag(image.orientation) < 0)[0]
+    flipped_axes = _mirrored_axes(image.affine)
     if len(flipped_axes) == 0:
         return image
 
-    canonical_voxels = np.flip(image.voxels, axis=flipped_axes)
-    canonical_affine = image.affine.copy()
-    canonical_affine[:3, flipped_axes] *= -1
+    canonical_voxels = np.flip(image.voxels, axis=tuple(flipped_axes))
+    canonical_affine = _mirror_affine(image.affine, image.size, flipped_axes)
 
     return dataclasses.replace(image, voxels=canonical_voxels, affine=canonical_affine)
 
 
+@dino.tracing.traced
 def canonicalize_image_orientation(
     image: dino.structs.Image,
     *,
     mode: str = "outer",
     pad_value: int | float | None = None,
 ) -> dino.structs.Image:
-    raise NotImplementedError("Not implemented yet.")
+    """Canonicalizes an image such that its voxel axes align with the world axes.
+
+    Images of which the voxel axes are a permutation of the world axes, possibly flipped, are
+    canonicalized by transposing and flipping views of the voxels, without copying or
+    interpolating them. Only oblique images are resampled.
+
+    Args:
+        image: the image to be canonicalized
+        mode: how to choose the grid of oblique images, "outer" spans the world bounding box of
+            all voxels, with per world axis the spacing of the voxel axis closest to it
+        pad_value (optional): the value of voxels of the grid outside the image. Defaults to
+            min value in voxels.
+
+    Returns:
+        a newly created image with an identity orientation
+    """
+    if mode != "outer":
+        raise ValueError(f"Unsupported mode {mode}, only 'outer' is supported.")
+
+    orientation = image.orientation
+    # The world axis that every voxel axis is closest to
+    world_axes = np.argmax(np.abs(orientation), axis=0)
+    is_permutation = len(set(world_axes)) == 3
+    signs = np.sign(orientation[world_axes, [0, 1, 2]])
+    is_axis_aligned = np.allclose(
+        orientation[:, np.argsort(world_axes)] * signs[np.argsort(world_axes)],
+        np.eye(3),
+        atol=AXIS_ALIGNED_ATOL,
+    )
+
+    if is_permutation and is_axis_aligned:
+        flipped_axes = np.where(signs < 0)[0]
+        voxels = np.flip(image.voxels, axis=tuple(flipped_axes))
+        affine = _mirror_affine(image.affine, image.size, flipped_axes)
+
+        # Voxel axis i of the output is the voxel axis that is closest to world axis i
+        axes = np.argsort(world_axes)
+        voxels = np.transpose(voxels, axes)
+        affine[:3, :3] = affine[:3, axes]
+
+        return dataclasses.replace(image, voxels=voxels, affine=affine)
+
+    spacing = (
+        image.spacing[np.argsort(world_axes)] if is_permutation else np.full(3, image.spacing.min())
+    )
+
+    corners = np.array(list(np.ndindex(2, 2, 2))) * (image.size - 1)
+    corners_world = (image.affine @ np.c_[corners, np.ones(8)].T)[:3]
+    origin = corners_world.min(axis=1)
+    extent = corners_world.max(axis=1) - origin
+    size = np.ceil(extent / spacing - AXIS_ALIGNED_ATOL).astype(int) + 1
+
+    affine = np.diag([*spacing, 1.0])
+    affine[:3, 3] = origin
+
+    return resample_to_grid(image, affine, size, pad_value=pad_value)
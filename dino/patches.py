@@ -0,0 +1,187 @@
+import dataclasses
+from typing import Iterator, Literal, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+import dino.ops
+import dino.structs
+
+
+@dataclasses.dataclass(frozen=True)
+class Patch:
+    """A patch of a `PatchGrid`.
+
+    Attributes:
+        index: the index of the patch in the grid
+        bounds: the 2x3 voxel bounds of the patch in the image, the upper bounds may lie beyond
+            the image when the image is smaller than a patch
+        affine: the 4x4 affine of the patch
+        voxels: a read-only view of the voxels of the patch
+    """
+
+    index: int
+    bounds: np.ndarray
+    affine: np.ndarray
+    voxels: np.ndarray
+
+
+def _patch_starts(size: int, patch_size: int, stride: int) -> np.ndarray:
+    if size <= patch_size:
+        return np.array([0])
+    num_patches = int(np.ceil((size - patch_size) / stride)) + 1
+    # The last patch is shifted back to end at the image border, so it needs no padding
+    return np.minimum(np.arange(num_patches) * stride, size - patch_size)
+
+
+class PatchGrid:
+    """A grid of overlapping patches covering an image, e.g. for sliding window inference.
+
+    The image is only padded when it is smaller than a patch, and then only once. The voxels of
+    every patch are a strided view of the (padded) voxels, so no voxels are copied per patch.
+
+    Example:
+        grid = PatchGrid(image, (96, 96, 96), stride=(48, 48, 48))
+        stitcher = PatchStitcher(grid)
+        for patches, voxels in grid.batches(4):
+            stitcher.add_batch(patches, model(voxels))
+        prediction = stitcher.result()
+
+    Args:
+        image: the image to cover with patches
+        patch_size: the size of the patches
+        stride (optional): the step between patches, defaults to half the patch size
+        pad_value (optional): the value of padded voxels, see `dino.ops.pad_image`
+    """
+
+    def __init__(
+        self,
+        image: dino.structs.Image,
+        patch_size: npt.ArrayLike,
+        *,
+        stride: npt.ArrayLike | None = None,
+        pad_value: int | float | None = None,
+    ):
+        patch_size = np.asarray(patch_size)
+        if patch_size.shape != (3,) or np.any(patch_size <= 0):
+            raise ValueError("patch_size should be a positive 3D vector")
+        stride = np.maximum(1, patch_size // 2) if stride is None else np.asarray(stride)
+        if stride.shape != (3,) or np.any(stride <= 0) or np.any(stride > patch_size):
+            raise ValueError("stride should be a positive 3D vector of at most patch_size")
+
+        self.image = image
+        self.patch_size = patch_size
+        self.stride = stride
+
+        pad_end = np.maximum(0, patch_size - image.size)
+        if np.any(pad_end > 0):
+            image = dino.ops.pad_image(
+                image, (np.zeros(3, dtype=int), pad_end), pad_value=pad_value
+            )
+        self.padded_size = image.size
+        self._windows = np.lib.stride_tricks.sliding_window_view(
+            image.voxels, tuple(patch_size.tolist())
+        )
+
+        starts = [
+            _patch_starts(size, axis_patch_size, axis_stride)
+            for size, axis_patch_size, axis_stride in zip(self.image.size, patch_size, stride)
+        ]
+        self.starts = np.stack(np.meshgrid(*starts, indexing="ij"), axis=-1).reshape(-1, 3)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Patch:
+        start = self.starts[index]
+        return Patch(
+            index,
+            np.array([start, start + self.patch_size]),
+            dino.ops._translate_affine(self.image.affine, start),
+            self._windows[start[0], start[1], start[2]],
+        )
+
+    def __iter__(self) -> Iterator[Patch]:
+        return (self[index] for index in range(len(self)))
+
+    def batches(self, batch_size: int) -> Iterator[tuple[list[Patch], np.ndarray]]:
+        """Yields the patches in batches, with their voxels stacked into a (N, D, H, W) array."""
+        if batch_size <= 0:
+            raise ValueError("batch_size should be positive")
+
+        for batch_start in range(0, len(self), batch_size):
+            indices = range(batch_start, min(batch_start + batch_size, len(self)))
+            starts = self.starts[batch_start : indices.stop]
+            # A single gather of all patches of the batch
+            voxels = self._windows[starts[:, 0], starts[:, 1], starts[:, 2]]
+            yield [self[index] for index in indices], voxels
+
+
+def _overlap_weights(
+    patch_size: np.ndarray, weighting: Literal["gaussian", "linear", "constant"]
+) -> np.ndarray:
+    weights_per_axis = []
+    for axis_size in patch_size:
+        distance = np.abs(np.arange(axis_size) - (axis_size - 1) / 2)
+        if weighting == "gaussian":
+            # The sigma of nnU-Net, 1/8 of the patch size
+            weights_per_axis.append(np.exp(-0.5 * (distance / (axis_size / 8)) ** 2))
+        elif weighting == "linear":
+            weights_per_axis.append(1 - distance / (axis_size / 2 + 1))
+        elif weighting == "constant":
+            weights_per_axis.append(np.ones(axis_size))
+        else:
+            raise ValueError(f"weighting should be gaussian, linear or constant, not {weighting}")
+
+    weights = np.einsum("i,j,k->ijk", *weights_per_axis).astype(np.float32)
+    # Voxels near the corners should still contribute where only one patch covers them
+    np.maximum(weights, 1e-3 * weights.max(), out=weights)
+    weights.setflags(write=False)
+    return weights
+
+
+class PatchStitcher:
+    """Accumulates the outputs of the patches of a `PatchGrid` into one volume.
+
+    Overlapping outputs are blended with weights that decay towards the border of a patch,
+    where model outputs are usually less accurate.
+
+    Args:
+        grid: the grid of the patches
+        weighting: the weights of the voxels of a patch, "gaussian", "linear" or "constant"
+    """
+
+    def __init__(
+        self,
+        grid: PatchGrid,
+        *,
+        weighting: Literal["gaussian", "linear", "constant"] = "gaussian",
+    ):
+        self.grid = grid
+        self.weights = _overlap_weights(grid.patch_size, weighting)
+        self._sum = np.zeros(grid.padded_size, dtype=np.float32)
+        self._weight_sum = np.zeros(grid.padded_size, dtype=np.float32)
+
+    def add(self, patch: Patch, output: np.ndarray) -> None:
+        """Adds the output of a patch, which has the size of the patch."""
+        if output.shape != tuple(self.grid.patch_size):
+            raise ValueError(
+                f"output should have shape {tuple(self.grid.patch_size)}, but got {output.shape}"
+            )
+        lower, upper = patch.bounds
+        region = (slice(lower[0], upper[0]), slice(lower[1], upper[1]), slice(lower[2], upper[2]))
+        self._sum[region] += output * self.weights
+        self._weight_sum[region] += self.weights
+
+    def add_batch(self, patches: Sequence[Patch], outputs: np.ndarray) -> None:
+        """Adds the (N, D, H, W) outputs of a batch of patches."""
+        if len(patches) != len(outputs):
+            raise ValueError(f"got {len(outputs)} outputs for {len(patches)} patches")
+        for patch, output in zip(patches, outputs):
+            self.add(patch, output)
+
+    def result(self) -> dino.structs.Image:
+        """Returns the blended outputs, as an image with the size and affine of the grid image."""
+        depth, height, width = self.grid.image.size
+        voxels = self._sum[:depth, :height, :width] / self._weight_sum[:depth, :height, :width]
+        return dino.structs.Image(self.grid.image.affine, voxels)
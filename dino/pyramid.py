@@ -0,0 +1,343 @@
+import dataclasses
+import json
+import os
+from typing import Literal
+
+import numpy as np
+import numpy.typing as npt
+
+import dino.ops
+import dino.storage
+import dino.structs
+import dino.tracing
+
+_METADATA_FILENAME = "pyramid.json"
+
+# The blur before halving a level, in voxels of that level. It is stronger than the anti
+# aliasing of `dino.ops.resize_image` for a factor 2, like the classic Gaussian pyramid, so the
+# levels hardly alias and a cascade of blurs behaves like a single blur.
+_LEVEL_SIGMA = 1.0
+
+
+def _level_directory(path: str | os.PathLike, level: int) -> str:
+    return os.path.join(path, f"level_{level}")
+
+
+def _aa_sigma(size_from: np.ndarray, size_to: np.ndarray) -> np.ndarray:
+    # The anti aliasing sigma of `dino.ops._resize`, in voxels of the input
+    return np.maximum(0, ((size_from / size_to) - 1) / 2)
+
+
+def _level_spacing(size: np.ndarray, size_level: np.ndarray) -> np.ndarray:
+    # The spacing of a level in voxels of the first level, as the corners are aligned
+    return np.divide(size - 1, size_level - 1, out=np.ones(3), where=size_level > 1)
+
+
+def _blur_and_zoom(
+    image: dino.structs.Image,
+    size: np.ndarray,
+    order: int,
+    sigma: np.ndarray,
+    tile_size: int | None,
+    num_workers: int,
+) -> dino.structs.Image:
+    """Resizes an image like `dino.ops._resize`, but with a given anti aliasing sigma."""
+    if tile_size is not None and tile_size < 1:
+        raise ValueError("tile_size should be positive")
+    if num_workers < 1:
+        raise ValueError("num_workers should be positive")
+
+    if tile_size is not None:
+        voxels = dino.ops._resize_tiled(image, size, order, tile_size, num_workers, sigma)
+    else:
+        import scipy.ndimage
+
+        with dino.tracing.span("resize.blur"):
+            voxels = scipy.ndimage.gaussian_filter(
+                dino.ops._physical_float32(image, image.voxels), sigma, mode="nearest"
+            )
+        with dino.tracing.span("resize.zoom"):
+            voxels = scipy.ndimage.zoom(
+                voxels, size / image.size, order=order, mode="nearest", grid_mode=False
+            )
+
+    return dataclasses.replace(
+        image,
+        affine=dino.ops._resize_affine(image.affine, image.size, size),
+        voxels=voxels,
+        rescale_slope=1.0,
+        rescale_intercept=0.0,
+    )
+
+
+def _resize_matrix(size_from: int, size_to: int, order: int, sigma: float) -> np.ndarray:
+    """Returns the matrix of blurring and zooming along one axis, see `_blur_and_zoom`."""
+    import scipy.ndimage
+
+    matrix = np.eye(size_from)
+    if sigma > 0:
+        matrix = scipy.ndimage.gaussian_filter1d(matrix, sigma, axis=0, mode="nearest")
+    return scipy.ndimage.zoom(
+        matrix, (size_to / size_from, 1), order=order, mode="nearest", grid_mode=False
+    )
+
+
+class ImagePyramid:
+    """A precomputed pyramid of an image, to quickly resize it to many smaller sizes.
+
+    Every level halves the axes of the previous level that are larger than `min_size`. A resize
+    is served from the coarsest level that is at least as large as the output size, and that is
+    blurred less than `dino.ops.resize_image` would blur the full image. Only the remaining blur
+    is applied to that level, so the total blur matches, and only that level is zoomed.
+
+    The output still differs slightly from resizing the full image directly, as the blur and
+    sampling are applied in steps, `error_bound` bounds the difference.
+
+    Example:
+        pyramid = ImagePyramid.build(image)
+        pyramid.save("pyramid")
+        pyramid = ImagePyramid.load("pyramid")
+        thumbnail = pyramid.resize_image((32, 64, 64))
+
+    Args:
+        levels: the levels of the pyramid as created by `build`, from the full image to the
+            smallest level
+    """
+
+    def __init__(self, levels: list[dino.structs.Image]):
+        if not levels:
+            raise ValueError("A pyramid should have at least one level.")
+        self.levels = levels
+
+        # The variance of the blur of every level, in voxels of the first level, only the halved
+        # axes are blurred
+        size = levels[0].size
+        self._variances = [np.zeros(3)]
+        for image, image_next in zip(levels, levels[1:]):
+            step = np.where(image_next.size < image.size, _LEVEL_SIGMA, 0.0)
+            step = step * _level_spacing(size, image.size)
+            self._variances.append(self._variances[-1] + step**2)
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def __getitem__(self, level: int) -> dino.structs.Image:
+        return self.levels[level]
+
+    @classmethod
+    def build(
+        cls,
+        image: dino.structs.Image,
+        *,
+        min_size: int = 16,
+        tile_size: int | None = None,
+        num_workers: int = 1,
+    ) -> "ImagePyramid":
+        """Builds the pyramid of an image, every level from the previous one.
+
+        Args:
+            image: the full image, the first level of the pyramid
+            min_size: axes are no longer halved once they are at most this size
+            tile_size (optional): resize in slabs of this many output slices, see
+                `dino.ops.resize_image`
+            num_workers: the number of threads resizing slabs, only used with tile_size
+
+        Returns:
+            the pyramid, of which all levels but the first have float32 physical voxels. Also
+            the levels of boolean images, so they keep the fraction of every voxel inside the
+            mask, `resize_image` casts them back to bool
+        """
+        if min_size < 2:
+            raise ValueError("min_size should be at least 2")
+
+        levels = [image]
+        while np.any(levels[-1].size > min_size):
+            size = levels[-1].size
+            # Halving odd sizes keeps the first and last voxels, so the spacing exactly doubles
+            size_next = np.where(size > min_size, (size + 1) // 2, size)
+            sigma = np.where(size > min_size, _LEVEL_SIGMA, 0.0)
+            levels.append(_blur_and_zoom(levels[-1], size_next, 1, sigma, tile_size, num_workers))
+        return cls(levels)
+
+    def save(self, path: str | os.PathLike) -> None:
+        """Saves the levels to a directory, in a format that can be memory-mapped by `load`."""
+        os.makedirs(path, exist_ok=True)
+        for level, image in enumerate(self.levels):
+            dino.storage.save_image(image, _level_directory(path, level))
+        with open(os.path.join(path, _METADATA_FILENAME), "w") as file:
+            json.dump({"version": dino.storage.FORMAT_VERSION, "levels": len(self)}, file)
+
+    @classmethod
+    def load(
+        cls,
+        path: str | os.PathLike,
+        *,
+        mmap_mode: Literal["r", "r+", "c"] | None = "r",
+    ) -> "ImagePyramid":
+        """Loads a pyramid saved with `save`, see `dino.storage.load_image`.
+
+        Args:
+            path: the directory the pyramid was saved to
+            mmap_mode: the mode used to memory-map the voxels, None reads them into memory
+
+        Returns:
+            the loaded pyramid
+        """
+        with open(os.path.join(path, _METADATA_FILENAME)) as file:
+            metadata = json.load(file)
+        return cls(
+            [
+                dino.storage.load_image(_level_directory(path, level), mmap_mode=mmap_mode)
+                for level in range(metadata["levels"])
+            ]
+        )
+
+    def level_for_size(self, size: npt.ArrayLike) -> int:
+        """Returns the index of the level that a resize to a size is served from."""
+        size = np.asarray(size)
+        dino.ops._verify_size(size)
+        variance = _aa_sigma(self.levels[0].size, size) ** 2
+        return max(
+            level
+            for level, image in enumerate(self.levels)
+            if level == 0
+            or (np.all(image.size >= size) and np.all(self._variances[level] <= variance))
+        )
+
+    def _sigma(self, level: int, size: np.ndarray) -> np.ndarray:
+        """Returns the remaining anti aliasing sigma, in voxels of a level, to resize it."""
+        # Blurs add up by their variances
+        variance = _aa_sigma(self.levels[0].size, size) ** 2 - self._variances[level]
+        return np.sqrt(np.maximum(0, variance)) / _level_spacing(
+            self.levels[0].size, self.levels[level].size
+        )
+
+    @dino.tracing.traced
+    def resize_image(
+        self,
+        size: npt.ArrayLike,
+        *,
+        order: int = 1,
+        tile_size: int | None = None,
+        num_workers: int = 1,
+    ) -> dino.structs.Image:
+        """Creates an image resized to a specific size from the nearest finer level.
+
+        Resizes served from the first level use the default backend of `dino.ops.resize_image`,
+        the other levels need a smaller blur than a backend would apply.
+
+        Args:
+            size: the output size of the image
+            order: what order to use for the interpolation, default 1 is linear
+            tile_size (optional): see `dino.ops.resize_image`
+            num_workers: see `dino.ops.resize_image`
+
+        Returns:
+            a newly created image with the specified size, and the affine of resizing the full
+            image to that size
+        """
+        size = np.asarray(size)
+        level = self.level_for_size(size)
+        if level == 0:
+            return dino.ops._resize(self.levels[0], size, order, tile_size, num_workers)
+        sigma = self._sigma(level, size)
+        image = _blur_and_zoom(self.levels[level], size, order, sigma, tile_size, num_workers)
+
+        # Loading zero slices only determines the dtype, also for images with unloaded voxels
+        if self.levels[0].load_voxels(0, 0).dtype == np.bool_:
+            # cast back to bool like `dino.ops.resize_image`, whichever level is used
+            image = dataclasses.replace(image, voxels=image.voxels > 0.5)
+        return image
+
+    @dino.tracing.traced
+    def rescale_image(
+        self,
+        spacing: npt.ArrayLike,
+        *,
+        order: int = 1,
+        tile_size: int | None = None,
+        num_workers: int = 1,
+    ) -> dino.structs.Image:
+        """Creates an image rescaled close to a specific spacing from the nearest finer level.
+
+        The size is determined from the full image, as in `dino.ops.rescale_image`.
+
+        Args:
+            spacing: the output spacing of the image
+            order: what order to use for the interpolation, default 1 is linear
+            tile_size (optional): see `dino.ops.resize_image`
+            num_workers: see `dino.ops.resize_image`
+
+        Returns:
+            a newly created image with the specified spacing
+        """
+        spacing = np.asarray(spacing)
+        dino.ops._verify_spacing(spacing)
+
+        size = dino.ops._rescale_size(self.levels[0].affine, self.levels[0].size, spacing)
+        return self.resize_image(size, order=order, tile_size=tile_size, num_workers=num_workers)
+
+    def _weight_difference(self, size: np.ndarray, order: int, axis: int) -> np.ndarray:
+        """Returns how much more every output voxel weighs every voxel of the full image along an
+        axis when resizing directly than when resizing with `resize_image`."""
+        level = self.level_for_size(size)
+        sizes = [image.size[axis] for image in self.levels[: level + 1]]
+
+        direct = _resize_matrix(
+            sizes[0], size[axis], order, _aa_sigma(self.levels[0].size, size)[axis]
+        )
+        pyramid = np.eye(sizes[0])
+        for size_from, size_to in zip(sizes, sizes[1:]):
+            sigma = _LEVEL_SIGMA if size_to < size_from else 0.0
+            pyramid = _resize_matrix(size_from, size_to, 1, sigma) @ pyramid
+        sigma = self._sigma(level, size)[axis]
+        pyramid = _resize_matrix(sizes[-1], size[axis], order, sigma) @ pyramid
+        return direct - pyramid
+
+    def error_bound(self, size: npt.ArrayLike, *, order: int = 1) -> float:
+        """Bounds the difference between `resize_image` and resizing the full image directly.
+
+        Both resizes are separable linear maps, of which every output voxel is a weighted
+        average of the voxels of the full image, for order 0 and 1. The difference is bounded
+        per axis, and the bounds add up over the axes. Along an axis an output voxel differs by
+        at most the smaller of:
+
+        - half the range of the voxels, times the summed absolute differences of its weights
+        - the differences between neighbouring voxels, weighted by how much weight has to move
+          between them to turn one set of weights into the other
+
+        The first bound is attained by some image with the same range, the second one is much
+        smaller for smooth images. The bound holds up to float32 rounding, and reads the whole
+        full image. For boolean images it bounds the difference before the cast back to bool.
+
+        Args:
+            size: the output size of the image
+            order: the order of the interpolation, 0 or 1
+
+        Returns:
+            the bound on the absolute difference of the physical voxels
+        """
+        size = np.asarray(size)
+        dino.ops._verify_size(size)
+        if order > 1:
+            raise ValueError(f"the error is only bounded for order 0 and 1, but got {order}")
+        if self.level_for_size(size) == 0:
+            return 0.0
+
+        voxels = self.levels[0].physical_voxels(np.float32)
+        value_range = float(voxels.max() - voxels.min())
+        bound = 0.0
+        for axis in range(3):
+            difference = self._weight_difference(size, order, axis)
+            # The largest difference between neighbouring voxels, per position along the axis.
+            # Blurring and zooming the other axes averages them, so it cannot make them larger.
+            other_axes = tuple(other for other in range(3) if other != axis)
+            steps = np.abs(np.diff(voxels, axis=axis)).max(axis=other_axes)
+            # The weight that has to move from one voxel to the next is the difference of the
+            # cumulative weights
+            moved = np.abs(np.cumsum(difference, axis=1)[:, :-1])
+            bound += min(
+                np.abs(difference).sum(axis=1).max() * value_range / 2,
+                (moved @ steps).max(initial=0),
+            )
+        return float(bound)
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import TYPE_CHECKING, Literal
+
+import numpy as np
+import numpy.typing as npt
+
+import dino.structs
+
+# pydicom is only imported by `ImageCache.create_image` on a miss, as it slows down loading
+# saved images, which does not need it.
+if TYPE_CHECKING:
+    import pydicom
+
+FORMAT_VERSION = 2  # 2 added rescale_slope and rescale_intercept
+
+_AFFINE_FILENAME = "affine.npy"
+_VOXELS_FILENAME = "voxels.npy"
+_METADATA_FILENAME = "metadata.json"
+
+
+def save_image(image: dino.structs.Image, path: str | os.PathLike) -> None:
+    """Saves an image to a directory, in a format that can be memory-mapped by `load_image`.
+
+    Args:
+        image: the image to be saved
+        path: the directory to save the image to, it is created if it does not exist
+    """
+    os.makedirs(path, exist_ok=True)
+
+    metadata = {
+        "version": FORMAT_VERSION,
+        "dtype": image.voxels.dtype.str,
+        "size": image.size.tolist(),
+        "rescale_slope": image.rescale_slope,
+        "rescale_intercept": image.rescale_intercept,
+    }
+
+    np.save(os.path.join(path, _AFFINE_FILENAME), image.affine)
+    np.save(os.path.join(path, _VOXELS_FILENAME), image.voxels)
+    with open(os.path.join(path, _METADATA_FILENAME), "w") as file:
+        json.dump(metadata, file)
+
+
+def load_image(
+    path: str | os.PathLike, *, mmap_mode: Literal["r", "r+", "c"] | None = "r"
+) -> dino.structs.Image:
+    """Loads an image saved with `save_image`.
+
+    With the default `mmap_mode="r"` the voxels are memory-mapped, so operations like
+    `crop_image` only read the pages of the voxels they actually use.
+
+    Args:
+        path: the directory the image was saved to
+        mmap_mode: the mode used to memory-map the voxels, None reads them into memory
+
+    Returns:
+        the loaded image
+    """
+    with open(os.path.join(path, _METADATA_FILENAME)) as file:
+        metadata = json.load(file)
+    if metadata["version"] > FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported format version {metadata['version']}, expected at most {FORMAT_VERSION}."
+        )
+
+    affine = np.load(os.path.join(path, _AFFINE_FILENAME))
+    voxels = np.load(os.path.join(path, _VOXELS_FILENAME), mmap_mode=mmap_mode)
+
+    return dino.structs.Image(
+        affine,
+        voxels,
+        metadata.get("rescale_slope", 1.0),
+        metadata.get("rescale_intercept", 0.0),
+    )
+
+
+def _directory_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class ImageCache:
+    """An on-disk cache of images created from DICOM series, keyed by SeriesInstanceUID.
+
+    Cached images are memory-mapped when loaded. When the cache grows beyond `max_bytes`,
+    the least recently used images are evicted.
+    """
+
+    def __init__(self, directory: str | os.PathLike, max_bytes: int):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes should be positive")
+
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(
+        self, slices: list["pydicom.Dataset"], dtype: npt.DTypeLike | None, apply_rescale: bool
+    ) -> str:
+        series_uid = slices[0].SeriesInstanceUID
+        if apply_rescale:
+            return os.path.join(self.directory, f"{series_uid}_{np.dtype(dtype).str[1:]}")
+        dtype_name = "native" if dtype is None else np.dtype(dtype).str[1:]
+        return os.path.join(self.directory, f"{series_uid}_{dtype_name}_stored")
+
+    def create_image(
+        self,
+        slices: list["pydicom.Dataset"],
+        *,
+        dtype: npt.DTypeLike | None = None,
+        num_workers: int = 1,
+        apply_rescale: bool = True,
+    ) -> dino.structs.Image:
+        """Loads the image of a series from the cache, or creates and caches it on a miss.
+
+        Args:
+            slices: the slices of the series, may be read with `stop_before_pixels`
+            dtype: the dtype of the voxels, see `dino.dicom.create_image`
+            num_workers: the number of threads used to decode the slices on a miss
+            apply_rescale: whether to rescale the voxels, see `dino.dicom.create_image`
+
+        Returns:
+            the image, with memory-mapped voxels
+        """
+        path = self._path(slices, dtype, apply_rescale)
+
+        if not os.path.isdir(path):
+            import dino.dicom
+
+            image = dino.dicom.create_image(
+                slices, dtype=dtype, num_workers=num_workers, apply_rescale=apply_rescale
+            )
+
+            # Write to a temporary directory first, so readers never observe a partial image.
+            path_tmp = tempfile.mkdtemp(dir=self.directory, prefix=".tmp_")
+            save_image(image, path_tmp)
+            try:
+                os.rename(path_tmp, path)
+            except OSError:
+                # Another process cached the same series in the meantime.
+                shutil.rmtree(path_tmp)
+
+            self._evict(keep=path)
+
+        # Mark the image as recently used
+        os.utime(path)
+
+        return load_image(path)
+
+    def _evict(self, keep: str) -> None:
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_dir() and not entry.name.startswith(".tmp_")
+        ]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        sizes = {entry.path: _directory_size(entry.path) for entry in entries}
+        total = sum(sizes.values())
+
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            total -= sizes[entry.path]
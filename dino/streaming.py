@@ -0,0 +1,307 @@
+import asyncio
+import concurrent.futures
+
+import numpy as np
+import numpy.typing as npt
+import pydicom
+
+import dino.dicom
+import dino.structs
+
+# The number of slices the buffer has room for on either side of the first slice, unless the
+# expected number of slices is given
+_INITIAL_SLICES = 32
+
+# The max number of times the spacing of the first two slices may be subdivided by later slices
+_MAX_SUBDIVISION = 64
+
+_IDENTICAL_ATTRIBUTES = ["PixelSpacing", "ImageOrientationPatient", "Rows", "Columns"]
+_REQUIRED_ATTRIBUTES = ["ImagePositionPatient", "RescaleSlope", "RescaleIntercept"]
+
+
+class SeriesBuilder:
+    """Builds the image of a series from slices that arrive one at a time.
+
+    Every slice is validated against the first slice when it is added, and decoded in the
+    background directly into its place in a buffer ordered by the position of the slices along
+    their normal. The first two slices determine the spacing, which later slices in between
+    them may still subdivide. Once the last slice is added, `build` only waits for the last
+    decodes and verifies the spacing between the slices, the voxels of the image are a view of
+    the buffer.
+
+    The buffer has room for `expected_slices` on either side of the first slice, as slices may
+    arrive in any order. Pages of the buffer that are never written are never backed by memory,
+    so the unused side only costs address space. Without a hint, or when more slices arrive,
+    the buffer grows geometrically.
+
+    Example:
+        with SeriesBuilder(num_workers=2) as builder:
+            for slice in receive_slices():
+                builder.add(slice)
+            image = builder.build()
+
+    Args:
+        dtype: the dtype of the voxels, see `dino.dicom.create_image`
+        apply_rescale: whether to rescale the pixel data, see `dino.dicom.create_image`
+        num_workers: the number of background threads decoding slices
+        expected_slices (optional): the expected number of slices of the series
+    """
+
+    def __init__(
+        self,
+        *,
+        dtype: npt.DTypeLike | None = None,
+        apply_rescale: bool = True,
+        num_workers: int = 1,
+        expected_slices: int | None = None,
+    ):
+        if num_workers < 1:
+            raise ValueError("num_workers should be positive")
+        if expected_slices is not None and expected_slices < 1:
+            raise ValueError("expected_slices should be positive")
+
+        self.dtype = dtype
+        self.apply_rescale = apply_rescale
+        self.expected_slices = expected_slices
+        self.rescale_slope = 1.0
+        self.rescale_intercept = 0.0
+        self._slices: list[pydicom.Dataset] = []
+        # Per grid index, the index of the slice at that position
+        self._slice_by_grid_index: dict[int, int] = {}
+        self._spacing: float | None = None
+        self._buffer = np.empty((0, 0, 0))
+        # The index in the buffer of grid index 0, the position of the first slice
+        self._buffer_origin = 0
+        self._futures: list[concurrent.futures.Future] = []
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+
+    def __enter__(self) -> "SeriesBuilder":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._slices)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _verify_slice(self, slice: pydicom.Dataset) -> None:
+        index = len(self._slices)
+        first = self._slices[0] if self._slices else slice
+
+        attributes = _IDENTICAL_ATTRIBUTES
+        if not self.apply_rescale:
+            attributes = attributes + ["RescaleSlope", "RescaleIntercept"]
+        try:
+            for attribute in _REQUIRED_ATTRIBUTES:
+                dino.dicom._verify_contains_attribute_per_slice([slice], attribute)
+            for attribute in attributes:
+                dino.dicom._verify_identical_attribute_per_slice([first, slice], attribute)
+        except ValueError as error:
+            raise ValueError(f"Slice {index} does not match the series: {error}") from error
+
+        # The offset to the first slice should be along the normal of the slices
+        offset = self._offset(slice)
+        if not np.allclose(np.cross(offset, self._normal(first)), 0, atol=dino.dicom.ATOL):
+            raise ValueError(f"Slice {index} is not aligned along the z-axis of the series.")
+
+    def _normal(self, slice: pydicom.Dataset) -> np.ndarray:
+        orientation = np.array(slice.ImageOrientationPatient, dtype=float)
+        normal = np.cross(orientation[:3], orientation[3:])
+        return normal / np.linalg.norm(normal)
+
+    def _offset(self, slice: pydicom.Dataset) -> np.ndarray:
+        first = self._slices[0] if self._slices else slice
+        return np.array(slice.ImagePositionPatient, dtype=float) - np.array(
+            first.ImagePositionPatient, dtype=float
+        )
+
+    def _wait(self) -> None:
+        # Consume the results, so that exceptions raised while decoding are propagated.
+        for future in self._futures:
+            future.result()
+
+    def _grid_index(self, slice: pydicom.Dataset) -> int:
+        """Returns the index of a slice on the grid of the spacing, refining it when needed."""
+        index = len(self._slices)
+        distance = float(self._offset(slice) @ self._normal(slice))
+        if self._spacing is None:
+            if index == 0 or np.isclose(distance, 0, atol=dino.dicom.ATOL):
+                return 0
+            self._spacing = abs(distance)
+
+        for subdivision in range(1, _MAX_SUBDIVISION + 1):
+            spacing = self._spacing / subdivision
+            grid_index = round(distance / spacing)
+            if np.isclose(grid_index * spacing, distance, atol=dino.dicom.ATOL):
+                if subdivision > 1:
+                    self._subdivide(subdivision)
+                return grid_index
+        raise ValueError(f"Slice {index} is not on the grid of the spacing between the slices.")
+
+    def _allocate(self, grid_min: int, grid_max: int, size: int, subdivision: int = 1) -> None:
+        """Moves the slices into a new buffer with room for a grid range.
+
+        Args:
+            grid_min: the first grid index of the new buffer, after subdivision
+            grid_max: the last grid index of the new buffer, after subdivision
+            size: the number of slices of the new buffer
+            subdivision: the number of parts the spacing is divided into
+        """
+        self._wait()
+        buffer = np.empty((size, *self._buffer.shape[1:]), dtype=self._buffer.dtype)
+        # Center the grid range, so the buffer has room on either side
+        origin = (size - (grid_max - grid_min + 1)) // 2 - grid_min
+        for grid_index in self._slice_by_grid_index:
+            buffer[origin + grid_index * subdivision] = self._buffer[
+                self._buffer_origin + grid_index
+            ]
+        self._buffer = buffer
+        self._buffer_origin = origin
+
+    def _subdivide(self, subdivision: int) -> None:
+        assert self._spacing is not None
+        # The slices move apart, which only happens for the first slices of a series
+        grid_min = min(self._slice_by_grid_index) * subdivision
+        grid_max = max(self._slice_by_grid_index) * subdivision
+        size = max(len(self._buffer), 2 * (grid_max - grid_min + 1))
+        self._allocate(grid_min, grid_max, size, subdivision)
+
+        self._slice_by_grid_index = {
+            grid_index * subdivision: index
+            for grid_index, index in self._slice_by_grid_index.items()
+        }
+        self._spacing /= subdivision
+
+    def _reserve(self, grid_index: int) -> None:
+        if 0 <= self._buffer_origin + grid_index < len(self._buffer):
+            return
+        grid_min = min(grid_index, *self._slice_by_grid_index)
+        grid_max = max(grid_index, *self._slice_by_grid_index)
+        size = max(2 * len(self._buffer), 2 * (grid_max - grid_min + 1))
+        self._allocate(grid_min, grid_max, size)
+
+    def add(self, slice: pydicom.Dataset) -> None:
+        """Validates a slice against the series, and starts decoding it in the background.
+
+        Args:
+            slice: the next slice of the series, in any order
+        """
+        self._verify_slice(slice)
+        index = len(self._slices)
+
+        if not self._slices:
+            if self.dtype is None:
+                self.dtype = np.float64 if self.apply_rescale else dino.dicom._pixel_dtype(slice)
+            if not self.apply_rescale:
+                self.rescale_slope = float(slice.RescaleSlope)
+                self.rescale_intercept = float(slice.RescaleIntercept)
+            capacity = self.expected_slices or _INITIAL_SLICES
+            self._buffer = np.empty((2 * capacity - 1, slice.Rows, slice.Columns), self.dtype)
+            self._buffer_origin = capacity - 1
+
+        grid_index = self._grid_index(slice)
+        if grid_index in self._slice_by_grid_index:
+            raise ValueError(
+                f"Slice {index} has the same position as slice "
+                f"{self._slice_by_grid_index[grid_index]}."
+            )
+        self._reserve(grid_index)
+        out = self._buffer[self._buffer_origin + grid_index]
+
+        self._slices.append(slice)
+        self._slice_by_grid_index[grid_index] = index
+        self._futures.append(
+            self._executor.submit(dino.dicom._decode_slice, slice, out, self.apply_rescale)
+        )
+
+    def build(self) -> dino.structs.Image:
+        """Creates the image of the slices added so far.
+
+        Returns:
+            the image, as `dino.dicom.create_image` would create it from the same slices, of
+            which the voxels are a view of the buffer of the builder
+        """
+        if len(self._slices) < 2:
+            raise ValueError("Not enough slices to create scan.")
+
+        positions = np.array([slice.ImagePositionPatient for slice in self._slices], dtype=float)
+        orientations = np.array(
+            [slice.ImageOrientationPatient for slice in self._slices], dtype=float
+        )
+        # Verifies that the slices are equally spaced, so that no position is missing
+        affine, _ = dino.dicom._create_affine(positions, orientations, self._slices[0].PixelSpacing)
+        grid_min, grid_max = min(self._slice_by_grid_index), max(self._slice_by_grid_index)
+        if grid_max - grid_min + 1 != len(self._slices):
+            raise ValueError("Spacing between slices is not equal.")
+
+        self._wait()
+
+        # The grid is ordered along the normal, like the slices of the affine
+        voxels = self._buffer[self._buffer_origin + grid_min : self._buffer_origin + grid_max + 1]
+        return dino.structs.Image(affine, voxels, self.rescale_slope, self.rescale_intercept)
+
+
+class AsyncSeriesBuilder:
+    """An asyncio interface of `SeriesBuilder`, which never blocks the event loop on decoding.
+
+    Adding a slice may wait for pending decodes when the buffer grows, so every call runs in a
+    thread. Calls are serialized, as the builder is not thread safe.
+
+    Example:
+        async with AsyncSeriesBuilder(num_workers=2) as builder:
+            async for slice in receive_slices():
+                await builder.add(slice)
+            image = await builder.build()
+
+    Args:
+        dtype: the dtype of the voxels, see `dino.dicom.create_image`
+        apply_rescale: whether to rescale the pixel data, see `dino.dicom.create_image`
+        num_workers: the number of background threads decoding slices
+        expected_slices (optional): the expected number of slices of the series
+    """
+
+    def __init__(
+        self,
+        *,
+        dtype: npt.DTypeLike | None = None,
+        apply_rescale: bool = True,
+        num_workers: int = 1,
+        expected_slices: int | None = None,
+    ):
+        self._builder = SeriesBuilder(
+            dtype=dtype,
+            apply_rescale=apply_rescale,
+            num_workers=num_workers,
+            expected_slices=expected_slices,
+        )
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncSeriesBuilder":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    def __len__(self) -> int:
+        return len(self._builder)
+
+    async def close(self) -> None:
+        """Waits for the pending decodes and stops the threads of the builder."""
+        async with self._lock:
+            await asyncio.to_thread(self._builder.close)
+
+    async def add(self, slice: pydicom.Dataset) -> None:
+        """Validates a slice against the series, and starts decoding it in the background."""
+        async with self._lock:
+            await asyncio.to_thread(self._builder.add, slice)
+
+    async def build(self) -> dino.structs.Image:
+        """Creates the image of the slices added so far, and closes the builder."""
+        try:
+            async with self._lock:
+                return await asyncio.to_thread(self._builder.build)
+        finally:
+            await self.close()
@@ -1,56 +1,265 @@
 import dataclasses
+import functools
+import hashlib
+from typing import Protocol
 
 import numpy as np
+import numpy.typing as npt
 
 import dino.utils
 
 
+class VoxelLoader(Protocol):
+    """Loads the voxels of an image on demand, slice by slice along the first axis."""
+
+    @property
+    def shape(self) -> tuple[int, int, int]: ...
+
+    def load(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """Loads the voxels of the slices in [start, stop)."""
+        ...
+
+
 @dataclasses.dataclass(frozen=True)
 class Image:
     """A class representing a spatially referenced volumetric image.
 
+    The voxels of an image created with `Image.from_loader` are only loaded on first access.
+
+    The voxels may be stored in compact units, e.g. the int16 pixel data of a CT series, of which
+    the physical values are `voxels * rescale_slope + rescale_intercept`. Operations that only
+    move voxels keep them in stored units, interpolating operations return physical values.
+
     Attributes:
         affine: A 4x4 affine transformation matrix that maps voxel coordinates to world coordinates.
         voxels: An array representing the volumetric image data.
+        rescale_slope: The slope that maps stored voxel values to physical values.
+        rescale_intercept: The intercept that maps stored voxel values to physical values.
     """
 
     affine: np.ndarray  # 4x4
     voxels: np.ndarray  # DxHxW
+    rescale_slope: float = 1.0
+    rescale_intercept: float = 0.0
 
     def __post_init__(self):
         if self.affine.shape != (4, 4):
             raise ValueError(
                 f"Affine matrix must have shape 4x4, but got shape {self.affine.shape}"
             )
-        if len(self.voxels.shape) != 3:
-            raise ValueError(f"Voxels must have shape DxHxW, but got shape {self.voxels.shape}")
+        if len(self.size) != 3:
+            raise ValueError(f"Voxels must have shape DxHxW, but got shape {tuple(self.size)}")
 
         self.affine.setflags(write=False)
-        self.voxels.setflags(write=False)
+        if self.is_loaded:
+            self.voxels.setflags(write=False)
+
+    def __getattr__(self, name: str):
+        # Only called for attributes that are not set, i.e. voxels that are not loaded yet.
+        loader = self.__dict__.get("_loader")
+        if name != "voxels" or loader is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        voxels = loader.load()
+        voxels.setflags(write=False)
+        object.__setattr__(self, "voxels", voxels)
+        return voxels
+
+    @classmethod
+    def from_loader(
+        cls,
+        affine: np.ndarray,
+        loader: VoxelLoader,
+        *,
+        rescale_slope: float = 1.0,
+        rescale_intercept: float = 0.0,
+    ) -> "Image":
+        """Creates an image of which the voxels are loaded on first access.
+
+        Args:
+            affine: the 4x4 affine of the image
+            loader: the loader of the voxels, its shape is used as the size of the image
+            rescale_slope: the slope that maps stored voxel values to physical values
+            rescale_intercept: the intercept that maps stored voxel values to physical values
+
+        Returns:
+            an image without loaded voxels
+        """
+        image = cls.__new__(cls)
+        object.__setattr__(image, "affine", affine)
+        object.__setattr__(image, "_loader", loader)
+        object.__setattr__(image, "rescale_slope", rescale_slope)
+        object.__setattr__(image, "rescale_intercept", rescale_intercept)
+        image.__post_init__()
+        return image
+
+    @property
+    def is_loaded(self) -> bool:
+        return "voxels" in self.__dict__
+
+    def load_voxels(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """Returns the voxels of the slices in [start, stop) along the first axis.
+
+        Unlike accessing `voxels`, this only loads the requested slices of an unloaded image.
+
+        Args:
+            start: the first slice
+            stop: the slice after the last slice, defaults to all remaining slices
+
+        Returns:
+            a read-only array with the voxels of the slices
+        """
+        if self.is_loaded:
+            return self.voxels[start:stop]
+
+        voxels = self.__dict__["_loader"].load(start, stop)
+        voxels.setflags(write=False)
+        return voxels
+
+    @property
+    def is_rescaled(self) -> bool:
+        """Whether the stored voxels differ from their physical values."""
+        return self.rescale_slope != 1 or self.rescale_intercept != 0
+
+    def physical_voxels(self, dtype: npt.DTypeLike = np.float64) -> np.ndarray:
+        """Returns the voxels in physical units, computed from the stored voxels on every call.
+
+        Args:
+            dtype: the dtype of the physical voxels
+
+        Returns:
+            the physical voxels, the stored voxels themselves when they are not rescaled and
+            already have the dtype
+        """
+        if not self.is_rescaled:
+            return self.voxels.astype(dtype, copy=False)
+
+        voxels = np.multiply(self.voxels, self.rescale_slope, dtype=dtype)
+        voxels += self.rescale_intercept
+        return voxels
+
+    def to_physical_value(self, value: int | float) -> int | float:
+        """Converts a value in stored units, e.g. `min`, to physical units."""
+        if not self.is_rescaled:
+            return value
+        return value * self.rescale_slope + self.rescale_intercept
+
+    def to_stored_value(self, value: int | float) -> int | float:
+        """Converts a value in physical units, e.g. a pad value, to stored units.
+
+        Raises a ValueError when the value cannot be stored exactly in integer voxels.
+        """
+        if not self.is_rescaled:
+            return value
+
+        stored = (value - self.rescale_intercept) / self.rescale_slope
+        # Loading zero slices only determines the dtype, also for images with unloaded voxels
+        dtype = self.load_voxels(0, 0).dtype
+        if not np.issubdtype(dtype, np.integer):
+            return stored
+
+        info = np.iinfo(dtype)
+        if not np.isclose(stored, round(stored)) or not info.min <= round(stored) <= info.max:
+            raise ValueError(
+                f"Value {value} cannot be stored in {dtype} voxels with rescale slope "
+                f"{self.rescale_slope} and intercept {self.rescale_intercept}."
+            )
+        return round(stored)
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Image):
             return False
+        if self is other:
+            return True
+
+        if not np.allclose(self.affine, other.affine):
+            return False
+        if (self.rescale_slope, self.rescale_intercept) != (
+            other.rescale_slope,
+            other.rescale_intercept,
+        ):
+            # Different stored units, so only the physical values can be compared
+            return dino.utils.allclose_with_shape_check(
+                self.physical_voxels(), other.physical_voxels()
+            )
+        if self.is_loaded and other.is_loaded and _is_same_array(self.voxels, other.voxels):
+            # The arrays are read-only, so they have identical voxels
+            return True
 
         return (
             dino.utils.allclose_with_shape_check(self.voxels, other.voxels)
-            and np.allclose(self.affine, other.affine)
             # and self.voxels.dtype == other.voxels.dtype
             # and self.affine.dtype == other.affine.dtype
         )
 
     @property
     def size(self) -> np.ndarray:  # 3
-        return np.array(self.voxels.shape)
+        if self.is_loaded:
+            return np.array(self.voxels.shape)
+        return np.array(self.__dict__["_loader"].shape)
 
     @property
     def origin(self) -> np.ndarray:  # 3
         return self.affine[:3, 3]
 
-    @property
+    # The affine and voxels are read-only, so everything derived from them is computed once.
+    # The statistics are of the stored voxels, see `to_physical_value`.
+
+    @functools.cached_property
     def spacing(self) -> np.ndarray:  # 3
-        return np.linalg.norm(self.affine[:3, :3], axis=0)
+        return _read_only(np.linalg.norm(self.affine[:3, :3], axis=0))
 
-    @property
+    @functools.cached_property
     def orientation(self) -> np.ndarray:  # 3x3
-        return self.affine[:3, :3] @ np.diag(1 / self.spacing)
+        return _read_only(self.affine[:3, :3] @ np.diag(1 / self.spacing))
+
+    @functools.cached_property
+    def inverse_affine(self) -> np.ndarray:  # 4x4
+        return _read_only(np.linalg.inv(self.affine))
+
+    @functools.cached_property
+    def min(self):
+        return self.voxels.min()
+
+    @functools.cached_property
+    def max(self):
+        return self.voxels.max()
+
+    @functools.cached_property
+    def mean(self):
+        return self.voxels.mean()
+
+    def histogram(self, bins: int = 256) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the histogram of the voxels between their min and max, see `np.histogram`."""
+        histograms = self.__dict__.setdefault("_histograms", {})
+        if bins not in histograms:
+            counts, edges = np.histogram(self.voxels, bins=bins, range=(self.min, self.max))
+            histograms[bins] = (_read_only(counts), _read_only(edges))
+        return histograms[bins]
+
+    @functools.cached_property
+    def content_hash(self) -> str:
+        """A hash of the affine and voxels, stable across processes, e.g. to memoize results."""
+        content_hash = hashlib.blake2b(digest_size=16)
+        content_hash.update(np.ascontiguousarray(self.affine, dtype=np.float64).tobytes())
+        content_hash.update(f"{self.voxels.dtype.str}{self.voxels.shape}".encode())
+        if self.is_rescaled:
+            content_hash.update(f"{self.rescale_slope!r} {self.rescale_intercept!r}".encode())
+        # Hash slice by slice, so at most one slice is copied to make it contiguous
+        for voxels in self.voxels:
+            content_hash.update(np.ascontiguousarray(voxels).data)
+        return content_hash.hexdigest()
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+def _is_same_array(a: np.ndarray, b: np.ndarray) -> bool:
+    return a is b or (
+        a.__array_interface__["data"] == b.__array_interface__["data"]
+        and a.shape == b.shape
+        and a.strides == b.strides
+        and a.dtype == b.dtype
+    )
@@ -0,0 +1,207 @@
+import contextlib
+import dataclasses
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Iterator, TypeVar
+
+import numpy as np
+
+import dino.structs
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# The active tracer, a single global so disabled tracing only costs one check per call
+_tracer: "Tracer | None" = None
+
+
+@dataclasses.dataclass
+class Event:
+    """A traced call or phase.
+
+    Attributes:
+        name: the name of the function or phase
+        start: the start in seconds since the start of the trace
+        duration: the wall time in seconds
+        thread_id: the id of the thread that ran it
+        args: the described inputs and output, and with memory tracing the allocated bytes
+    """
+
+    name: str
+    start: float
+    duration: float
+    thread_id: int
+    args: dict[str, Any]
+
+
+class Tracer:
+    """Records the events of the traced calls and phases while it is active, see `trace`."""
+
+    def __init__(self, memory: bool):
+        self.memory = memory
+        self.events: list[Event] = []
+        self._start = time.perf_counter()
+        self._local = threading.local()
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Aggregates the events per name, sorted by descending total wall time.
+
+        Returns:
+            per name the count, the total and max wall time in seconds, and with memory
+            tracing the max peak of allocated bytes
+        """
+        summary: dict[str, dict[str, float]] = {}
+        for event in self.events:
+            stats = summary.setdefault(
+                event.name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_bytes": 0}
+            )
+            stats["count"] += 1
+            stats["seconds"] += event.duration
+            stats["max_seconds"] = max(stats["max_seconds"], event.duration)
+            stats["peak_bytes"] = max(stats["peak_bytes"], event.args.get("peak_bytes", 0))
+        return dict(sorted(summary.items(), key=lambda item: -item[1]["seconds"]))
+
+    def save_chrome_trace(self, path: str | os.PathLike) -> None:
+        """Saves the events as Chrome trace JSON, viewable in chrome://tracing or Perfetto."""
+        trace_events = [
+            {
+                "name": event.name,
+                "cat": "dino",
+                "ph": "X",
+                "ts": event.start * 1e6,
+                "dur": event.duration * 1e6,
+                "pid": os.getpid(),
+                "tid": event.thread_id,
+                "args": event.args,
+            }
+            for event in self.events
+        ]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, file)
+
+    def _stack(self) -> list[list[int]]:
+        # Per thread, the running peak of allocated bytes of every open span
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+
+class _Span:
+    def __init__(self, tracer: Tracer, name: str, args: dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> dict[str, Any]:
+        if self.tracer.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stack = self.tracer._stack()
+            if stack:
+                # The peak is reset for this span, so keep the peak of the parent so far.
+                stack[-1][0] = max(stack[-1][0], peak)
+            tracemalloc.reset_peak()
+            stack.append([current, current])
+        self.start = time.perf_counter()
+        return self.args
+
+    def __exit__(self, *exc_info) -> None:
+        end = time.perf_counter()
+        if self.tracer.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stack = self.tracer._stack()
+            peak_so_far, start = stack.pop()
+            peak = max(peak, peak_so_far)
+            if stack:
+                stack[-1][0] = max(stack[-1][0], peak)
+            self.args["allocated_bytes"] = current - start
+            self.args["peak_bytes"] = peak - start
+
+        self.tracer.events.append(
+            Event(
+                self.name,
+                self.start - self.tracer._start,
+                end - self.start,
+                threading.get_ident(),
+                self.args,
+            )
+        )
+
+
+def span(name: str) -> contextlib.AbstractContextManager:
+    """Traces a phase within a traced function, a no-op when tracing is disabled.
+
+    Example:
+        with dino.tracing.span("create_image.decode"):
+            voxels = decode(slices)
+    """
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _Span(_tracer, name, {})
+
+
+def _describe(value: Any) -> Any:
+    if isinstance(value, dino.structs.Image):
+        # The voxels of unloaded images are not loaded just to describe them
+        dtype = str(value.voxels.dtype) if value.is_loaded else None
+        return {"size": value.size.tolist(), "dtype": dtype}
+    if isinstance(value, np.ndarray):
+        return {"shape": list(value.shape), "dtype": str(value.dtype)}
+    if isinstance(value, tuple):
+        return [_describe(item) for item in value]
+    if isinstance(value, list):
+        return f"list of {len(value)}"
+    return type(value).__name__
+
+
+def traced(fn: F) -> F:
+    """Traces the calls of a function with its wall time and the shapes of its image arguments."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return fn(*args, **kwargs)
+
+        inputs = [_describe(arg) for arg in args]
+        with _Span(_tracer, fn.__name__, {"inputs": inputs}) as span_args:
+            result = fn(*args, **kwargs)
+            span_args["output"] = _describe(result)
+        return result
+
+    return wrapper  # type: ignore[return-value]
+
+
+@contextlib.contextmanager
+def trace(*, memory: bool = False) -> Iterator[Tracer]:
+    """Traces the calls of dino functions within the context.
+
+    Example:
+        with dino.tracing.trace(memory=True) as tracer:
+            image = dn.rescale_image(dn.create_image(slices), (1, 1, 1))
+        print(tracer.summary())
+        tracer.save_chrome_trace("trace.json")
+
+    Args:
+        memory: whether to also trace the allocated and peak bytes per call with tracemalloc,
+            which slows down allocations. The bytes are of the whole process, so they include
+            the allocations of other threads.
+
+    Returns:
+        the tracer, which holds the events once the context exits
+    """
+    global _tracer
+    if _tracer is not None:
+        raise RuntimeError("Tracing is already enabled.")
+
+    start_tracemalloc = memory and not tracemalloc.is_tracing()
+    if start_tracemalloc:
+        tracemalloc.start()
+    _tracer = Tracer(memory)
+    try:
+        yield _tracer
+    finally:
+        _tracer = None
+        if start_tracemalloc:
+            tracemalloc.stop()
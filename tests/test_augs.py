@@ -0,0 +1,133 @@
+import unittest
+
+import numpy as np
+
+import dino.augs
+import dino.structs
+
+
+class TestRandomCropOrPadImage(unittest.TestCase):
+    def test_size(self):
+        image = dino.structs.Image(np.eye(4), np.zeros((12, 6, 9)))
+
+        image_cropped = dino.augs.random_crop_or_pad_image(image, (4, 8, 9))
+
+        np.testing.assert_array_equal(image_cropped.size, (4, 8, 9))
+
+    def test_crop_only_reads_cropped_slices(self):
+        voxels = np.arange(12 * 6 * 9, dtype=float).reshape(12, 6, 9)
+        loads = []
+
+        class Loader:
+            shape = voxels.shape
+
+            def load(self, start=0, stop=None):
+                loads.append((start, stop))
+                return voxels[start:stop]
+
+        image = dino.structs.Image.from_loader(np.eye(4), Loader())
+
+        image_cropped = dino.augs.random_crop_or_pad_image(image, (4, 6, 9))
+
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(loads[0][1] - loads[0][0], 4)
+        np.testing.assert_array_equal(image_cropped.voxels, voxels[loads[0][0] : loads[0][1]])
+
+
+class TestRandomCropOrPadImageBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        affine = np.diag([2.0, 1.0, 0.5, 1.0])
+        self.image = dino.structs.Image(affine, rng.random((12, 6, 9)))
+
+    def test_same_as_single_patches(self):
+        size = (8, 10, 9)
+        voxels, affines = dino.augs.random_crop_or_pad_image_batch(
+            self.image, size, 5, rng=np.random.default_rng(42)
+        )
+
+        rng = np.random.default_rng(42)
+        for patch_voxels, patch_affine in zip(voxels, affines):
+            image = dino.augs.random_crop_or_pad_image(self.image, size, rng=rng)
+            np.testing.assert_array_equal(patch_voxels, image.voxels)
+            np.testing.assert_array_equal(patch_affine, image.affine)
+
+    def test_reuses_buffer(self):
+        out = np.empty((3, 4, 4, 4))
+
+        voxels, affines = dino.augs.random_crop_or_pad_image_batch(
+            self.image, (4, 4, 4), 3, out=out
+        )
+
+        self.assertIs(voxels, out)
+        self.assertEqual(affines.shape, (3, 4, 4))
+
+    def test_zero_pad_value(self):
+        image = dino.structs.Image(np.eye(4), self.image.voxels + 5)
+
+        voxels, _ = dino.augs.random_crop_or_pad_image_batch(image, (16, 6, 9), 2, pad_value=0)
+        image_padded = dino.augs.random_crop_or_pad_image(image, (16, 6, 9), pad_value=0)
+
+        self.assertEqual(voxels.min(), 0)
+        self.assertEqual(image_padded.voxels.min(), 0)
+
+    def test_invalid_buffer(self):
+        with self.assertRaises(ValueError):
+            dino.augs.random_crop_or_pad_image_batch(
+                self.image, (4, 4, 4), 3, out=np.empty((2, 4, 4, 4))
+            )
+
+
+class TestRandomSpatialTransformImage(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        # Linear in the voxel coordinates, so linear interpolation is exact
+        voxels = np.einsum("i,ijkl->jkl", [1.0, 2.0, 3.0], np.indices((32, 24, 28)))
+        affine = np.diag([2.0, 1.0, 1.5, 1.0])
+        affine[:3, 3] = (-10, 5, 0)
+        self.image = dino.structs.Image(affine, voxels)
+
+    def expected_voxels(self, affine: np.ndarray, size: tuple[int, int, int]) -> np.ndarray:
+        grid = np.r_[np.indices(size), [np.ones(size)]].reshape(4, -1)
+        coordinates = (np.linalg.inv(self.image.affine) @ affine @ grid)[:3]
+        voxels = np.array([1.0, 2.0, 3.0]) @ coordinates
+
+        # Voxels outside the image are padded with the min value
+        is_outside = np.any(
+            (coordinates < 0) | (coordinates > (self.image.size - 1)[:, None]), axis=0
+        )
+        voxels[is_outside] = 0
+        return voxels.reshape(size)
+
+    def test_affine_matches_voxels(self):
+        image = dino.augs.random_spatial_transform_image(
+            self.image,
+            (8, 8, 8),
+            max_rotation=0.3,
+            max_scaling=0.1,
+            rng=np.random.default_rng(0),
+        )
+
+        np.testing.assert_array_equal(image.size, (8, 8, 8))
+        np.testing.assert_allclose(
+            image.voxels, self.expected_voxels(image.affine, (8, 8, 8)), atol=1e-4
+        )
+
+    def test_without_transform_is_translation(self):
+        image = dino.augs.random_spatial_transform_image(
+            self.image, (8, 6, 4), rng=np.random.default_rng(0)
+        )
+
+        np.testing.assert_allclose(image.affine[:3, :3], self.image.affine[:3, :3])
+
+    def test_elastic_deformation(self):
+        image = dino.augs.random_spatial_transform_image(
+            self.image, (8, 8, 8), elastic_magnitude=1.0, rng=np.random.default_rng(0)
+        )
+
+        self.assertFalse(np.allclose(image.voxels, self.expected_voxels(image.affine, (8, 8, 8))))
+
+
+if __name__ == "__main__":
+    unittest.main()
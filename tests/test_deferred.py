@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+import dino.deferred
+import dino.ops
+import dino.structs
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        affine = np.diag([-1.0, 2.0, -0.5, 1.0])
+        affine[:3, 3] = (10, 20, 30)
+        self.image = dino.structs.Image(affine, rng.integers(0, 100, (12, 10, 8)))
+
+    def test_fuses_crops_pads_and_mirrors(self):
+        pipeline = (
+            dino.deferred.pipeline(self.image)
+            .crop(bounds=((1, 2, 0), (11, 10, 7)))
+            .canonicalize_mirrored()
+            .pad(((2, 0, 1), (1, 3, 0)))
+            .crop(bbx=((1, 1, 0), (10, 10, 8)))
+        )
+
+        image = dino.ops.crop_image(self.image, bounds=((1, 2, 0), (11, 10, 7)))
+        image = dino.ops.canonicalize_mirrored_image(image)
+        image = dino.ops.pad_image(image, ((2, 0, 1), (1, 3, 0)))
+        image = dino.ops.crop_image(image, bbx=((1, 1, 0), (10, 10, 8)))
+
+        self.assertEqual(len(pipeline.plan()), 1)
+        image_pipeline = pipeline.materialize()
+        np.testing.assert_array_equal(image_pipeline.voxels, image.voxels)
+        np.testing.assert_array_equal(image_pipeline.affine, image.affine)
+
+    def test_different_pad_values(self):
+        pipeline = (
+            dino.deferred.pipeline(self.image)
+            .pad(((1, 1, 1), (1, 1, 1)), pad_value=-1)
+            .pad(((1, 1, 1), (1, 1, 1)), pad_value=-1)
+            .pad(((2, 0, 0), (0, 0, 0)), pad_value=-2)
+        )
+
+        image = dino.ops.pad_image(self.image, ((2, 2, 2), (2, 2, 2)), pad_value=-1)
+        image = dino.ops.pad_image(image, ((2, 0, 0), (0, 0, 0)), pad_value=-2)
+
+        self.assertEqual(len(pipeline.plan()), 2)
+        np.testing.assert_array_equal(pipeline.materialize().voxels, image.voxels)
+
+    def test_resize(self):
+        pipeline = (
+            dino.deferred.pipeline(self.image)
+            .crop(bounds=((0, 0, 0), (10, 10, 8)))
+            .rescale((2, 2, 2))
+            .pad(((1, 1, 1), (1, 1, 1)), pad_value=0)
+        )
+
+        image = dino.ops.crop_image(self.image, bounds=((0, 0, 0), (10, 10, 8)))
+        image = dino.ops.rescale_image(image, (2, 2, 2))
+        image = dino.ops.pad_image(image, ((1, 1, 1), (1, 1, 1)), pad_value=0)
+
+        self.assertEqual(
+            [type(stage) for stage in pipeline.plan()],
+            [dino.deferred.Window, dino.deferred.Resize, dino.deferred.Window],
+        )
+        image_pipeline = pipeline.materialize()
+        np.testing.assert_array_equal(image_pipeline.voxels, image.voxels)
+        np.testing.assert_array_equal(image_pipeline.affine, image.affine)
+
+
+if __name__ == "__main__":
+    unittest.main()
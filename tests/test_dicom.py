@@ -1,9 +1,12 @@
+import os
+import tempfile
 import unittest
 
 import numpy as np
 import pydicom
 
 import dino.dicom
+import dino.ops
 
 
 def create_empty_pydicom_dataset() -> pydicom.Dataset:
@@ -59,6 +62,201 @@ class TestLoadAffine(unittest.TestCase):
 
         np.testing.assert_array_equal(image.affine, np.eye(4))
 
+    def test_load_affine_unsorted(self):
+        slices = []
+        for z in [2, 0, 3, 1]:
+            slice = create_empty_pydicom_dataset()
+            slice.ImagePositionPatient = [0, 0, z]
+            slices.append(slice)
+
+        image = dino.dicom.create_image(slices)
+
+        np.testing.assert_array_equal(image.affine, np.eye(4))
+
+    def test_unequal_spacing_reports_slice(self):
+        slices = []
+        for z in [0, 1, 3]:
+            slice = create_empty_pydicom_dataset()
+            slice.ImagePositionPatient = [0, 0, z]
+            slices.append(slice)
+
+        with self.assertRaisesRegex(ValueError, "not equal at slices 1 and 2"):
+            dino.dicom.create_image(slices)
+
+
+class TestCreateImageVoxels(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.slices = []
+        for z in range(4):
+            slice = create_empty_pydicom_dataset()
+            slice.ImagePositionPatient = [0, 0, z]
+            slice.RescaleSlope = 2
+            slice.RescaleIntercept = -1024
+            set_pydicom_pixel_data(slice, np.full((8, 8), z, dtype=np.int16))
+            self.slices.append(slice)
+
+    def test_rescaled_voxels(self):
+        image = dino.dicom.create_image(self.slices[::-1])
+
+        self.assertEqual(image.voxels.dtype, np.float64)
+        np.testing.assert_array_equal(image.voxels[:, 0, 0], [-1024, -1022, -1020, -1018])
+
+    def test_threaded_decoding_equals_sequential(self):
+        image = dino.dicom.create_image(self.slices)
+        image_threaded = dino.dicom.create_image(self.slices, num_workers=3)
+
+        np.testing.assert_array_equal(image_threaded.voxels, image.voxels)
+
+    def test_dtype(self):
+        image = dino.dicom.create_image(self.slices, dtype=np.int16, num_workers=2)
+
+        self.assertEqual(image.voxels.dtype, np.int16)
+        np.testing.assert_array_equal(image.voxels[:, 0, 0], [-1024, -1022, -1020, -1018])
+
+    def test_integer_dtype_with_fractional_slope(self):
+        for slice in self.slices:
+            slice.RescaleSlope = 0.5
+            slice.RescaleIntercept = 0.5
+
+        image = dino.dicom.create_image(self.slices, dtype=np.int16)
+
+        np.testing.assert_array_equal(image.voxels[:, 0, 0], [0, 1, 1, 2])
+
+
+class TestCreateImageStored(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.slices = []
+        for z in range(4):
+            slice = create_empty_pydicom_dataset()
+            slice.ImagePositionPatient = [0, 0, z]
+            slice.PixelRepresentation = 1
+            slice.RescaleSlope = 2
+            slice.RescaleIntercept = -1024
+            set_pydicom_pixel_data(slice, np.full((8, 8), z - 1, dtype=np.int16))
+            self.slices.append(slice)
+
+    def test_native_dtype(self):
+        image = dino.dicom.create_image(self.slices, apply_rescale=False)
+
+        self.assertEqual(image.voxels.dtype, np.int16)
+        self.assertEqual((image.rescale_slope, image.rescale_intercept), (2, -1024))
+        np.testing.assert_array_equal(image.voxels[:, 0, 0], [-1, 0, 1, 2])
+
+    def test_physical_voxels(self):
+        image = dino.dicom.create_image(self.slices, apply_rescale=False, load_voxels=False)
+        image_rescaled = dino.dicom.create_image(self.slices)
+
+        np.testing.assert_array_equal(image.physical_voxels(), image_rescaled.voxels)
+        self.assertEqual(image, image_rescaled)
+
+    def test_different_rescale_per_slice(self):
+        self.slices[2].RescaleSlope = 1
+
+        with self.assertRaisesRegex(ValueError, "identical RescaleSlope"):
+            dino.dicom.create_image(self.slices, apply_rescale=False)
+
+
+def create_multiframe_dataset(positions: list[list[float]]) -> pydicom.Dataset:
+    dataset = create_empty_pydicom_dataset()
+    dataset.PixelRepresentation = 1
+    dataset.NumberOfFrames = len(positions)
+    pixel_array = np.stack([np.full((8, 8), z, dtype=np.int16) for _, _, z in positions])
+    set_pydicom_pixel_data(dataset, pixel_array[0])
+    dataset.PixelData = pixel_array.tobytes()
+
+    shared = pydicom.Dataset()
+    shared.PixelMeasuresSequence = [pydicom.Dataset()]
+    shared.PixelMeasuresSequence[0].PixelSpacing = [1, 1]
+    shared.PlaneOrientationSequence = [pydicom.Dataset()]
+    shared.PlaneOrientationSequence[0].ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    shared.PixelValueTransformationSequence = [pydicom.Dataset()]
+    shared.PixelValueTransformationSequence[0].RescaleSlope = 2
+    shared.PixelValueTransformationSequence[0].RescaleIntercept = -1024
+    dataset.SharedFunctionalGroupsSequence = [shared]
+
+    dataset.PerFrameFunctionalGroupsSequence = []
+    for position in positions:
+        frame = pydicom.Dataset()
+        frame.PlanePositionSequence = [pydicom.Dataset()]
+        frame.PlanePositionSequence[0].ImagePositionPatient = position
+        dataset.PerFrameFunctionalGroupsSequence.append(frame)
+    return dataset
+
+
+class TestCreateImageFromMultiframe(unittest.TestCase):
+    def test_sorted_frames(self):
+        dataset = create_multiframe_dataset([[0, 0, z] for z in [2, 0, 3, 1]])
+
+        image = dino.dicom.create_image_from_multiframe(dataset)
+
+        np.testing.assert_array_equal(image.affine, np.eye(4))
+        np.testing.assert_array_equal(image.voxels[:, 0, 0], [-1024, -1022, -1020, -1018])
+
+    def test_stored_voxels_without_copy(self):
+        dataset = create_multiframe_dataset([[0, 0, z] for z in range(4)])
+
+        image = dino.dicom.create_image_from_multiframe(dataset, apply_rescale=False)
+
+        self.assertEqual(image.voxels.dtype, np.int16)
+        self.assertEqual((image.rescale_slope, image.rescale_intercept), (2, -1024))
+        self.assertTrue(np.shares_memory(image.voxels, dataset.pixel_array))
+
+    def test_unequal_spacing(self):
+        dataset = create_multiframe_dataset([[0, 0, z] for z in [0, 1, 3, 4]])
+
+        with self.assertRaisesRegex(ValueError, "not equal at slices 1 and 2"):
+            dino.dicom.create_image_from_multiframe(dataset)
+
+
+class TestCreateImageLazy(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.slices = []
+        for z in range(4):
+            slice = create_empty_pydicom_dataset()
+            slice.ImagePositionPatient = [0, 0, z]
+            set_pydicom_pixel_data(slice, np.full((8, 8), z, dtype=np.int16))
+            path = os.path.join(self.directory.name, f"{z}.dcm")
+            slice.save_as(path)
+            self.slices.append(pydicom.dcmread(path, stop_before_pixels=True))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_geometry_without_voxels(self):
+        image = dino.dicom.create_image(self.slices, load_voxels=False)
+
+        self.assertFalse(image.is_loaded)
+        np.testing.assert_array_equal(image.size, (4, 8, 8))
+        np.testing.assert_array_equal(image.affine, np.eye(4))
+
+    def test_voxels_loaded_on_access(self):
+        image = dino.dicom.create_image(self.slices, load_voxels=False)
+
+        np.testing.assert_array_equal(image.voxels[:, 0, 0], [0, 1, 2, 3])
+        self.assertTrue(image.is_loaded)
+        self.assertEqual(image, dino.dicom.create_image(self.slices))
+
+    def test_load_slice_range(self):
+        image = dino.dicom.create_image(self.slices, load_voxels=False)
+
+        voxels = image.load_voxels(1, 3)
+
+        np.testing.assert_array_equal(voxels[:, 0, 0], [1, 2])
+        self.assertFalse(image.is_loaded)
+
+    def test_crop_only_loads_cropped_slices(self):
+        image = dino.dicom.create_image(self.slices, load_voxels=False)
+
+        image_cropped = dino.ops.crop_image(image, bounds=((2, 0, 0), (4, 4, 4)))
+
+        self.assertFalse(image.is_loaded)
+        np.testing.assert_array_equal(image_cropped.voxels[:, 0, 0], [2, 3])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,57 @@
+import re
+import subprocess
+import sys
+import unittest
+
+# The budget for the self time of importing the dino modules, excluding their dependencies
+IMPORT_TIME_BUDGET_US = 50_000
+
+
+class TestImports(unittest.TestCase):
+    def import_dino(self, code: str) -> tuple[list[str], dict[str, int]]:
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                f"import sys, dino; {code}; print(*sys.modules)",
+            ],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        self_times = {}
+        for line in process.stderr.splitlines():
+            match = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)", line)
+            if match:
+                self_times[match.group(2)] = int(match.group(1))
+        return process.stdout.split(), self_times
+
+    def test_crop_and_pad_without_heavy_dependencies(self):
+        modules, _ = self.import_dino("dino.crop_image, dino.pad_image, dino.Image")
+
+        self.assertNotIn("scipy", modules)
+        self.assertNotIn("pydicom", modules)
+
+    def test_load_image_without_pydicom(self):
+        modules, _ = self.import_dino("dino.load_image, dino.ImagePyramid.load")
+
+        self.assertNotIn("pydicom", modules)
+        self.assertNotIn("dino.dicom", modules)
+
+    def test_submodules_on_access(self):
+        modules, _ = self.import_dino("dino.create_image")
+
+        self.assertIn("pydicom", modules)
+        self.assertNotIn("dino.ops", modules)
+
+    def test_import_time_budget(self):
+        _, self_times = self.import_dino("dino.crop_image")
+
+        dino_time = sum(time for name, time in self_times.items() if name.startswith("dino"))
+        self.assertLess(dino_time, IMPORT_TIME_BUDGET_US)
+
+
+if __name__ == "__main__":
+    unittest.main()
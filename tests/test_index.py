@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import unittest.mock
+
+import numpy as np
+import pydicom
+
+import dino.dicom
+import dino.index
+from tests.test_dicom import set_pydicom_pixel_data
+from tests.test_storage import create_series
+
+
+class TestSeriesIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, "dicom")
+        self.series = [create_series(), create_series()]
+        for series_index, slices in enumerate(self.series):
+            os.makedirs(os.path.join(self.root, str(series_index)))
+            for slice_index, slice in enumerate(slices):
+                slice.save_as(os.path.join(self.root, str(series_index), f"{slice_index}.dcm"))
+        with open(os.path.join(self.root, "README.txt"), "w") as file:
+            file.write("not a dicom file")
+
+        self.index = dino.index.SeriesIndex(os.path.join(self.directory.name, "index.sqlite"))
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_groups_files_by_series(self):
+        self.index.scan(self.root, num_workers=2)
+
+        self.assertCountEqual(
+            self.index.series_uids(), [slices[0].SeriesInstanceUID for slices in self.series]
+        )
+        self.assertEqual(len(self.index.paths(self.series[0][0].SeriesInstanceUID)), 4)
+
+    def test_create_image_from_index(self):
+        self.index.scan(self.root, num_workers=2)
+        slices = self.series[1]
+
+        image = dino.dicom.create_image(
+            self.index.slices(slices[0].SeriesInstanceUID), load_voxels=False
+        )
+
+        self.assertEqual(image, dino.dicom.create_image(slices))
+
+    def test_reads_pixel_data_at_indexed_offset(self):
+        self.index.scan(self.root, num_workers=2)
+        slices = self.series[0]
+        indexed_slices = self.index.slices(slices[0].SeriesInstanceUID)
+
+        # The headers are not parsed again to read the pixel data
+        with unittest.mock.patch("pydicom.dcmread", side_effect=AssertionError):
+            image = dino.dicom.create_image(indexed_slices)
+
+        self.assertEqual(image, dino.dicom.create_image(slices))
+
+    def test_masks_unused_bits_at_indexed_offset(self):
+        path = os.path.join(self.root, "0", "0.dcm")
+        slice = pydicom.dcmread(path)
+        slice.BitsStored = 12
+        slice.PixelRepresentation = 1
+        slice.PixelData = np.array([[0xF001, 0x0801], [5, 0x0FFF]], dtype=np.uint16).tobytes()
+        slice.Rows, slice.Columns = 2, 2
+        slice.save_as(path)
+        self.index.scan(self.root, num_workers=2)
+
+        indexed_slices = self.index.slices(slice.SeriesInstanceUID)
+        indexed_slice = next(item for item in indexed_slices if item.filename == path)
+
+        expected = pydicom.dcmread(path).pixel_array
+        with unittest.mock.patch("pydicom.dcmread", side_effect=AssertionError):
+            pixel_array = dino.dicom._read_pixel_array(indexed_slice)
+
+        np.testing.assert_array_equal(pixel_array, expected)
+        np.testing.assert_array_equal(pixel_array, [[1, -2047], [5, -1]])
+
+    def test_implicit_vr_length_spelling_a_vr(self):
+        path = os.path.join(self.root, "0", "0.dcm")
+        slice = pydicom.dcmread(path)
+        slice.BitsAllocated = slice.BitsStored = 8
+        set_pydicom_pixel_data(slice, np.arange(97 * 175, dtype=np.uint8).reshape(97, 175))
+        slice.save_as(path)
+        # Without the padding to an even length, the implicit VR length 0x424F of the pixel data
+        # starts with the bytes b"OB"
+        with open(path, "rb") as file:
+            data = file.read()
+        start = data.index(b"\xe0\x7f\x10\x00") + 4
+        with open(path, "wb") as file:
+            file.write(data[:start] + b"OB\x00\x00" + data[start + 4 : -1])
+        self.index.scan(self.root, num_workers=2)
+
+        indexed_slices = self.index.slices(slice.SeriesInstanceUID)
+        indexed_slice = next(item for item in indexed_slices if item.filename == path)
+
+        with unittest.mock.patch("pydicom.dcmread", side_effect=AssertionError):
+            pixel_array = dino.dicom._read_pixel_array(indexed_slice)
+
+        np.testing.assert_array_equal(pixel_array, pydicom.dcmread(path).pixel_array)
+
+    def test_skips_unreadable_files(self):
+        os.symlink(
+            os.path.join(self.root, "missing.dcm"), os.path.join(self.root, "broken_link.dcm")
+        )
+        # A header that is DICOM, but of which a value cannot be parsed
+        path = os.path.join(self.root, "0", "0.dcm")
+        with open(path, "rb") as file:
+            data = file.read()
+        start = data.index(b"\x28\x00\x53\x10") + 8  # the value of RescaleSlope
+        with open(path, "wb") as file:
+            file.write(data[:start] + b"x" * 4 + data[start + 4 :])
+
+        with self.assertWarnsRegex(UserWarning, "Skipped 1 unreadable files:\n.*0.dcm"):
+            self.assertEqual(self.index.scan(self.root, num_workers=2), 8)
+
+        self.assertEqual(len(self.index.paths(self.series[0][0].SeriesInstanceUID)), 3)
+        self.assertEqual(len(self.index.paths(self.series[1][0].SeriesInstanceUID)), 4)
+
+    def test_index_without_transfer_syntax(self):
+        path = os.path.join(self.directory.name, "old.sqlite")
+        connection = sqlite3.connect(path)
+        connection.executescript(dino.index._SCHEMA.replace(",\n    transfer_syntax_uid TEXT", ""))
+        connection.close()
+
+        with dino.index.SeriesIndex(path) as index:
+            index.scan(self.root, num_workers=2)
+            slices = self.series[0]
+            image = dino.dicom.create_image(index.slices(slices[0].SeriesInstanceUID))
+
+        self.assertEqual(image, dino.dicom.create_image(slices))
+
+    def test_rescan_skips_unchanged_files(self):
+        self.assertEqual(self.index.scan(self.root, num_workers=2), 9)
+        self.assertEqual(self.index.scan(self.root, num_workers=2), 0)
+
+        path = os.path.join(self.root, "0", "0.dcm")
+        os.utime(path, ns=(0, 0))
+        os.remove(os.path.join(self.root, "1", "0.dcm"))
+
+        self.assertEqual(self.index.scan(self.root, num_workers=2), 1)
+        self.assertEqual(len(self.index.paths(self.series[1][0].SeriesInstanceUID)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import numpy as np
+
+import dino.augs
+import dino.loader
+import dino.structs
+
+
+def create_patch(item: int, rng: np.random.Generator) -> dino.structs.Image:
+    voxels = np.arange(16**3, dtype=np.float32).reshape(16, 16, 16) + item
+    image = dino.structs.Image(np.eye(4), voxels)
+    return dino.augs.random_crop_or_pad_image(image, (8, 8, 8), rng=rng)
+
+
+def fail(item: int, rng: np.random.Generator) -> dino.structs.Image:
+    raise KeyError(item)
+
+
+def exit_process(item: int, rng: np.random.Generator) -> dino.structs.Image:
+    os._exit(1)
+
+
+class TestLoader(unittest.TestCase):
+    def load(self, seed: int) -> list[dino.structs.Image]:
+        with dino.loader.Loader(
+            range(7), create_patch, slot_bytes=8**3 * 4, num_workers=3, seed=seed
+        ) as loader:
+            # Copy the images, they are only valid until the next image is requested
+            return [dino.structs.Image(image.affine, image.voxels.copy()) for image in loader]
+
+    def test_deterministic(self):
+        images = self.load(seed=0)
+
+        self.assertEqual(len(images), 7)
+        self.assertEqual(images, self.load(seed=0))
+        self.assertNotEqual(images, self.load(seed=1))
+
+    def test_in_order(self):
+        for item, image in enumerate(self.load(seed=0)):
+            offset = image.voxels[0, 0, 0] - item
+            np.testing.assert_array_equal(
+                image.affine[:3, 3], np.unravel_index(int(offset), (16, 16, 16))
+            )
+
+    def test_voxels_in_shared_memory(self):
+        with dino.loader.Loader(range(2), create_patch, slot_bytes=8**3 * 4) as loader:
+            for image in loader:
+                self.assertFalse(image.voxels.flags.owndata)
+                self.assertFalse(image.voxels.flags.writeable)
+
+    def test_worker_error(self):
+        with dino.loader.Loader(range(2), fail, slot_bytes=8, num_workers=1) as loader:
+            with self.assertRaisesRegex(RuntimeError, "KeyError"):
+                list(loader)
+
+    def test_worker_exit(self):
+        with dino.loader.Loader(range(2), exit_process, slot_bytes=8, num_workers=1) as loader:
+            with self.assertRaisesRegex(RuntimeError, "Worker 0 exited with code 1"):
+                list(loader)
+
+    def test_shared_memory_released_once(self):
+        # The resource tracker reports shared memory that is unregistered twice, or leaked
+        code = (
+            "import dino.loader, tests.test_loader as test; "
+            "loader = dino.loader.Loader(range(3), test.create_patch, slot_bytes=8**3 * 4); "
+            "list(loader); loader.close()"
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, check=True, text=True
+        )
+
+        self.assertEqual(process.stderr, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 import unittest
 
 import numpy as np
+import scipy.ndimage
 
 import dino.ops
+import dino.structs
 from testing import faking
 
 
@@ -20,6 +22,105 @@ class TestResizeImage(unittest.TestCase):
         np.testing.assert_array_equal(image_resized.size, (8, 8, 8))
 
 
+class TestResizeImageTiled(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.image = dino.structs.Image(np.eye(4), rng.random((20, 12, 16)))
+
+    def test_downscale_identical(self):
+        image_resized = dino.ops.resize_image(self.image, (7, 9, 8))
+        image_tiled = dino.ops.resize_image(self.image, (7, 9, 8), tile_size=2, num_workers=2)
+
+        np.testing.assert_array_equal(image_tiled.voxels, image_resized.voxels)
+        np.testing.assert_array_equal(image_tiled.affine, image_resized.affine)
+
+    def test_upscale_identical(self):
+        for order in [0, 1, 3]:
+            image_resized = dino.ops.resize_image(self.image, (43, 12, 30), order=order)
+            image_tiled = dino.ops.resize_image(
+                self.image, (43, 12, 30), order=order, tile_size=5, num_workers=3
+            )
+
+            np.testing.assert_array_equal(image_tiled.voxels, image_resized.voxels)
+
+
+class TestResizeBackends(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.image = dino.structs.Image(np.eye(4), rng.random((20, 12, 16)))
+
+    def test_numpy_close_to_scipy(self):
+        for size in [(10, 6, 8), (30, 25, 7)]:
+            image_numpy = dino.ops.resize_image(self.image, size, backend="numpy")
+            image_scipy = dino.ops.resize_image(self.image, size, backend="scipy")
+
+            np.testing.assert_allclose(image_numpy.voxels, image_scipy.voxels, atol=1e-5)
+            np.testing.assert_array_equal(image_numpy.affine, image_scipy.affine)
+
+    def test_tiled_identical_to_tile_size(self):
+        image_backend = dino.ops.resize_image(self.image, (10, 6, 8), backend="tiled")
+        image_tiled = dino.ops.resize_image(self.image, (10, 6, 8), tile_size=32)
+
+        np.testing.assert_array_equal(image_backend.voxels, image_tiled.voxels)
+
+    def test_default_backend(self):
+        calls = []
+
+        def backend(image, size, order, tile_size, num_workers):
+            calls.append(tuple(size))
+            return np.zeros(size, dtype=np.float32)
+
+        dino.ops.register_resize_backend("test", backend)
+        previous = dino.ops.set_resize_backend("test")
+        try:
+            dino.ops.rescale_image(self.image, (2, 2, 2))
+        finally:
+            dino.ops.set_resize_backend(previous)
+
+        self.assertEqual(calls, [(10, 6, 8)])
+        with self.assertRaisesRegex(ValueError, "backend should be one of"):
+            dino.ops.resize_image(self.image, (10, 6, 8), backend="unknown")
+
+
+class TestResizeLabelImage(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        voxels = np.zeros((12, 12, 12), dtype=np.uint8)
+        voxels[2:6, 2:10, 2:10] = 1
+        voxels[6:10, 2:10, 2:10] = 7
+        self.image = dino.structs.Image(np.diag([1.0, 2.0, 3.0, 1.0]), voxels)
+
+    def test_nearest_keeps_dtype(self):
+        image_resized = dino.ops.resize_label_image(self.image, (23, 6, 12))
+
+        self.assertEqual(image_resized.voxels.dtype, np.uint8)
+        np.testing.assert_array_equal(np.unique(image_resized.voxels), (0, 1, 7))
+        np.testing.assert_array_equal(
+            image_resized.affine, dino.ops.resize_image(self.image, (23, 6, 12)).affine
+        )
+
+    def test_smooth_labels(self):
+        image_resized = dino.ops.resize_label_image(self.image, (6, 6, 6), order=1, tile_size=4)
+
+        self.assertEqual(image_resized.voxels.dtype, np.uint8)
+        np.testing.assert_array_equal(image_resized.voxels[:, 3, 3], (0, 1, 1, 7, 7, 0))
+
+    def test_boolean_mask(self):
+        image = dino.structs.Image(np.eye(4), self.image.voxels > 0)
+
+        image_rescaled = dino.ops.rescale_label_image(image, (0.5, 0.5, 0.5), order=1)
+
+        self.assertEqual(image_rescaled.voxels.dtype, np.bool_)
+        np.testing.assert_array_equal(image_rescaled.size, (23, 23, 23))
+        self.assertEqual(image_rescaled.voxels.sum(), 15**3)
+
+    def test_float_voxels(self):
+        with self.assertRaises(ValueError):
+            dino.ops.resize_label_image(faking.create_fake_image(), (8, 8, 8))
+
+
 class TestCropImage(unittest.TestCase):
     def setUp(self) -> None:
         super().setUp()
@@ -32,3 +133,206 @@ class TestCropImage(unittest.TestCase):
     def test_smaller_size(self):
         image_cropped = dino.ops.crop_image(self.image, bounds=((0, 0, 0), (8, 8, 8)))
         np.testing.assert_array_equal(image_cropped.size, (8, 8, 8))
+
+
+class TestWorldSampling(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        affine = np.diag([2.0, 1.0, 0.5, 1.0])
+        affine[:3, 3] = (10, -5, 3)
+        self.image = dino.structs.Image(affine, rng.random((10, 12, 16)).astype(np.float32))
+
+    def test_sample_world_points(self):
+        rng = np.random.default_rng(1)
+        coordinates = rng.uniform(0, 9, (3, 100))
+        points = (self.image.affine @ np.r_[coordinates, np.ones((1, 100))])[:3].T
+
+        for order in [0, 1, 3]:
+            values = dino.ops.sample_world_points(self.image, points, order=order, chunk_size=7)
+
+            expected = scipy.ndimage.map_coordinates(
+                self.image.voxels, coordinates, order=order, mode="constant"
+            )
+            np.testing.assert_allclose(values, expected, rtol=1e-5, atol=1e-6)
+
+    def test_points_outside_image(self):
+        values = dino.ops.sample_world_points(self.image, [[0, 0, 0], [100, 0, 0]], pad_value=-1)
+
+        np.testing.assert_array_equal(values, [-1, -1])
+
+    def test_only_loads_sampled_slices(self):
+        loads = []
+        voxels = self.image.voxels
+
+        class Loader:
+            shape = voxels.shape
+
+            def load(self, start=0, stop=None):
+                loads.append((start, stop))
+                return voxels[start:stop]
+
+        image = dino.structs.Image.from_loader(self.image.affine, Loader())
+        points = [[14, 0, 4], [16.5, 1, 5]]
+
+        values = dino.ops.sample_world_points(image, points)
+
+        # The slices around the points, without reading all voxels for the default pad value
+        self.assertEqual(len(loads), 1)
+        self.assertLess(loads[0][1] - loads[0][0], image.size[0])
+        np.testing.assert_allclose(values, dino.ops.sample_world_points(self.image, points))
+
+    def test_crop_world_boxes(self):
+        boxes = [[[10, -5, 3], [14, 0, 4]], [[16, 1, 5.1], [12, -1, 4.9]]]
+
+        image_first, image_second = dino.ops.crop_world_boxes(self.image, boxes, chunk_size=1)
+
+        self.assertEqual(
+            image_first, dino.ops.crop_image(self.image, bounds=((0, 0, 0), (3, 6, 3)))
+        )
+        self.assertEqual(
+            image_second, dino.ops.crop_image(self.image, bounds=((1, 4, 4), (4, 7, 5)))
+        )
+        self.assertTrue(np.shares_memory(image_first.voxels, self.image.voxels))
+        with self.assertRaisesRegex(ValueError, "Box 0 does not overlap"):
+            list(dino.ops.crop_world_boxes(self.image, [[[100, 0, 0], [101, 1, 1]]]))
+
+
+class TestRescaledVoxels(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        voxels = rng.integers(-100, 100, (8, 8, 8)).astype(np.int16)
+        self.image = dino.structs.Image(np.eye(4), voxels, 2.0, -1024.0)
+        self.image_physical = dino.structs.Image(np.eye(4), self.image.physical_voxels())
+
+    def test_crop_and_pad_keep_stored_voxels(self):
+        image_cropped = dino.ops.crop_image(self.image, bounds=((0, 0, 0), (4, 4, 4)))
+        image_padded = dino.ops.pad_image(image_cropped, ((1, 1, 1), (1, 1, 1)), pad_value=-1024)
+
+        self.assertEqual(image_padded.voxels.dtype, np.int16)
+        self.assertEqual(image_padded.rescale_slope, 2)
+        self.assertEqual(image_padded.voxels[0, 0, 0], 0)
+        with self.assertRaisesRegex(ValueError, "cannot be stored"):
+            dino.ops.pad_image(image_cropped, ((1, 1, 1), (1, 1, 1)), pad_value=-1023)
+
+    def test_resize_physical_values(self):
+        image_resized = dino.ops.resize_image(self.image, (4, 4, 4))
+        image_resized_tiled = dino.ops.resize_image(self.image, (4, 4, 4), tile_size=2)
+
+        self.assertFalse(image_resized.is_rescaled)
+        np.testing.assert_allclose(
+            image_resized.voxels,
+            dino.ops.resize_image(self.image_physical, (4, 4, 4)).voxels,
+            rtol=1e-6,
+        )
+        np.testing.assert_array_equal(image_resized_tiled.voxels, image_resized.voxels)
+
+
+class TestResampleToGrid(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.image = dino.structs.Image(np.eye(4), rng.random((16, 16, 16)).astype(np.float32))
+
+    def test_crop(self):
+        image_cropped = dino.ops.crop_image(self.image, bbx=((2, 3, 4), (8, 8, 8)))
+
+        image_resampled = dino.ops.resample_to_grid(self.image, image_cropped.affine, (8, 8, 8))
+
+        self.assertEqual(image_resampled, image_cropped)
+
+    def test_pad(self):
+        image_padded = dino.ops.pad_image(self.image, ((1, 2, 3), (3, 2, 1)), pad_value=-1)
+
+        image_resampled = dino.ops.resample_to_grid(
+            self.image, image_padded.affine, image_padded.size, pad_value=-1
+        )
+
+        self.assertEqual(image_resampled, image_padded)
+
+    def test_resize(self):
+        image_resized = dino.ops.resize_image(self.image, (31, 31, 31))
+
+        image_resampled = dino.ops.resample_to_grid(self.image, image_resized.affine, (31, 31, 31))
+
+        np.testing.assert_allclose(image_resampled.voxels, image_resized.voxels, atol=1e-5)
+
+    def test_downscale(self):
+        image_resized = dino.ops.resize_image(self.image, (8, 6, 5))
+
+        image_resampled = dino.ops.resample_to_grid(self.image, image_resized.affine, (8, 6, 5))
+
+        np.testing.assert_allclose(image_resampled.voxels, image_resized.voxels, atol=1e-5)
+
+    def test_spline_region(self):
+        rng = np.random.default_rng(0)
+        image = dino.structs.Image(np.eye(4), rng.random((64, 64, 64)).astype(np.float32))
+        affine = np.eye(4)
+        affine[:3, 3] = (28.5, 30.25, 27.75)
+
+        image_resampled = dino.ops.resample_to_grid(image, affine, (8, 8, 8), order=3)
+
+        expected = scipy.ndimage.affine_transform(
+            image.voxels, affine, output_shape=(8, 8, 8), order=3, mode="constant"
+        )
+        np.testing.assert_allclose(image_resampled.voxels, expected, atol=1e-5)
+
+    def test_outside_image(self):
+        affine = np.eye(4)
+        affine[:3, 3] = 100
+
+        image_resampled = dino.ops.resample_to_grid(self.image, affine, (4, 4, 4), pad_value=-1)
+
+        np.testing.assert_array_equal(image_resampled.voxels, np.full((4, 4, 4), -1))
+
+
+class TestCanonicalizeImageOrientation(unittest.TestCase):
+    def world_positions(self, image: dino.structs.Image) -> np.ndarray:
+        grid = np.r_[np.indices(image.voxels.shape), [np.ones(image.voxels.shape)]]
+        return np.einsum("ij,j...->...i", image.affine, grid)[..., :3]
+
+    def test_mirrored(self):
+        affine = np.diag([-2.0, 1.0, -1.0, 1.0])
+        image = dino.structs.Image(affine, np.arange(24.0).reshape(2, 3, 4))
+
+        image_canonical = dino.ops.canonicalize_mirrored_image(image)
+
+        np.testing.assert_array_equal(image_canonical.orientation, np.eye(3))
+        np.testing.assert_array_equal(image_canonical.origin, (-2, 0, -3))
+
+    def test_permuted_axes_without_copy(self):
+        affine = np.zeros((4, 4))
+        affine[:3, :3] = [[0, 0, -2], [1.5, 0, 0], [0, -1, 0]]
+        affine[:, 3] = (5, 6, 7, 1)
+        image = dino.structs.Image(affine, np.arange(60.0).reshape(3, 4, 5))
+
+        image_canonical = dino.ops.canonicalize_image_orientation(image)
+
+        self.assertTrue(np.shares_memory(image_canonical.voxels, image.voxels))
+        np.testing.assert_array_equal(image_canonical.orientation, np.eye(3))
+        np.testing.assert_array_equal(image_canonical.spacing, (2, 1.5, 1))
+        np.testing.assert_array_equal(image_canonical.size, (5, 3, 4))
+
+        # Every voxel keeps its world position
+        positions = self.world_positions(image)
+        positions_canonical = self.world_positions(image_canonical)
+        for value in [0, 17, 59]:
+            np.testing.assert_allclose(
+                positions_canonical[image_canonical.voxels == value],
+                positions[image.voxels == value],
+            )
+
+    def test_oblique(self):
+        angle = np.pi / 6
+        affine = np.eye(4)
+        affine[:2, :2] = [[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]
+        image = dino.structs.Image(affine, np.ones((10, 10, 10), dtype=np.float32))
+
+        image_canonical = dino.ops.canonicalize_image_orientation(image, pad_value=0)
+
+        np.testing.assert_allclose(image_canonical.orientation, np.eye(3))
+        # The bounding box of the rotated square has sides 9 * (cos + sin)
+        np.testing.assert_array_equal(image_canonical.size, (14, 14, 10))
+        self.assertEqual(image_canonical.voxels[7, 7, 5], 1)
+        self.assertEqual(image_canonical.voxels[0, 0, 5], 0)
@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+import dino.patches
+import dino.structs
+
+
+class TestPatchGrid(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        affine = np.diag([2.0, 1.0, 1.0, 1.0])
+        self.image = dino.structs.Image(affine, rng.random((20, 12, 16)).astype(np.float32))
+
+    def test_patches_are_views(self):
+        grid = dino.patches.PatchGrid(self.image, (8, 8, 8), stride=(6, 4, 8))
+
+        self.assertEqual(len(grid), 3 * 2 * 2)
+        for patch in grid:
+            lower, upper = patch.bounds
+            np.testing.assert_array_equal(
+                patch.voxels,
+                self.image.voxels[lower[0] : upper[0], lower[1] : upper[1], lower[2] : upper[2]],
+            )
+            self.assertTrue(np.shares_memory(patch.voxels, self.image.voxels))
+            np.testing.assert_array_equal(patch.affine[:3, 3], patch.bounds[0] * (2, 1, 1))
+        np.testing.assert_array_equal(grid[len(grid) - 1].bounds[1], self.image.size)
+
+    def test_padded_once(self):
+        grid = dino.patches.PatchGrid(self.image, (32, 8, 8), pad_value=-1)
+
+        patch = grid[0]
+        self.assertEqual(patch.voxels.shape, (32, 8, 8))
+        self.assertTrue(np.all(patch.voxels[20:] == -1))
+
+    def test_batches(self):
+        grid = dino.patches.PatchGrid(self.image, (8, 8, 8))
+
+        batches = list(grid.batches(5))
+
+        self.assertEqual(sum(len(patches) for patches, _ in batches), len(grid))
+        patches, voxels = batches[-1]
+        np.testing.assert_array_equal(voxels[-1], patches[-1].voxels)
+
+
+class TestPatchStitcher(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.image = dino.structs.Image(np.eye(4), rng.random((20, 12, 16)).astype(np.float32))
+
+    def test_identity_outputs(self):
+        for weighting in ["gaussian", "linear", "constant"]:
+            grid = dino.patches.PatchGrid(self.image, (8, 8, 8), stride=(6, 5, 4))
+            stitcher = dino.patches.PatchStitcher(grid, weighting=weighting)
+            for patches, voxels in grid.batches(4):
+                stitcher.add_batch(patches, voxels)
+
+            image_stitched = stitcher.result()
+
+            np.testing.assert_allclose(image_stitched.voxels, self.image.voxels, rtol=1e-5)
+
+    def test_padded_grid(self):
+        grid = dino.patches.PatchGrid(self.image, (32, 8, 8))
+        stitcher = dino.patches.PatchStitcher(grid)
+        for patch in grid:
+            stitcher.add(patch, np.ones((32, 8, 8)))
+
+        image_stitched = stitcher.result()
+
+        np.testing.assert_array_equal(image_stitched.size, self.image.size)
+        np.testing.assert_allclose(image_stitched.voxels, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
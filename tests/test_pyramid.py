@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import scipy.ndimage
+
+import dino.ops
+import dino.pyramid
+import dino.structs
+
+
+class TestImagePyramid(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(0)
+        voxels = scipy.ndimage.gaussian_filter(rng.normal(0, 100, (33, 40, 24)), 2)
+        affine = np.diag([2.0, 0.5, 0.5, 1.0])
+        affine[:3, 3] = (10, -5, 3)
+        self.image = dino.structs.Image(affine, voxels.astype(np.int16), 2.0, -1024.0)
+        self.pyramid = dino.pyramid.ImagePyramid.build(self.image, min_size=8)
+
+    def test_levels(self):
+        sizes = [image.size.tolist() for image in self.pyramid.levels]
+
+        self.assertEqual(sizes, [[33, 40, 24], [17, 20, 12], [9, 10, 6], [5, 5, 6]])
+        self.assertIs(self.pyramid[0], self.image)
+        for image in self.pyramid.levels[1:]:
+            np.testing.assert_allclose(
+                image.affine,
+                dino.ops._resize_affine(self.image.affine, self.image.size, image.size),
+            )
+
+    def test_level_for_size(self):
+        # A level is only used once the resize blurs more than building the level did
+        self.assertEqual(self.pyramid.level_for_size((17, 20, 12)), 0)
+        self.assertEqual(self.pyramid.level_for_size((11, 13, 8)), 1)
+        self.assertEqual(self.pyramid.level_for_size((5, 6, 4)), 2)
+        self.assertEqual(self.pyramid.level_for_size((3, 3, 3)), 3)
+
+    def test_bounded_error(self):
+        for size in [(20, 30, 20), (11, 13, 8), (6, 9, 5), (5, 6, 4), (3, 3, 3)]:
+            for order in (0, 1):
+                resized = self.pyramid.resize_image(size, order=order)
+                expected = dino.ops.resize_image(self.image, size, order=order)
+
+                np.testing.assert_allclose(resized.affine, expected.affine)
+                error = np.abs(resized.voxels - expected.voxels).max()
+                self.assertLessEqual(error, self.pyramid.error_bound(size, order=order) + 1e-3)
+
+    def test_tight_error_bound(self):
+        voxels = np.zeros((40, 40, 40), np.int16)
+        voxels[:, :, 20:] = 1000
+        pyramid = dino.pyramid.ImagePyramid.build(dino.structs.Image(np.eye(4), voxels))
+
+        for size in [(20, 20, 9), (12, 7, 5), (9, 9, 9), (3, 3, 3)]:
+            resized = pyramid.resize_image(size)
+            expected = dino.ops.resize_image(pyramid[0], size)
+
+            error = np.abs(resized.voxels - expected.voxels).max()
+            self.assertLessEqual(pyramid.error_bound(size), 2 * error + 1)
+
+    def test_tiled(self):
+        pyramid = dino.pyramid.ImagePyramid.build(
+            self.image, min_size=8, tile_size=3, num_workers=2
+        )
+
+        for image, image_tiled in zip(self.pyramid.levels, pyramid.levels):
+            self.assertEqual(image_tiled, image)
+        self.assertEqual(
+            self.pyramid.resize_image((6, 9, 5), tile_size=2), self.pyramid.resize_image((6, 9, 5))
+        )
+
+    def test_boolean_mask(self):
+        voxels = np.zeros((33, 40, 24), dtype=bool)
+        voxels[5:25, 10:30, 4:20] = True
+        pyramid = dino.pyramid.ImagePyramid.build(dino.structs.Image(np.eye(4), voxels))
+
+        self.assertEqual(pyramid[1].voxels.dtype, np.float32)
+        for size in [(20, 30, 20), (11, 13, 8)]:
+            resized = pyramid.resize_image(size)
+            expected = dino.ops.resize_image(pyramid[0], size)
+
+            self.assertEqual(resized.voxels.dtype, np.bool_)
+            np.testing.assert_array_equal(resized.voxels, expected.voxels)
+
+    def test_larger_sizes_from_first_level(self):
+        resized = self.pyramid.resize_image((40, 20, 20), order=3)
+
+        self.assertEqual(self.pyramid.level_for_size((40, 20, 20)), 0)
+        self.assertEqual(resized, dino.ops.resize_image(self.image, (40, 20, 20), order=3))
+        self.assertEqual(self.pyramid.error_bound((40, 20, 20)), 0)
+
+    def test_rescale(self):
+        resized = self.pyramid.rescale_image((8, 2, 2))
+        expected = dino.ops.rescale_image(self.image, (8, 2, 2))
+
+        self.assertEqual(self.pyramid.level_for_size(resized.size), 1)
+        np.testing.assert_array_equal(resized.size, expected.size)
+        np.testing.assert_allclose(resized.affine, expected.affine)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pyramid")
+            self.pyramid.save(path)
+            pyramid = dino.pyramid.ImagePyramid.load(path)
+
+            self.assertEqual(len(pyramid), len(self.pyramid))
+            for image, image_loaded in zip(self.pyramid.levels, pyramid.levels):
+                self.assertEqual(image_loaded, image)
+                self.assertIsInstance(image_loaded.voxels, np.memmap)
+            self.assertEqual(pyramid.resize_image((6, 9, 5)), self.pyramid.resize_image((6, 9, 5)))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            dino.pyramid.ImagePyramid([])
+        with self.assertRaises(ValueError):
+            dino.pyramid.ImagePyramid.build(self.image, min_size=1)
+        with self.assertRaises(ValueError):
+            self.pyramid.error_bound((6, 9, 5), order=3)
+        with self.assertRaises(ValueError):
+            self.pyramid.resize_image((6, 9, 5), tile_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pydicom
+
+import dino.ops
+import dino.storage
+import dino.structs
+from testing import faking
+from tests.test_dicom import create_empty_pydicom_dataset, set_pydicom_pixel_data
+
+
+def create_series(num_slices: int = 4) -> list[pydicom.Dataset]:
+    series_uid = pydicom.uid.generate_uid()
+    slices = []
+    for z in range(num_slices):
+        slice = create_empty_pydicom_dataset()
+        slice.SeriesInstanceUID = series_uid
+        slice.ImagePositionPatient = [0, 0, z]
+        set_pydicom_pixel_data(slice, np.full((8, 8), z, dtype=np.int16))
+        slices.append(slice)
+    return slices
+
+
+class TestSaveLoadImage(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "image")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_roundtrip(self):
+        image = faking.create_fake_image((4, 5, 6))
+
+        dino.storage.save_image(image, self.path)
+        image_loaded = dino.storage.load_image(self.path)
+
+        self.assertEqual(image_loaded, image)
+        self.assertEqual(image_loaded.voxels.dtype, image.voxels.dtype)
+        self.assertIsInstance(image_loaded.voxels, np.memmap)
+        self.assertFalse(image_loaded.voxels.flags.writeable)
+
+    def test_roundtrip_rescaled(self):
+        image = dino.structs.Image(np.eye(4), np.ones((2, 3, 4), dtype=np.int16), 2.0, -1024.0)
+
+        dino.storage.save_image(image, self.path)
+        image_loaded = dino.storage.load_image(self.path)
+
+        self.assertEqual(image_loaded.rescale_slope, 2)
+        self.assertEqual(image_loaded.rescale_intercept, -1024)
+        self.assertEqual(image_loaded, image)
+
+    def test_crop_memory_mapped_image(self):
+        image = faking.create_fake_image((4, 5, 6))
+        dino.storage.save_image(image, self.path)
+
+        image_cropped = dino.ops.crop_image(
+            dino.storage.load_image(self.path), bounds=((1, 1, 1), (3, 3, 3))
+        )
+
+        self.assertEqual(image_cropped, dino.ops.crop_image(image, bounds=((1, 1, 1), (3, 3, 3))))
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_cache_hit(self):
+        cache = dino.storage.ImageCache(self.directory.name, max_bytes=2**20)
+        slices = create_series()
+
+        image = cache.create_image(slices)
+        image_cached = cache.create_image(slices)
+
+        self.assertEqual(image_cached, image)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    def test_evicts_least_recently_used(self):
+        # Each image is 4x8x8 float64 voxels, a little over 2 KiB on disk
+        cache = dino.storage.ImageCache(self.directory.name, max_bytes=6000)
+        slices_first, slices_second, slices_third = (
+            create_series(),
+            create_series(),
+            create_series(),
+        )
+
+        cache.create_image(slices_first)
+        cache.create_image(slices_second)
+        cache.create_image(slices_third)
+
+        cached = os.listdir(self.directory.name)
+        self.assertEqual(len(cached), 2)
+        self.assertFalse(any(name.startswith(slices_first[0].SeriesInstanceUID) for name in cached))
+
+
+if __name__ == "__main__":
+    unittest.main()
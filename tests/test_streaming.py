@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import dino.dicom
+import dino.streaming
+from tests.test_dicom import create_empty_pydicom_dataset, set_pydicom_pixel_data
+
+
+class TestSeriesBuilder(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.slices = []
+        # More slices than the initial room of the buffer, so the buffer has to grow
+        for z in range(40):
+            slice = create_empty_pydicom_dataset()
+            slice.ImagePositionPatient = [0, 0, z]
+            slice.RescaleIntercept = -1024
+            set_pydicom_pixel_data(slice, np.full((8, 8), z, dtype=np.int16))
+            self.slices.append(slice)
+        rng = np.random.default_rng(0)
+        self.slices_shuffled = [self.slices[index] for index in rng.permutation(40)]
+
+    def test_equals_create_image(self):
+        with dino.streaming.SeriesBuilder(num_workers=2) as builder:
+            for slice in self.slices_shuffled:
+                builder.add(slice)
+            image = builder.build()
+
+        image_expected = dino.dicom.create_image(self.slices)
+        self.assertEqual(image, image_expected)
+        np.testing.assert_array_equal(image.voxels, image_expected.voxels)
+
+    def test_voxels_are_view_of_buffer(self):
+        with dino.streaming.SeriesBuilder(expected_slices=40) as builder:
+            for slice in self.slices_shuffled:
+                builder.add(slice)
+            buffer = builder._buffer
+            image = builder.build()
+
+        # The buffer did not grow, and the slices were not gathered into a new array
+        self.assertIs(builder._buffer, buffer)
+        self.assertIs(image.voxels.base, buffer)
+        np.testing.assert_array_equal(image.voxels[:, 0, 0], np.arange(40) - 1024)
+
+    def test_spacing_subdivided_by_later_slices(self):
+        with dino.streaming.SeriesBuilder() as builder:
+            for index in [4, 0, 2, 3, 1, 5]:
+                builder.add(self.slices[index])
+            image = builder.build()
+
+        self.assertEqual(image, dino.dicom.create_image(self.slices[:6]))
+
+    def test_missing_slice(self):
+        with dino.streaming.SeriesBuilder() as builder:
+            for index in [0, 1, 3]:
+                builder.add(self.slices[index])
+            with self.assertRaisesRegex(ValueError, "Spacing between slices is not equal"):
+                builder.build()
+
+    def test_duplicate_position(self):
+        with dino.streaming.SeriesBuilder() as builder:
+            builder.add(self.slices[0])
+            builder.add(self.slices[2])
+            with self.assertRaisesRegex(ValueError, "Slice 2 has the same position as slice 1"):
+                builder.add(self.slices[2])
+
+    def test_stored_voxels(self):
+        with dino.streaming.SeriesBuilder(apply_rescale=False) as builder:
+            for slice in self.slices_shuffled:
+                builder.add(slice)
+            image = builder.build()
+
+        self.assertEqual(image.voxels.dtype, np.uint16)
+        self.assertEqual(image.rescale_intercept, -1024)
+        np.testing.assert_array_equal(image.voxels[:, 0, 0], np.arange(40))
+
+    def test_rejects_slice_on_add(self):
+        self.slices[3].ImageOrientationPatient = [0, 1, 0, 1, 0, 0]
+        self.slices[5].ImagePositionPatient = [1, 0, 5]
+
+        with dino.streaming.SeriesBuilder() as builder:
+            builder.add(self.slices[0])
+            with self.assertRaisesRegex(ValueError, "Slice 1 does not match the series"):
+                builder.add(self.slices[3])
+            with self.assertRaisesRegex(ValueError, "Slice 1 is not aligned"):
+                builder.add(self.slices[5])
+            self.assertEqual(len(builder), 1)
+
+    def test_async(self):
+        threads = []
+        allocate = dino.streaming.SeriesBuilder._allocate
+
+        def allocate_in_thread(builder, *args):
+            threads.append(threading.get_ident())
+            allocate(builder, *args)
+
+        async def build():
+            async with dino.streaming.AsyncSeriesBuilder() as builder:
+                for slice in self.slices_shuffled:
+                    await builder.add(slice)
+                return await builder.build()
+
+        with mock.patch.object(dino.streaming.SeriesBuilder, "_allocate", allocate_in_thread):
+            image = asyncio.run(build())
+
+        self.assertEqual(image, dino.dicom.create_image(self.slices))
+        # Growing the buffer waits for the decodes, which should not block the event loop
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_async_closes_on_error(self):
+        builder = dino.streaming.AsyncSeriesBuilder()
+
+        async def add():
+            async with builder:
+                await builder.add(self.slices[0])
+                await builder.add(self.slices[0])
+
+        with self.assertRaisesRegex(ValueError, "same position"):
+            asyncio.run(add())
+
+        # The threads of the builder were stopped
+        with self.assertRaises(RuntimeError):
+            builder._builder._executor.submit(print)
+
+
+if __name__ == "__main__":
+    unittest.main()
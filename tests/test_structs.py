@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+import dino.structs
+
+
+class TestImage(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        affine = np.diag([2.0, 1.0, 0.5, 1.0])
+        self.image = dino.structs.Image(affine, np.arange(24, dtype=np.float32).reshape(2, 3, 4))
+
+    def test_cached_geometry(self):
+        np.testing.assert_array_equal(self.image.spacing, (2, 1, 0.5))
+        np.testing.assert_array_equal(self.image.orientation, np.eye(3))
+        np.testing.assert_array_equal(self.image.inverse_affine, np.diag([0.5, 1, 2, 1]))
+        self.assertIs(self.image.spacing, self.image.spacing)
+        self.assertFalse(self.image.spacing.flags.writeable)
+
+    def test_statistics(self):
+        self.assertEqual(self.image.min, 0)
+        self.assertEqual(self.image.max, 23)
+        self.assertEqual(self.image.mean, 11.5)
+
+        counts, edges = self.image.histogram(bins=4)
+        np.testing.assert_array_equal(counts, (6, 6, 6, 6))
+        self.assertIs(self.image.histogram(bins=4)[0], counts)
+
+    def test_equal_shared_voxels(self):
+        image = dino.structs.Image(self.image.affine.copy(), self.image.voxels)
+
+        self.assertEqual(image, self.image)
+        self.assertNotEqual(dino.structs.Image(np.eye(4), self.image.voxels), self.image)
+
+    def test_content_hash(self):
+        image = dino.structs.Image(self.image.affine.copy(), self.image.voxels.copy())
+        image_other = dino.structs.Image(self.image.affine.copy(), self.image.voxels + 1)
+
+        self.assertEqual(image.content_hash, self.image.content_hash)
+        self.assertNotEqual(image_other.content_hash, self.image.content_hash)
+
+
+if __name__ == "__main__":
+    unittest.main()
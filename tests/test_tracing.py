@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import dino.dicom
+import dino.ops
+import dino.tracing
+from testing import faking
+from tests.test_dicom import create_empty_pydicom_dataset, set_pydicom_pixel_data
+
+
+class TestTrace(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.image = faking.create_fake_image((16, 16, 16))
+
+    def test_disabled(self):
+        image_resized = dino.ops.resize_image(self.image, (8, 8, 8))
+
+        self.assertIsNone(dino.tracing._tracer)
+        np.testing.assert_array_equal(image_resized.size, (8, 8, 8))
+
+    def test_records_calls_and_phases(self):
+        with dino.tracing.trace() as tracer:
+            dino.ops.resize_image(self.image, (8, 8, 8))
+
+        names = [event.name for event in tracer.events]
+        self.assertEqual(names, ["resize.blur", "resize.zoom", "resize_image"])
+        self.assertEqual(tracer.events[-1].args["output"], {"size": [8, 8, 8], "dtype": "float32"})
+        self.assertEqual(tracer.summary()["resize_image"]["count"], 1)
+
+    def test_create_image_phases(self):
+        slices = []
+        for z in range(4):
+            slice = create_empty_pydicom_dataset()
+            slice.ImagePositionPatient = [0, 0, z]
+            set_pydicom_pixel_data(slice, np.full((8, 8), z, dtype=np.int16))
+            slices.append(slice)
+
+        with dino.tracing.trace() as tracer:
+            dino.dicom.create_image(slices)
+
+        self.assertCountEqual(
+            tracer.summary(), ["create_image", "create_image.validate", "create_image.decode"]
+        )
+
+    def test_memory(self):
+        with dino.tracing.trace(memory=True) as tracer:
+            dino.ops.pad_image(self.image, ((8, 8, 8), (8, 8, 8)))
+
+        (event,) = tracer.events
+        self.assertGreaterEqual(event.args["peak_bytes"], 32**3 * 4)
+
+    def test_chrome_trace(self):
+        with dino.tracing.trace() as tracer:
+            dino.ops.crop_image(self.image, bounds=((0, 0, 0), (8, 8, 8)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            tracer.save_chrome_trace(path)
+            with open(path) as file:
+                trace = json.load(file)
+
+        (event,) = trace["traceEvents"]
+        self.assertEqual((event["name"], event["ph"]), ("crop_image", "X"))
+
+
+if __name__ == "__main__":
+    unittest.main()